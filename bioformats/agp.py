@@ -5,8 +5,21 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import csv
+import io
 import logging
+import os
+import pyfaidx
+import shutil
+import tempfile
+from array import array
+from bisect import bisect_right
 from .exception import AgpError
+from . import fasta
+from . import parallel
+try:
+    maketrans = str.maketrans
+except AttributeError:
+    from string import maketrans
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -17,6 +30,9 @@ gap_numeric_fields = (1, 2, 3, 5)
 component_types = ('A', 'D', 'F', 'G', 'O', 'P', 'W', 'N', 'U')
 gap_types = ('N', 'U')
 
+complement_table = maketrans('ACGTMRWSYKVHDBNacgtmrwsykvhdbn',
+                             'TGCAKYWSRMBDHVNtgcakywsrmbdhvn')
+
 
 class Reader(object):
     """
@@ -79,3 +95,490 @@ class Reader(object):
                 raise AgpError
 
         return line_parts
+
+
+def reverse_complement(seq):
+    """
+    Get the reverse complement of a nucleotide sequence.
+
+    :param seq: a nucleotide sequence
+    :type seq: str
+    :return: the reverse complement of the sequence
+    :rtype: str
+    """
+    return seq.translate(complement_table)[::-1]
+
+
+class Lifter(object):
+    """
+    This class implements translation of coordinates between objects
+    and components of an AGP file. For each object and component, its
+    parts are kept sorted by their start positions, so a position is
+    located by the binary search.
+    """
+
+    def __init__(self, handle):
+        """
+        Given a handle of an AGP file, create a lifter object to
+        translate coordinates between its objects and components.
+
+        :param handle: a handle of an AGP file
+        """
+        object_parts = dict()
+        component_parts = dict()
+        for record in Reader(handle).records():
+            if record[4] in gap_types:
+                continue
+            if record[2] - record[1] != record[7] - record[6]:
+                logger.error('object part %s:%d-%d and component part '
+                             '%s:%d-%d differ in length', record[0],
+                             record[1], record[2], record[5],
+                             record[6], record[7])
+                raise AgpError
+            # components of unknown orientation are treated as the
+            # forward ones
+            is_reverse = record[8] == '-'
+            object_parts.setdefault(record[0], []).append(
+                (record[1], record[2], record[5], record[6], record[7],
+                 is_reverse))
+            component_parts.setdefault(record[5], []).append(
+                (record[6], record[7], record[0], record[1], record[2],
+                 is_reverse))
+        self.__objects = Lifter.__get_index(object_parts)
+        self.__components = Lifter.__get_index(component_parts)
+
+    @staticmethod
+    def __get_index(seq_parts):
+        """
+        Given parts of sequences, sort them and form arrays of their
+        start positions for the binary search.
+
+        :param seq_parts: a dictionary of sequence parts
+        :type seq_parts: dict
+        :return: a dictionary of tuples of part start arrays and part
+            lists
+        :rtype: dict
+        """
+        index = dict()
+        for seq, parts in seq_parts.items():
+            parts.sort()
+            index[seq] = (array('l', [x[0] for x in parts]), parts)
+        return index
+
+    def lift(self, seq, start, end=None, to_component=False):
+        """
+        Translate an interval of an object to a component or vice
+        versa. Positions are 1-based and inclusive; the interval
+        must be within a single part of the object.
+
+        :param seq: a sequence name
+        :param start: the interval start position
+        :param end: the interval end position; by default, a single
+            position is translated
+        :param to_component: translate object coordinates to
+            component ones; by default, component coordinates are
+            translated to object ones
+        :type seq: str
+        :type start: int
+        :type end: int
+        :type to_component: bool
+        :return: a tuple of the target sequence name, the translated
+            start and end positions and the orientation flip flag or
+            None if the interval cannot be translated
+        :rtype: tuple
+        """
+        if end is None:
+            end = start
+        index = self.__objects if to_component else self.__components
+        if seq not in index:
+            return None
+        starts, parts = index[seq]
+        i = bisect_right(starts, start) - 1
+        if i < 0:
+            return None
+        part_start, part_end, target_seq, target_start, target_end, \
+            is_reverse = parts[i]
+        if end > part_end:
+            return None
+        if is_reverse:
+            return (target_seq, target_end - (end - part_start),
+                    target_end - (start - part_start), True)
+        return (target_seq, target_start + (start - part_start),
+                target_start + (end - part_start), False)
+
+
+def flip_strand(strand):
+    """
+    Get the opposite strand.
+
+    :param strand: a strand, '+' or '-'; other values are kept
+    :type strand: str
+    :return: the opposite strand
+    :rtype: str
+    """
+    return {'+': '-', '-': '+'}.get(strand, strand)
+
+
+def lift_bed_line(lifter, line, to_component=False):
+    """
+    Translate coordinates of a BED line. Thick regions and blocks of
+    BED12 records are translated too.
+
+    :param lifter: a lifter object
+    :param line: a BED line
+    :param to_component: translate object coordinates to component
+        ones
+    :type lifter: Lifter
+    :type line: str
+    :type to_component: bool
+    :return: the translated line or None if the record cannot be
+        translated
+    :rtype: str
+    """
+    line_parts = line.rstrip('\r\n').split('\t')
+    start = int(line_parts[1])
+    end = int(line_parts[2])
+    lifted = lifter.lift(line_parts[0], start + 1, end, to_component)
+    if lifted is None:
+        return None
+    line_parts[0] = lifted[0]
+    line_parts[1] = str(lifted[1] - 1)
+    line_parts[2] = str(lifted[2])
+    if len(line_parts) > 5 and lifted[3]:
+        line_parts[5] = flip_strand(line_parts[5])
+    if len(line_parts) > 7:
+        # thick region boundaries are counted from the record start or
+        # from its end if the orientation is flipped
+        origin, sign = (end, -1) if lifted[3] else (start, 1)
+        line_parts[6], line_parts[7] = [str(x) for x in sorted(
+            lifted[1] - 1 + sign * (int(x) - origin)
+            for x in line_parts[6:8])]
+    if len(line_parts) > 11 and lifted[3]:
+        sizes = [int(x) for x in line_parts[10].rstrip(',').split(',')]
+        starts = [int(x) for x in line_parts[11].rstrip(',').split(',')]
+        line_parts[10] = ','.join(str(x) for x in reversed(sizes))
+        line_parts[11] = ','.join(str(end - start - x - y) for x, y in
+                                  reversed(list(zip(starts, sizes))))
+    return '\t'.join(line_parts) + '\n'
+
+
+def lift_vcf_line(lifter, line, to_component=False):
+    """
+    Translate coordinates of a VCF line. If the orientation is
+    flipped, then alleles are reverse complemented; such variants
+    must have alleles of the same length.
+
+    :param lifter: a lifter object
+    :param line: a VCF line
+    :param to_component: translate object coordinates to component
+        ones
+    :type lifter: Lifter
+    :type line: str
+    :type to_component: bool
+    :return: the translated line or None if the variant cannot be
+        translated
+    :rtype: str
+    """
+    line_parts = line.rstrip('\r\n').split('\t')
+    start = int(line_parts[1])
+    ref = line_parts[3]
+    lifted = lifter.lift(line_parts[0], start, start + len(ref) - 1,
+                         to_component)
+    if lifted is None:
+        return None
+    if lifted[3]:
+        alts = line_parts[4].split(',')
+        if any(len(x) != len(ref) for x in alts if x != '.'):
+            # the anchor base of indels and symbolic alleles cannot
+            # be moved to the other strand
+            return None
+        line_parts[3] = reverse_complement(ref)
+        line_parts[4] = ','.join(x if x == '.' else
+                                 reverse_complement(x) for x in alts)
+    line_parts[0] = lifted[0]
+    line_parts[1] = str(lifted[1])
+    return '\t'.join(line_parts) + '\n'
+
+
+def lift_gff3_line(lifter, line, to_component=False):
+    """
+    Translate coordinates of a GFF3 line.
+
+    :param lifter: a lifter object
+    :param line: a GFF3 line
+    :param to_component: translate object coordinates to component
+        ones
+    :type lifter: Lifter
+    :type line: str
+    :type to_component: bool
+    :return: the translated line or None if the feature cannot be
+        translated
+    :rtype: str
+    """
+    line_parts = line.rstrip('\r\n').split('\t')
+    lifted = lifter.lift(line_parts[0], int(line_parts[3]),
+                         int(line_parts[4]), to_component)
+    if lifted is None:
+        return None
+    line_parts[0] = lifted[0]
+    line_parts[3] = str(lifted[1])
+    line_parts[4] = str(lifted[2])
+    if lifted[3]:
+        line_parts[6] = flip_strand(line_parts[6])
+    return '\t'.join(line_parts) + '\n'
+
+
+# functions to translate lines of supported formats, prefixes of their
+# header lines and prefixes of header lines which are not valid after
+# the translation
+liftover_formats = {
+    'bed': (lift_bed_line, ('#', 'track', 'browser'), ()),
+    'vcf': (lift_vcf_line, ('#', ), ('##contig=', )),
+    'gff3': (lift_gff3_line, ('#', ), ('##sequence-region', ))
+}
+
+
+def liftover(lifter, input_handle, output_handle, file_format,
+             to_component=False, unmapped_handle=None):
+    """
+    Translate coordinates of records from a BED, VCF or GFF3 file and
+    write the records to the specified destination. Header and
+    comment lines are kept, except ones describing sequences; the
+    FASTA section of a GFF3 file is skipped.
+
+    :param lifter: a lifter object
+    :param input_handle: a handle of an input file
+    :param output_handle: a handle of an output file
+    :param file_format: the format of the file: 'bed', 'vcf' or 'gff3'
+    :param to_component: translate object coordinates to component
+        ones; by default, component coordinates are translated to
+        object ones
+    :param unmapped_handle: a handle of a file to write records that
+        cannot be translated to
+    :type lifter: Lifter
+    :type file_format: str
+    :type to_component: bool
+    :return: the number of records that cannot be translated
+    :rtype: int
+    """
+    if file_format not in liftover_formats:
+        logger.error('unsupported file format %s', file_format)
+        raise AgpError
+    lift_line, headers, skipped_headers = liftover_formats[file_format]
+    unmapped_num = 0
+    for line_num, line in enumerate(input_handle, 1):
+        if line.startswith(headers) or not line.strip():
+            if line.startswith('##FASTA'):
+                break
+            if not line.startswith(skipped_headers):
+                output_handle.write(line)
+            continue
+        try:
+            lifted_line = lift_line(lifter, line, to_component)
+        except (IndexError, ValueError):
+            logger.error('line %d: incorrect %s record', line_num,
+                         file_format.upper())
+            raise AgpError
+        if lifted_line is None:
+            unmapped_num += 1
+            if unmapped_handle is not None:
+                unmapped_handle.write(line)
+        else:
+            output_handle.write(lifted_line)
+    return unmapped_num
+
+
+def write_component(writer, sequences, component, start, end,
+                    is_reverse=False, chunk_size=1048576):
+    """
+    Write a part of a component sequence by chunks.
+
+    :param writer: a FASTA writer with a started sequence
+    :param sequences: component sequences
+    :param component: a component name
+    :param start: the part start position, 1-based
+    :param end: the part end position, inclusive
+    :param is_reverse: write the reverse complement of the part
+    :param chunk_size: the size of a chunk of the sequence read at
+        once
+    :type writer: fasta.Writer
+    :type sequences: pyfaidx.Fasta
+    :type component: str
+    :type start: int
+    :type end: int
+    :type is_reverse: bool
+    :type chunk_size: int
+    """
+    if component not in sequences:
+        logger.error('missing component sequence %s', component)
+        raise AgpError
+    seq = sequences[component]
+    if end > len(seq):
+        logger.error('component %s part %d-%d exceeds its length %d',
+                     component, start, end, len(seq))
+        raise AgpError
+    if is_reverse:
+        for chunk_end in range(end, start - 1, -chunk_size):
+            writer.write_part(reverse_complement(
+                seq[max(start - 1, chunk_end - chunk_size):chunk_end]))
+    else:
+        for chunk_start in range(start - 1, end, chunk_size):
+            writer.write_part(seq[chunk_start:min(end, chunk_start +
+                                                  chunk_size)])
+
+
+def write_objects(agp_lines, sequences, writer, chunk_size=1048576):
+    """
+    Assemble sequences of objects from AGP lines and write them in
+    the FASTA format. Gaps are written as runs of N.
+
+    :param agp_lines: lines of an AGP file
+    :param sequences: component sequences
+    :param writer: a FASTA writer
+    :param chunk_size: the size of a chunk of a sequence written at
+        once
+    :type agp_lines: list
+    :type sequences: pyfaidx.Fasta
+    :type writer: fasta.Writer
+    :type chunk_size: int
+    """
+    current_object = None
+    for record in Reader(agp_lines).records():
+        if record[0] != current_object:
+            if current_object is not None:
+                writer.finish()
+            current_object = record[0]
+            writer.start(current_object)
+        if record[4] in gap_types:
+            for gap_start in range(0, record[5], chunk_size):
+                writer.write_part('N' * min(chunk_size,
+                                            record[5] - gap_start))
+        else:
+            write_component(writer, sequences, record[5], record[6],
+                            record[7], record[8] == '-', chunk_size)
+    if current_object is not None:
+        writer.finish()
+
+
+def get_object_ranges(agp_file, range_num):
+    """
+    Split an AGP file into byte ranges of lines describing groups of
+    objects of similar total length.
+
+    :param agp_file: a name of an AGP file
+    :param range_num: the approximate number of ranges
+    :type agp_file: str
+    :type range_num: int
+    :return: a list of tuples of range start and end positions
+    :rtype: list
+    """
+    objects = []
+    with io.open(agp_file, 'rb') as input_file:
+        position = 0
+        for line in input_file:
+            if not line.startswith(b'#'):
+                line_parts = line.split(b'\t', 3)
+                if not objects or objects[-1][0] != line_parts[0]:
+                    objects.append([line_parts[0], position, 0, 0])
+                objects[-1][3] = int(line_parts[2])
+            position += len(line)
+            if objects:
+                objects[-1][2] = position
+    range_len = sum(x[3] for x in objects) // max(1, range_num) + 1
+    ranges = []
+    current_len = 0
+    for _, start, end, length in objects:
+        if ranges and current_len < range_len:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+            current_len = 0
+        current_len += length
+    return ranges
+
+
+def agp2fasta_chunk(agp_file, start, end, fasta_file, width=72,
+                    chunk_size=1048576, tmp_dir=None):
+    """
+    Assemble objects from a byte range of an AGP file and write them
+    to a temporary FASTA file.
+
+    :param agp_file: a name of an AGP file
+    :param start: the range start position
+    :param end: the range end position
+    :param fasta_file: a name of an indexed FASTA file of components
+    :param width: the length of FASTA sequence lines
+    :param chunk_size: the size of a chunk of a sequence written at
+        once
+    :param tmp_dir: a directory for the temporary file
+    :type agp_file: str
+    :type start: int
+    :type end: int
+    :type fasta_file: str
+    :type width: int
+    :type chunk_size: int
+    :type tmp_dir: str
+    :return: the name of the temporary FASTA file
+    :rtype: str
+    """
+    temp_file, temp_filename = tempfile.mkstemp(suffix='.fa',
+                                                dir=tmp_dir)
+    os.close(temp_file)
+    try:
+        with pyfaidx.Fasta(fasta_file, as_raw=True) as sequences:
+            with fasta.Writer(temp_filename, width) as writer:
+                write_objects(parallel.read_lines(agp_file, start, end),
+                              sequences, writer, chunk_size)
+    except BaseException:
+        os.unlink(temp_filename)
+        raise
+    return temp_filename
+
+
+def agp2fasta(agp_file, fasta_file, output_file, width=72, threads=1,
+              chunk_size=1048576):
+    """
+    Assemble sequences of objects from an AGP file and an indexed
+    FASTA file of its components. Components are copied by chunks
+    and reverse complemented if their orientation is '-'; gaps are
+    written as runs of N. If several threads are specified, then
+    groups of objects are assembled in parallel to temporary files
+    which are joined in the order of the objects.
+
+    :param agp_file: a name of an AGP file
+    :param fasta_file: a name of an indexed FASTA file of components
+    :param output_file: a name of the output FASTA file
+    :param width: the length of FASTA sequence lines
+    :param threads: the number of worker processes
+    :param chunk_size: the size of a chunk of a sequence written at
+        once
+    :type agp_file: str
+    :type fasta_file: str
+    :type output_file: str
+    :type width: int
+    :type threads: int
+    :type chunk_size: int
+    """
+    if threads < 2:
+        with open(agp_file) as agp_lines:
+            with pyfaidx.Fasta(fasta_file, as_raw=True) as sequences:
+                with fasta.Writer(output_file, width) as writer:
+                    write_objects(agp_lines, sequences, writer,
+                                  chunk_size)
+        return
+    # the temporary files are kept in a separate directory, so files
+    # of finished chunks are removed even if another chunk fails
+    temp_dir = tempfile.mkdtemp()
+    temp_filenames = parallel.map_ranges(
+        agp2fasta_chunk, agp_file,
+        get_object_ranges(agp_file, threads * 4), threads,
+        (fasta_file, width, chunk_size, temp_dir), relative_lines=True)
+    try:
+        with io.open(output_file, 'wb') as output:
+            for temp_filename in temp_filenames:
+                with io.open(temp_filename, 'rb') as temp_file:
+                    shutil.copyfileobj(temp_file, output)
+                os.unlink(temp_filename)
+    finally:
+        temp_filenames.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
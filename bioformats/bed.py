@@ -6,9 +6,14 @@
 
 import csv
 import logging
-from collections import namedtuple
+import tempfile
+import zlib
+from builtins import range  # pylint:disable=redefined-builtin
+from collections import namedtuple, OrderedDict
+from future.utils import iteritems
 from . import autosql
 from . import gff3
+from . import parallel
 from .exception import BedError
 
 logging.basicConfig()
@@ -308,6 +313,27 @@ class Reader(object):
         return result
 
 
+def get_record_line(bed_record):
+    """
+    Given a BED record, form its line to be written to a BED file.
+
+    :param bed_record: a BED record
+    :type bed_record: Record
+    :return: a line of the BED record
+    :rtype: str
+    """
+    bed_record = [x for x in bed_record if x is not None]
+    num_fields = len(bed_record)
+    # check if the last column contains any values
+    if not bed_record[-1]:
+        num_fields -= 1
+    else:
+        num_fields += (len(bed_record[-1]) - 1)
+        bed_record = bed_record[:-1] + bed_record[-1]
+    template = '\t'.join(['{}'] * num_fields) + '\n'
+    return template.format(*bed_record)
+
+
 class Writer(object):
     """
     The class implements writing to a file in the BED format.
@@ -334,16 +360,7 @@ class Writer(object):
         :param bed_record: a BED record to be written to the file
         :type: Record
         """
-        bed_record = [x for x in bed_record if x is not None]
-        num_fields = len(bed_record)
-        # check if the last column contains any values
-        if not bed_record[-1]:
-            num_fields -= 1
-        else:
-            num_fields += (len(bed_record[-1]) - 1)
-            bed_record = bed_record[:-1] + bed_record[-1]
-        template = '\t'.join(['{}'] * num_fields) + '\n'
-        self.__output.write(template.format(*bed_record))
+        self.__output.write(get_record_line(bed_record))
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.__output.close()
@@ -431,8 +448,151 @@ def get_blocks(start, end):
     return result
 
 
+def get_gene_record(seq, name, strand, exon_starts, exon_ends):
+    """
+    Given exons of a gene, form its BED12 record.
+
+    :param seq: a name of the sequence the gene is located on
+    :param name: a gene name
+    :param strand: a gene strand
+    :param exon_starts: start positions of gene exons in the GFF3
+        coordinates
+    :param exon_ends: end positions of gene exons in the GFF3
+        coordinates
+    :type seq: str
+    :type name: str
+    :type strand: str
+    :type exon_starts: list
+    :type exon_ends: list
+    :return: a BED12 record of the gene
+    :rtype: Record
+    """
+    block_starts, block_sizes = get_blocks(exon_starts, exon_ends)
+    return Record(
+        seq=seq,
+        start=exon_starts[0] - 1,
+        end=exon_ends[-1],
+        name=name,
+        score=1000,
+        strand=strand,
+        thick_start=exon_starts[0],
+        thick_end=exon_ends[-1],
+        color='255,255,255',
+        block_num=len(exon_starts),
+        block_sizes=','.join(map(str, block_sizes)),
+        block_starts=','.join(map(str, block_starts)),
+        extra=[]
+    )
+
+
+class ExonGrouper(object):
+    """
+    This class implements grouping of exons by their genes when exons
+    of a gene are not contiguous in an input file. Exons are kept in a
+    hash table; if their number exceeds the specified limit, the table
+    is written to partitioned temporary files, so that exons of every
+    gene get to the same partition. Genes are assigned to partitions
+    by checksums of their names, so the order of genes does not depend
+    on the hash seed of the interpreter.
+    """
+    def __init__(self, max_exons=1000000, partitions=16):
+        """
+        Create an exon grouper object.
+
+        :param max_exons: the number of exons to be kept in memory
+        :param partitions: the number of temporary files to write
+            exons to if they exceed the limit
+        :type max_exons: int
+        :type partitions: int
+        """
+        self.__max_exons = max_exons
+        self.__partition_num = partitions
+        self.__genes = OrderedDict()
+        self.__exon_count = 0
+        self.__partitions = None
+
+    def add(self, gene, seq, strand, start, end):
+        """
+        Add an exon to the grouper.
+
+        :param gene: a name of the gene the exon belongs to
+        :param seq: a name of the sequence the exon is located on
+        :param strand: an exon strand
+        :param start: an exon start position
+        :param end: an exon end position
+        :type gene: str
+        :type seq: str
+        :type strand: str
+        :type start: int
+        :type end: int
+        """
+        if gene not in self.__genes:
+            self.__genes[gene] = (seq, strand, [])
+        self.__genes[gene][2].append((start, end))
+        self.__exon_count += 1
+        if self.__exon_count >= self.__max_exons:
+            self.__spill()
+
+    def __spill(self):
+        """
+        Write exons from the hash table to temporary partition files
+        and clear the table.
+        """
+        if self.__partitions is None:
+            self.__partitions = [tempfile.TemporaryFile(mode='w+')
+                                 for _ in range(self.__partition_num)]
+        for gene, (seq, strand, exons) in iteritems(self.__genes):
+            partition = self.__partitions[
+                zlib.crc32(gene.encode('utf-8')) % self.__partition_num]
+            for start, end in exons:
+                partition.write('{}\t{}\t{}\t{}\t{}\n'.format(
+                    gene, seq, strand, start, end))
+        self.__genes = OrderedDict()
+        self.__exon_count = 0
+
+    def __load_partition(self, partition):
+        """
+        Read exons from a temporary partition file to the hash table.
+
+        :param partition: a temporary partition file
+        """
+        partition.seek(0)
+        for line in partition:
+            gene, seq, strand, start, end = line.rstrip('\n').split(
+                '\t')
+            if gene not in self.__genes:
+                self.__genes[gene] = (seq, strand, [])
+            self.__genes[gene][2].append((int(start), int(end)))
+        partition.close()
+
+    def genes(self):
+        """
+        Iterate through genes of the added exons in the order of their
+        first exons. If exons were written to temporary files, genes
+        are returned partition by partition in this order.
+
+        :return: a tuple of a gene name, its sequence, strand and a
+            sorted list of exon start and end positions
+        :rtype: tuple
+        """
+        if self.__partitions is None:
+            groups = [None]
+        else:
+            self.__spill()
+            groups = self.__partitions
+        for partition in groups:
+            if partition is not None:
+                self.__load_partition(partition)
+            for gene, (seq, strand, exons) in iteritems(self.__genes):
+                exons.sort()
+                yield gene, seq, strand, exons
+            self.__genes = OrderedDict()
+        self.__partitions = None
+
+
 def convert_gff2bed_gene(gff3_file, bed_file, exon_type='exon',
-                         parent_tag='Parent', ignore_order=False):
+                         parent_tag='Parent', ignore_order=False,
+                         unsorted=False, max_exons=1000000):
     """
     Convert a specified GFF3 file of gene exons to the BED12 format
     considering gene structure.
@@ -443,12 +603,22 @@ def convert_gff2bed_gene(gff3_file, bed_file, exon_type='exon',
     :param parent_tag: a tag of GFF3 exon records encoding the gene
         they belong to
     :param ignore_order: do not check the order of GFF3 records
+    :param unsorted: group exons by their genes using a hash table,
+        so exons of a gene are not required to be contiguous
+    :param max_exons: the number of exons to be kept in memory in the
+        unsorted mode; the rest are written to temporary files
     :type bed_file: str
     :type gff3_file: str
     :type exon_type: str
     :type parent_tag: str
     :type ignore_order: bool
+    :type unsorted: bool
+    :type max_exons: int
     """
+    if unsorted:
+        convert_gff2bed_gene_unsorted(gff3_file, bed_file, exon_type,
+                                      parent_tag, max_exons)
+        return
     total_exons = 0
     total_genes = 0
     with open(gff3_file) as input_file:
@@ -456,48 +626,27 @@ def convert_gff2bed_gene(gff3_file, bed_file, exon_type='exon',
         with Writer(bed_file) as bed_writer:
             # process the first exon
             gff_record_iterator = gff_reader.records(
-                    check_order=not ignore_order)
+                    check_order=not ignore_order, types=(exon_type, ))
             exon = next(gff_record_iterator)
-            while exon.type != exon_type:
-                exon = next(gff_record_iterator)
             cur_gene_seq = exon.seqid
             cur_gene = exon.attributes[parent_tag]
-            cur_gene_start = exon.start
-            cur_gene_end = exon.end
+            cur_gene_strand = exon.strand
             exon_starts = [exon.start]
             exon_ends = [exon.end]
             total_exons += 1
             # start iterating through exon records of a GFF3 file
             for exon in gff_record_iterator:
-                if exon.type != exon_type:
-                    continue
                 total_exons += 1
                 if exon.attributes[parent_tag] != cur_gene:
                     total_genes += 1
                     # we have read a gene, write it to output
-                    block_starts, block_sizes = get_blocks(
-                        exon_starts, exon_ends)
-                    bed_record = Record(
-                        seq=cur_gene_seq,
-                        start=cur_gene_start - 1,
-                        end=cur_gene_end,
-                        name=cur_gene,
-                        score=1000,
-                        strand=exon.strand,
-                        thick_start=cur_gene_start,
-                        thick_end=cur_gene_end,
-                        color='255,255,255',
-                        block_num=len(exon_starts),
-                        block_sizes=','.join(map(str, block_sizes)),
-                        block_starts=','.join(map(str, block_starts)),
-                        extra=[]
-                    )
-                    bed_writer.write(bed_record)
+                    bed_writer.write(get_gene_record(
+                        cur_gene_seq, cur_gene, cur_gene_strand,
+                        exon_starts, exon_ends))
                     # update the exon data
                     cur_gene_seq = exon.seqid
                     cur_gene = exon.attributes[parent_tag]
-                    cur_gene_start = exon.start
-                    cur_gene_end = exon.end
+                    cur_gene_strand = exon.strand
                     exon_starts = [exon.start]
                     exon_ends = [exon.end]
                 else:
@@ -505,33 +654,108 @@ def convert_gff2bed_gene(gff3_file, bed_file, exon_type='exon',
                     # processed
                     exon_starts.append(exon.start)
                     exon_ends.append(exon.end)
-                    cur_gene_end = exon.end
             # process the last gene
             total_genes += 1
-            block_starts, block_sizes = get_blocks(
-                exon_starts, exon_ends)
-            bed_record = Record(
-                seq=cur_gene_seq,
-                start=cur_gene_start - 1,
-                end=cur_gene_end,
-                name=cur_gene,
-                score=1000,
-                strand=exon.strand,
-                thick_start=cur_gene_start,
-                thick_end=cur_gene_end,
-                color='255,255,255',
-                block_num=len(exon_starts),
-                block_sizes=','.join(map(str, block_sizes)),
-                block_starts=','.join(map(str, block_starts)),
-                extra=[]
-            )
-            bed_writer.write(bed_record)
+            bed_writer.write(get_gene_record(
+                cur_gene_seq, cur_gene, cur_gene_strand, exon_starts,
+                exon_ends))
+    logger.info('%d exon records of %d genes processed', total_exons,
+                total_genes)
+
+
+def convert_gff2bed_gene_unsorted(gff3_file, bed_file,
+                                  exon_type='exon',
+                                  parent_tag='Parent',
+                                  max_exons=1000000):
+    """
+    Convert a specified GFF3 file of gene exons to the BED12 format
+    considering gene structure. Exons of a gene may be located
+    anywhere in the file; they are grouped by their genes using a
+    hash table.
+
+    :param gff3_file: a name of an input GFF3 file of gene exons
+    :param bed_file: a name of the output BED12 file
+    :param exon_type: a type of GFF3 exon records
+    :param parent_tag: a tag of GFF3 exon records encoding the gene
+        they belong to
+    :param max_exons: the number of exons to be kept in memory; the
+        rest are written to temporary files
+    :type bed_file: str
+    :type gff3_file: str
+    :type exon_type: str
+    :type parent_tag: str
+    :type max_exons: int
+    """
+    total_exons = 0
+    total_genes = 0
+    grouper = ExonGrouper(max_exons)
+    with open(gff3_file) as input_file:
+        gff_reader = gff3.Reader(input_file)
+        for exon in gff_reader.records(types=(exon_type, )):
+            total_exons += 1
+            grouper.add(exon.attributes[parent_tag], exon.seqid,
+                        exon.strand, exon.start, exon.end)
+    with Writer(bed_file) as bed_writer:
+        for gene, seq, strand, exons in grouper.genes():
+            total_genes += 1
+            exon_starts, exon_ends = zip(*exons)
+            bed_writer.write(get_gene_record(
+                seq, gene, strand, list(exon_starts), list(exon_ends)))
     logger.info('%d exon records of %d genes processed', total_exons,
                 total_genes)
 
 
+def get_gff2bed_record(feature, name_tag=None, missing_value='NA',
+                       attributes=()):
+    """
+    Given a GFF3 record, convert it to a BED record.
+
+    :param feature: a GFF3 record
+    :param name_tag: a tag which value to use as a feature name; if
+        it is not specified, then the name of the returned record is
+        None
+    :param missing_value: the value to denote a missing attribute
+    :param attributes: a list of attributes to be added to output
+    :type feature: gff3.Record
+    :type name_tag: str
+    :type missing_value: str
+    :type attributes: list
+    :return: a BED record
+    :rtype: Record
+    """
+    if name_tag is not None:
+        if name_tag in feature.attributes:
+            feature_name = feature.attributes[name_tag]
+        else:
+            feature_name = missing_value
+    else:
+        feature_name = None
+    # prepare extra BED columns
+    feature_extra = []
+    for i in attributes:
+        if i in feature.attributes:
+            feature_extra.append(feature.attributes[i])
+        else:
+            feature_extra.append('NA')
+    return Record(
+        seq=feature.seqid,
+        start=feature.start - 1,
+        end=feature.end,
+        name=feature_name,
+        score=1000,
+        strand=feature.strand,
+        thick_start=feature.start - 1,
+        thick_end=feature.end,
+        color=None,
+        block_num=None,
+        block_sizes=None,
+        block_starts=None,
+        extra=feature_extra
+    )
+
+
 def convert_gff2bed(gff3_file, bed_file, feature_type, name_tag=None,
-                    missing_value='NA', attributes=None):
+                    missing_value='NA', attributes=None, threads=1):
     """
     Convert a specified GFF3 file to the BED format considering its
     attributes.
@@ -542,55 +766,122 @@ def convert_gff2bed(gff3_file, bed_file, feature_type, name_tag=None,
     :param name_tag: a tag which value to use as a feature name
     :param missing_value: the value to denote a missing attribute
     :param attributes: a list of attributes to be added to output
+    :param threads: the number of worker processes to convert parts
+        of the GFF3 file
     :type gff3_file: str
     :type bed_file: str
     :type feature_type: str
     :type name_tag: str
     :type missing_value: str
     :type attributes: list
+    :type threads: int
     """
-    total_processed = 0
-    total_bed = 0
     if attributes is None:
         attributes = []
+    if threads > 1:
+        convert_gff2bed_parallel(gff3_file, bed_file, feature_type,
+                                 name_tag, missing_value, attributes,
+                                 threads)
+        return
+    total_bed = 0
     with open(gff3_file) as input_file:
         gff_reader = gff3.Reader(input_file)
         with Writer(bed_file) as bed_writer:
-            for feature in gff_reader.records():
-                total_processed += 1
-                if feature.type != feature_type:
-                    continue
-                if name_tag is not None:
-                    if name_tag in feature.attributes:
-                        feature_name = feature.attributes[name_tag]
-                    else:
-                        feature_name = missing_value
-                else:
-                    feature_name = 'feature_{}'.format(total_bed)
-                # prepare extra BED columns
-                feature_extra = []
-                for i in attributes:
-                    if i in feature.attributes:
-                        feature_extra.append(feature.attributes[i])
-                    else:
-                        feature_extra.append('NA')
-                # prepare a BED record
-                bed_record = Record(
-                    seq=feature.seqid,
-                    start=feature.start - 1,
-                    end=feature.end,
-                    name=feature_name,
-                    score=1000,
-                    strand=feature.strand,
-                    thick_start=feature.start - 1,
-                    thick_end=feature.end,
-                    color=None,
-                    block_num=None,
-                    block_sizes=None,
-                    block_starts=None,
-                    extra=feature_extra
-                )
+            # attributes are parsed only for features of the specified
+            # type and only if they are required for output
+            for feature in gff_reader.records(types=(feature_type, ),
+                                              lazy=True):
+                bed_record = get_gff2bed_record(
+                    feature, name_tag, missing_value, attributes)
+                if name_tag is None:
+                    bed_record = bed_record._replace(
+                        name='feature_{}'.format(total_bed))
                 bed_writer.write(bed_record)
                 total_bed += 1
+    logger.info('%d BED records of %d GFF3 records processed',
+                total_bed, gff_reader.record_count)
+
+
+def convert_gff2bed_chunk(gff3_file, start, end, feature_type,
+                          name_tag, missing_value, attributes):
+    """
+    Convert records from the specified byte range of a GFF3 file to
+    the BED format.
+
+    :param gff3_file: a name of an input GFF3 file
+    :param start: the range start position
+    :param end: the range end position
+    :param feature_type: a type of features to be processed
+    :param name_tag: a tag which value to use as a feature name; if
+        it is not specified, then each line is split into two parts
+        where the feature number is to be inserted
+    :param missing_value: the value to denote a missing attribute
+    :param attributes: a list of attributes to be added to output
+    :type gff3_file: str
+    :type start: int
+    :type end: int
+    :type feature_type: str
+    :type name_tag: str
+    :type missing_value: str
+    :type attributes: list
+    :return: a tuple of the list of BED lines and the number of
+        processed GFF3 records
+    :rtype: tuple
+    """
+    gff_reader = gff3.Reader(parallel.read_lines(gff3_file, start, end),
+                             check_header=False)
+    bed_lines = []
+    for feature in gff_reader.records(types=(feature_type, ),
+                                      lazy=True):
+        bed_record = get_gff2bed_record(feature, name_tag,
+                                        missing_value, attributes)
+        if name_tag is None:
+            bed_lines.append(tuple(get_record_line(
+                bed_record._replace(name='\0')).split('\0', 1)))
+        else:
+            bed_lines.append(get_record_line(bed_record))
+    return bed_lines, gff_reader.record_count
+
+
+def convert_gff2bed_parallel(gff3_file, bed_file, feature_type,
+                             name_tag=None, missing_value='NA',
+                             attributes=None, threads=2):
+    """
+    Convert a specified GFF3 file to the BED format considering its
+    attributes; parts of the file are converted in parallel.
+
+    :param gff3_file: a name of an input GFF3 file
+    :param bed_file: a name of the output BED file
+    :param feature_type: a type of features to be processed
+    :param name_tag: a tag which value to use as a feature name
+    :param missing_value: the value to denote a missing attribute
+    :param attributes: a list of attributes to be added to output
+    :param threads: the number of worker processes
+    :type gff3_file: str
+    :type bed_file: str
+    :type feature_type: str
+    :type name_tag: str
+    :type missing_value: str
+    :type attributes: list
+    :type threads: int
+    """
+    total_processed = 0
+    total_bed = 0
+    if attributes is None:
+        attributes = []
+    header_size = gff3.get_header_size(gff3_file)
+    with open(bed_file, 'w') as output_file:
+        for bed_lines, record_count in parallel.map_chunks(
+                convert_gff2bed_chunk, gff3_file, threads,
+                (feature_type, name_tag, missing_value, attributes),
+                start=header_size):
+            if name_tag is None:
+                # features are numbered across all chunks
+                bed_lines = ['{}feature_{}{}'.format(
+                    prefix, total_bed + i, suffix)
+                    for i, (prefix, suffix) in enumerate(bed_lines)]
+            output_file.writelines(bed_lines)
+            total_bed += len(bed_lines)
+            total_processed += record_count
     logger.info('%d BED records of %d GFF3 records processed',
                 total_bed, total_processed)
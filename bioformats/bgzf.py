@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import io
+import struct
+import zlib
+
+# the greatest size of uncompressed data in a BGZF block; it leaves
+# room for incompressible data to fit the 64 KB block limit
+max_block_size = 65280
+
+# the BGZF block header with the BC extra subfield which value is the
+# total block size minus one
+block_header = struct.Struct('<4BI2BH2BHH')
+
+# the empty block that marks the end of a BGZF file
+eof_block = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC'
+             b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00'
+             b'\x00')
+
+
+def compress_block(data, level=6):
+    """
+    Compress data to a single BGZF block.
+
+    :param data: data to be compressed; its size must not exceed
+        max_block_size
+    :param level: the compression level
+    :type data: bytes
+    :type level: int
+    :return: the BGZF block
+    :rtype: bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = block_header.pack(0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6,
+                               ord('B'), ord('C'), 2,
+                               len(compressed) + 25)
+    trailer = struct.pack('<2I', zlib.crc32(data) & 0xffffffff,
+                          len(data))
+    return header + compressed + trailer
+
+
+class Writer(object):
+    """
+    The class implements writing text to a file in the BGZF format,
+    which is readable by gzip tools and indexable by tabix.
+    """
+    def __init__(self, filename, level=6):
+        """
+        Given a name of a file, create a BGZF writer object to write
+        data to it.
+
+        :param filename: a name of a file to write data to
+        :param level: the compression level
+        :type filename: str
+        :type level: int
+        """
+        self.__output = io.open(filename, 'wb')
+        self.__level = level
+        self.__buffer = []
+        self.__buffer_size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __flush_blocks(self, final=False):
+        """
+        Compress the buffered data to BGZF blocks and write them to
+        the file; the data that do not fill a whole block are kept
+        unless the final flag is specified.
+        """
+        data = b''.join(self.__buffer)
+        position = 0
+        while len(data) - position >= max_block_size or \
+                (final and position < len(data)):
+            self.__output.write(compress_block(
+                data[position:position + max_block_size],
+                self.__level))
+            position += max_block_size
+        self.__buffer = [data[position:]]
+        self.__buffer_size = len(self.__buffer[0])
+
+    def write(self, text):
+        """
+        Write text to the file.
+
+        :param text: text to be written
+        :type text: str
+        """
+        data = text.encode('utf-8')
+        self.__buffer.append(data)
+        self.__buffer_size += len(data)
+        if self.__buffer_size >= max_block_size:
+            self.__flush_blocks()
+
+    def writelines(self, lines):
+        """
+        Write lines of text to the file.
+
+        :param lines: lines to be written
+        :type lines: list
+        """
+        self.write(''.join(lines))
+
+    def close(self):
+        """
+        Write the buffered data and the end-of-file marker and close
+        the file.
+        """
+        if self.__output.closed:
+            return
+        self.__flush_blocks(final=True)
+        self.__output.write(eof_block)
+        self.__output.close()
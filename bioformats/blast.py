@@ -5,19 +5,163 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import csv
+import heapq
+import io
+import re
+from array import array
 from builtins import range  # pylint:disable=redefined-builtin
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from .exception import BlastTabError
+from . import parallel
 import logging
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+# BLAST tabular column specifiers with the names of alignment fields
+# and the types of their values; any of the sequence ID columns names
+# the query or subject field
+blast_columns = {
+    'qseqid': ('query', str), 'sseqid': ('subject', str),
+    'qacc': ('query', str), 'sacc': ('subject', str),
+    'qaccver': ('query', str), 'saccver': ('subject', str),
+    'qgi': ('query', str), 'sgi': ('subject', str),
+    'pident': ('identity', float), 'length': ('length', int),
+    'mismatch': ('mismatches', int), 'gapopen': ('gap_openings', int),
+    'qstart': ('q_start', int), 'qend': ('q_end', int),
+    'sstart': ('s_start', int), 'send': ('s_end', int),
+    'evalue': ('e_value', float), 'bitscore': ('bit_score', float),
+    'qlen': ('qlen', int), 'slen': ('slen', int),
+    'score': ('score', int), 'nident': ('nident', int),
+    'positive': ('positive', int), 'gaps': ('gaps', int),
+    'ppos': ('ppos', float), 'qframe': ('qframe', int),
+    'sframe': ('sframe', int), 'qcovs': ('qcovs', float),
+    'qcovhsp': ('qcovhsp', float), 'qcovus': ('qcovus', float)
+}
+
+# descriptions of columns from the '# Fields:' comment lines
+blast_column_descriptions = {
+    'query id': 'qseqid', 'query gi': 'qgi', 'query acc.': 'qacc',
+    'query acc.ver': 'qaccver', 'query length': 'qlen',
+    'subject id': 'sseqid', 'subject ids': 'sallseqid',
+    'subject gi': 'sgi', 'subject gis': 'sallgi',
+    'subject acc.': 'sacc', 'subject acc.ver': 'saccver',
+    'subject accs.': 'sallacc', 'subject length': 'slen',
+    'q. start': 'qstart', 'q. end': 'qend', 's. start': 'sstart',
+    's. end': 'send', 'query seq': 'qseq', 'subject seq': 'sseq',
+    'evalue': 'evalue', 'bit score': 'bitscore', 'score': 'score',
+    'alignment length': 'length', '% identity': 'pident',
+    'identical': 'nident', 'mismatches': 'mismatch',
+    'positives': 'positive', 'gap opens': 'gapopen', 'gaps': 'gaps',
+    '% positives': 'ppos', 'query/sbjct frames': 'frames',
+    'query frame': 'qframe', 'sbjct frame': 'sframe', 'BTOP': 'btop',
+    'subject tax id': 'staxid', 'subject tax ids': 'staxids',
+    'subject sci name': 'ssciname', 'subject sci names': 'sscinames',
+    'subject com names': 'scomnames',
+    'subject blast name': 'sblastname',
+    'subject blast names': 'sblastnames',
+    'subject super kingdom': 'sskingdom',
+    'subject super kingdoms': 'sskingdoms',
+    'subject title': 'stitle', 'subject titles': 'salltitles',
+    'subject strand': 'sstrand',
+    '% query coverage per subject': 'qcovs',
+    '% query coverage per hsp': 'qcovhsp',
+    '% query coverage per uniq subject': 'qcovus'
+}
+
+default_columns = ('qseqid', 'sseqid', 'pident', 'length', 'mismatch',
+                   'gapopen', 'qstart', 'qend', 'sstart', 'send',
+                   'evalue', 'bitscore')
+
+blast_parser_template = """def parse_alignment(line_parts):
+    return Alignment({})
+"""
+
+
+def get_columns(specification):
+    """
+    Given a BLAST tabular column specification, get its column
+    specifiers.
+
+    :param specification: a string of column specifiers separated by
+        spaces, for example, the -outfmt option value without the
+        format number, a sequence of column specifiers or the
+        '# Fields:' comment line
+    :type specification: str or tuple
+    :return: the column specifiers
+    :rtype: tuple
+    """
+    if not isinstance(specification, str):
+        return tuple(specification)
+    if specification.startswith('# Fields:'):
+        columns = []
+        for description in specification[9:].strip().split(', '):
+            if description not in blast_column_descriptions:
+                logger.error('unknown BLAST tabular column %s',
+                             description)
+                raise BlastTabError
+            columns.append(blast_column_descriptions[description])
+        return tuple(columns)
+    columns = specification.split()
+    # the format number may precede the column specifiers
+    if columns and columns[0].isdigit():
+        columns.pop(0)
+    if not columns:
+        return default_columns
+    return tuple(columns)
+
+
+def compile_parser(columns):
+    """
+    Given BLAST tabular column specifiers, create the named tuple type
+    of alignments and the function to form an alignment from the
+    parts of a line. The function converts the column values to their
+    types without looping over the columns.
+
+    :param columns: BLAST tabular column specifiers
+    :type columns: tuple
+    :return: the alignment type, the function and the types of the
+        column values
+    :rtype: tuple
+    """
+    field_names = []
+    field_types = []
+    for i, column in enumerate(columns):
+        if not re.match(r'^[a-z_]\w*$', column):
+            logger.error('incorrect BLAST tabular column %s', column)
+            raise BlastTabError
+        field_name, field_type = blast_columns.get(column,
+                                                   (column, str))
+        if field_name in ('query', 'subject') and \
+                field_name in field_names:
+            # only the first sequence ID column names the sequence
+            field_name = column
+        if field_name in field_names or column in columns[:i]:
+            logger.error('duplicate BLAST tabular column %s', column)
+            raise BlastTabError
+        field_names.append(field_name)
+        field_types.append(field_type)
+    if tuple(field_names) == BlastTab.blast_field_names:
+        alignment_type = BlastTab.Alignment
+    else:
+        alignment_type = namedtuple('Alignment', field_names)
+    values = []
+    for i, field_type in enumerate(field_types):
+        if field_type is str:
+            values.append('line_parts[{}]'.format(i))
+        else:
+            values.append('{}(line_parts[{}])'.format(
+                field_type.__name__, i))
+    namespace = {'Alignment': alignment_type}
+    exec(blast_parser_template.format(', '.join(values)), namespace)
+    return alignment_type, namespace['parse_alignment'], field_types
+
 
 class BlastTab(object):
     """
     This class implements a parser to read alignment files in the
-    BLAST tabular format.
+    BLAST tabular format. Besides the default 12 columns, custom
+    column layouts are supported.
     """
 
     blast_field_names = ('query', 'subject', 'identity', 'length',
@@ -27,15 +171,41 @@ class BlastTab(object):
 
     Alignment = namedtuple('Alignment', blast_field_names)
 
-    def __init__(self, handle):
+    def __init__(self, handle, columns=None):
         """
         Given a handle of a file, create a BLAST tabular format parser
         object to read data from it.
 
         :param handle: a handle of a file in the BLAST tabular format
+        :param columns: the column specification, either a string of
+            column specifiers like 'qseqid sseqid pident length' or
+            a sequence of them; by default, the columns are taken from
+            the '# Fields:' comment lines if they are present and the
+            default 12 columns are assumed otherwise
+        :type columns: str or tuple
         """
-        self.__line_parts = []
         self.__reader = csv.reader(handle, delimiter='\t')
+        self.__fields_line = None
+        self.__use_fields_line = columns is None
+        self.__set_columns(default_columns if columns is None else
+                           get_columns(columns))
+
+    @property
+    def alignment_type(self):
+        """
+        Get the named tuple type of alignments read by the parser.
+        """
+        return self.__alignment_type
+
+    def __set_columns(self, columns):
+        """
+        Set the column layout of the BLAST tabular file.
+
+        :param columns: the column specifiers
+        :type columns: tuple
+        """
+        self.__alignment_type, self.__parse_alignment, \
+            self.__field_types = compile_parser(columns)
 
     def alignments(self):
         """
@@ -45,48 +215,579 @@ class BlastTab(object):
         :return: an alignment for the file the object was created from
         :rtype: Blast.Alignment
         """
-        for self.__line_parts in self.__reader:
-            if not self.__line_parts[0].startswith('#'):
-                # if the line starts with '#', then it is a
-                # comment and we skip it
-                yield self.__parse_blast_line()
+        parse_alignment = self.__parse_alignment
+        column_num = len(self.__field_types)
+        for line_parts in self.__reader:
+            if line_parts[0].startswith('#'):
+                # if the line starts with '#', then it is a comment
+                # and we skip it unless it specifies the columns
+                if self.__use_fields_line and \
+                        line_parts[0].startswith('# Fields:') and \
+                        line_parts[0] != self.__fields_line:
+                    self.__fields_line = line_parts[0]
+                    self.__set_columns(get_columns(self.__fields_line))
+                    parse_alignment = self.__parse_alignment
+                    column_num = len(self.__field_types)
+                continue
+            # check if the line contains the proper number of columns
+            if len(line_parts) != column_num:
+                logger.error('line %d: the incorrect number of '
+                             'columns', self.__reader.line_num)
+                raise BlastTabError
+            try:
+                alignment = parse_alignment(line_parts)
+            except ValueError:
+                self.__report_incorrect_value(line_parts)
+            yield alignment
 
-    def __parse_blast_line(self):
+    def __report_incorrect_value(self, line_parts):
         """
-        Parse the current line from the BLAST tabular file.
+        Find the incorrect numeric value in the line and report it.
 
-        :return: an alignment from the file the object was created from
-        :rtype: Blast.Alignment
+        :param line_parts: values of the line columns
+        :type line_parts: list
         """
-        line_parts = self.__line_parts
+        for field_type, value in zip(self.__field_types, line_parts):
+            try:
+                field_type(value)
+            except ValueError:
+                if field_type is float:
+                    logger.error('line %d: the incorrect numerical '
+                                 'value %s', self.__reader.line_num,
+                                 value)
+                else:
+                    logger.error('line %d: the incorrect integer '
+                                 'value %s', self.__reader.line_num,
+                                 value)
+                raise BlastTabError
+
+
+def get_blast_line(alignment):
+    """
+    Given an alignment, form its line in the BLAST tabular format.
+    Integral bit scores are written without the fractional part as
+    BLAST does.
+
+    :param alignment: an alignment
+    :type alignment: BlastTab.Alignment
+    :return: the BLAST tabular line
+    :rtype: str
+    """
+    values = list(alignment)
+    if 'bit_score' in alignment._fields:
+        i = alignment._fields.index('bit_score')
+        if isinstance(values[i], float) and values[i].is_integer():
+            values[i] = int(values[i])
+    return '\t'.join([str(x) for x in values]) + '\n'
 
-        # check if the line contains the proper number of columns
-        if len(line_parts) != 12:
-            logging.error('line %d: the incorrect number of '
-                          'columns', self.__reader.line_num)
+
+def check_fields(alignment, fields):
+    """
+    Check if an alignment has the specified fields. The query and
+    subject fields are present only if a query or subject sequence ID
+    column like qseqid or qaccver was specified.
+
+    :param alignment: an alignment
+    :param fields: the names of the fields
+    :type alignment: namedtuple
+    :type fields: tuple
+    """
+    for field in fields:
+        if field not in alignment._fields:
+            logger.error('missing alignment field %s', field)
             raise BlastTabError
 
-        # convert numeric values of identity, e-value and bit score
-        # to float numbers
-        for i in (2, 10, 11):
-            try:
-                line_parts[i] = float(line_parts[i])
-            except ValueError:
-                logging.error(
-                    'line %d: the incorrect numerical value '
-                    '%s', self.__reader.line_num, line_parts[i])
+
+def top_hits(alignments, k=1, key='bit_score', grouped=True):
+    """
+    Select the best alignments for each query. The best alignments
+    have the greatest key values, except for e-values which are
+    better if they are lower; tied alignments are selected in the
+    order of their appearance. If the alignments are grouped by their
+    queries, as BLAST reports them, then the best alignments of a
+    query are reported as soon as the next query starts, so only k
+    alignments are kept in memory.
+
+    :param alignments: alignments to select the best ones from
+    :param k: the number of best alignments for each query
+    :param key: the name of the alignment field to compare
+        alignments by
+    :param grouped: are the alignments grouped by their queries
+    :type alignments: iterable
+    :type k: int
+    :type key: str
+    :type grouped: bool
+    :return: the best alignments of each query from the best one to
+        the worst one; queries are reported in the order of their
+        appearance
+    :rtype: generator
+    """
+    if key in ('query', 'subject'):
+        logger.error('incorrect alignment key %s', key)
+        raise BlastTabError
+    sign = -1 if key == 'e_value' else 1
+    heaps = OrderedDict()
+    query = None
+    heap = []
+    key_index = None
+    for number, alignment in enumerate(alignments):
+        if key_index is None:
+            check_fields(alignment, ('query',))
+            if key not in alignment._fields:
+                logger.error('incorrect alignment key %s', key)
+                raise BlastTabError
+            key_index = alignment._fields.index(key)
+        if alignment.query != query:
+            if grouped:
+                for hit in sorted(heap, reverse=True):
+                    yield hit[2]
+                heap = []
+            else:
+                heap = heaps.setdefault(alignment.query, [])
+            query = alignment.query
+        # the negative number makes earlier alignments better than
+        # later ones with the same key value
+        hit = (sign * alignment[key_index], -number, alignment)
+        if len(heap) < k:
+            heapq.heappush(heap, hit)
+        elif hit > heap[0]:
+            heapq.heapreplace(heap, hit)
+    if grouped:
+        heaps[query] = heap
+    for heap in heaps.values():
+        for hit in sorted(heap, reverse=True):
+            yield hit[2]
+
+
+def best_hits(alignments, name_ids, key='bit_score'):
+    """
+    Get the best hit of each query. Query and subject names are
+    replaced by their numbers, so the hits are kept in a compact
+    dictionary; of alignments with the same key value, the first one
+    is taken.
+
+    :param alignments: alignments to get the best hits from
+    :param name_ids: a dictionary of numbers of query and subject
+        names; it is updated by new names
+    :param key: the name of the alignment field to compare
+        alignments by; e-values are better if they are lower, other
+        values are better if they are greater
+    :type alignments: iterable
+    :type name_ids: dict
+    :type key: str
+    :return: a dictionary which keys are query numbers and values are
+        tuples of subject numbers and key values of the best hits
+    :rtype: dict
+    """
+    sign = -1 if key == 'e_value' else 1
+    hits = dict()
+    key_index = None
+    for alignment in alignments:
+        if key_index is None:
+            check_fields(alignment, ('query', 'subject'))
+            if key not in alignment._fields or \
+                    key in ('query', 'subject'):
+                logger.error('incorrect alignment key %s', key)
                 raise BlastTabError
+            key_index = alignment._fields.index(key)
+        query = name_ids.setdefault(alignment.query, len(name_ids))
+        value = alignment[key_index]
+        if query not in hits or sign * value > sign * hits[query][1]:
+            hits[query] = (name_ids.setdefault(alignment.subject,
+                                               len(name_ids)), value)
+    return hits
+
+
+def reciprocal_best_hits(first_alignments, second_alignments,
+                         key='bit_score'):
+    """
+    Get reciprocal best hits of two searches, the first set of
+    sequences against the second one and vice versa. Each search is
+    reduced to the best hit of each query and then the best hits are
+    joined.
+
+    :param first_alignments: alignments of the first sequences
+        against the second ones
+    :param second_alignments: alignments of the second sequences
+        against the first ones
+    :param key: the name of the alignment field to compare
+        alignments by
+    :type first_alignments: iterable
+    :type second_alignments: iterable
+    :type key: str
+    :return: tuples of the first and second sequence names and key
+        values of their alignments in both searches; they are ordered
+        by the first appearance of the first sequences
+    :rtype: generator
+    """
+    name_ids = dict()
+    first_hits = best_hits(first_alignments, name_ids, key)
+    second_hits = best_hits(second_alignments, name_ids, key)
+    names = get_name_list(name_ids)
+    for query in sorted(first_hits):
+        subject, value = first_hits[query]
+        if subject in second_hits and second_hits[subject][0] == query:
+            yield (names[query], names[subject], value,
+                   second_hits[subject][1])
 
-        # convert numeric values of alignment length, the number of
-        # mismatches, the number of gap openings and query and subject
-        # coordinates
-        for i in range(3, 10):
+
+def merge_intervals(intervals):
+    """
+    Merge overlapping and adjacent intervals by sorting them and
+    sweeping through them.
+
+    :param intervals: a flat array of interval start and end
+        positions; the positions are 1-based and inclusive
+    :type intervals: array
+    :return: a list of tuples of start and end positions of the
+        merged intervals
+    :rtype: list
+    """
+    merged = []
+    for start, end in sorted(zip(intervals[0::2], intervals[1::2])):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def covered_regions(alignments, target='query', grouped=False):
+    """
+    Get regions of queries or subjects covered by alignments.
+    Alignments on the reverse strand, which start positions are
+    greater than their end ones, are handled. If the alignments are
+    grouped by their targets, then the regions of a target are
+    reported as soon as the next target starts.
+
+    :param alignments: alignments to get the covered regions from
+    :param target: either 'query' or 'subject'
+    :param grouped: are the alignments grouped by their targets
+    :type alignments: iterable
+    :type target: str
+    :type grouped: bool
+    :return: tuples of a target name, its length taken from the qlen
+        or slen column or None if the column is missing and a list
+        of tuples of covered region start and end positions
+    :rtype: generator
+    """
+    if target not in ('query', 'subject'):
+        logger.error('incorrect coverage target %s', target)
+        raise BlastTabError
+    prefix = target[0]
+    intervals = OrderedDict()
+    lengths = dict()
+    name = None
+    for alignment in alignments:
+        if name is None:
+            check_fields(alignment, (target,))
+        if getattr(alignment, target) != name:
+            if grouped and name is not None:
+                yield name, lengths.pop(name), \
+                    merge_intervals(intervals.pop(name))
+            name = getattr(alignment, target)
+            if name not in intervals:
+                intervals[name] = array('l')
+                lengths[name] = getattr(alignment, prefix + 'len',
+                                        None)
+        start = getattr(alignment, prefix + '_start')
+        end = getattr(alignment, prefix + '_end')
+        if start > end:
+            start, end = end, start
+        intervals[name].extend((start, end))
+    for name in intervals:
+        yield name, lengths[name], merge_intervals(intervals[name])
+
+
+def filter_lines(lines, max_e_value=None, min_identity=None,
+                 min_length=None, columns=None):
+    """
+    Select BLAST tabular lines of alignments that pass the specified
+    filters; comment lines are skipped. Only the filtered columns are
+    converted to numbers. Lines are numbered from one in error
+    messages.
+
+    :param lines: lines of a BLAST tabular file
+    :param max_e_value: the greatest e-value of an alignment
+    :param min_identity: the smallest identity of an alignment
+    :param min_length: the smallest length of an alignment
+    :param columns: the column specification; by default, the
+        default 12 columns are assumed
+    :type lines: list
+    :type max_e_value: float
+    :type min_identity: float
+    :type min_length: int
+    :type columns: str or tuple
+    :return: the lines of alignments passing the filters
+    :rtype: list
+    """
+    columns = default_columns if columns is None else \
+        get_columns(columns)
+    indices = []
+    for column, value in (('evalue', max_e_value),
+                          ('pident', min_identity),
+                          ('length', min_length)):
+        if value is not None and column not in columns:
+            logger.error('missing BLAST tabular column %s', column)
+            raise BlastTabError
+        indices.append(columns.index(column) if column in columns
+                       else None)
+    e_value_index, identity_index, length_index = indices
+    column_num = len(columns)
+    passed_lines = []
+    for line_num, line in enumerate(lines, start=1):
+        if line.startswith('#'):
+            continue
+        line_parts = line.split('\t')
+        if len(line_parts) != column_num:
+            logger.error('line %d: the incorrect number of columns',
+                         line_num)
+            raise BlastTabError
+        try:
+            if max_e_value is not None and \
+                    float(line_parts[e_value_index]) > max_e_value:
+                continue
+            if min_identity is not None and \
+                    float(line_parts[identity_index]) < min_identity:
+                continue
+            if min_length is not None and \
+                    int(line_parts[length_index]) < min_length:
+                continue
+        except ValueError:
+            logger.error('line %d: the incorrect numerical value',
+                         line_num)
+            raise BlastTabError
+        if not line.endswith('\n'):
+            line += '\n'
+        passed_lines.append(line)
+    return passed_lines
+
+
+def filter_chunk(filename, start, end, max_e_value=None,
+                 min_identity=None, min_length=None, columns=None):
+    """
+    Select lines of alignments passing the specified filters from a
+    byte range of a BLAST tabular file.
+
+    :param filename: a name of a BLAST tabular file
+    :param start: the range start position
+    :param end: the range end position
+    :param max_e_value: the greatest e-value of an alignment
+    :param min_identity: the smallest identity of an alignment
+    :param min_length: the smallest length of an alignment
+    :param columns: the column specification; by default, the
+        default 12 columns are assumed
+    :type filename: str
+    :type start: int
+    :type end: int
+    :type max_e_value: float
+    :type min_identity: float
+    :type min_length: int
+    :type columns: str or tuple
+    :return: the lines of alignments passing the filters
+    :rtype: str
+    """
+    return ''.join(filter_lines(parallel.read_lines(filename, start,
+                                                    end),
+                                max_e_value, min_identity, min_length,
+                                columns))
+
+
+def filter_blast(input_file, output_handle, max_e_value=None,
+                 min_identity=None, min_length=None, threads=1,
+                 columns=None):
+    """
+    Write alignments of a BLAST tabular file that pass the specified
+    filters to the specified destination. The file is split into
+    chunks of lines which are filtered in parallel; the passed lines
+    are written in their original order. Only a few chunks are
+    submitted to workers ahead of the written ones, so filtered lines
+    do not accumulate in memory if the output is slow.
+
+    :param input_file: a name of a BLAST tabular file
+    :param output_handle: a handle of an output BLAST tabular file
+    :param max_e_value: the greatest e-value of an alignment
+    :param min_identity: the smallest identity of an alignment
+    :param min_length: the smallest length of an alignment
+    :param threads: the number of worker processes
+    :param columns: the column specification, either a string of
+        column specifiers or a sequence of them; by default, the
+        default 12 columns are assumed
+    :type input_file: str
+    :type max_e_value: float
+    :type min_identity: float
+    :type min_length: int
+    :type threads: int
+    :type columns: str or tuple
+    """
+    if columns is not None:
+        columns = get_columns(columns)
+    for lines in parallel.map_chunks(
+            filter_chunk, input_file, threads,
+            (max_e_value, min_identity, min_length, columns)):
+        output_handle.write(lines)
+
+
+BlastTable = namedtuple('BlastTable', BlastTab.blast_field_names +
+                        ('queries', 'subjects'))
+
+# typecodes of arrays of BLAST tabular column values by their types;
+# query and subject names are replaced by their numbers in the lists
+# of names and other text columns are loaded to lists
+blast_table_typecodes = {int: 'i', float: 'd'}
+
+
+def encode_names(names, name_ids):
+    """
+    Replace names by their numbers; new names are numbered in the
+    order of their appearance.
+
+    :param names: names to be encoded
+    :param name_ids: a dictionary of numbers of names; it is updated
+        by new names
+    :type names: tuple
+    :type name_ids: dict
+    :return: numbers of the names
+    :rtype: list
+    """
+    return [name_ids.setdefault(x, len(name_ids)) for x in names]
+
+
+def get_name_list(name_ids):
+    """
+    Given a dictionary of name numbers, get the list of names ordered
+    by their numbers.
+
+    :param name_ids: a dictionary of name numbers
+    :type name_ids: dict
+    :return: the list of names
+    :rtype: list
+    """
+    names = [None] * len(name_ids)
+    for name, number in name_ids.items():
+        names[number] = name
+    return names
+
+
+def get_table_type(field_names):
+    """
+    Given names of alignment fields, get the named tuple type of
+    tables of their columns.
+
+    :param field_names: names of alignment fields
+    :type field_names: tuple
+    :return: the named tuple type of column tables
+    :rtype: type
+    """
+    if tuple(field_names) == BlastTab.blast_field_names:
+        return BlastTable
+    return namedtuple('BlastTable', tuple(field_names) +
+                      ('queries', 'subjects'))
+
+
+def check_table_lines(lines, first_line_num, field_types=None):
+    """
+    Find the first incorrect line among BLAST tabular lines and report
+    the error in it.
+
+    :param lines: lines of a BLAST tabular file
+    :param first_line_num: the number of the first line in the file
+    :param field_types: the types of the column values; by default,
+        the types of the default 12 columns are assumed
+    :type lines: list
+    :type first_line_num: int
+    :type field_types: list
+    """
+    if field_types is None:
+        field_types = compile_parser(default_columns)[2]
+    for line_num, line in enumerate(lines, first_line_num):
+        if line.startswith('#'):
+            continue
+        line_parts = line.rstrip('\n').split('\t')
+        if len(line_parts) != len(field_types):
+            logger.error('line %d: the incorrect number of columns',
+                         line_num)
+            raise BlastTabError
+        for field_type, value in zip(field_types, line_parts):
             try:
-                line_parts[i] = int(line_parts[i])
+                field_type(value)
             except ValueError:
-                logging.error(
-                    'line %d: the incorrect integer value '
-                    '%s', self.__reader.line_num, line_parts[i])
+                if field_type is float:
+                    logger.error('line %d: the incorrect numerical '
+                                 'value %s', line_num, value)
+                else:
+                    logger.error('line %d: the incorrect integer '
+                                 'value %s', line_num, value)
                 raise BlastTabError
 
-        return BlastTab.Alignment(*line_parts)
+
+def load_table(filename, chunk_size=8 * 1024 * 1024, columns=None):
+    """
+    Load alignments from a file in the BLAST tabular format to
+    columnar arrays. The file is read in chunks of lines and each
+    column of a chunk is converted at once. Query and subject names
+    are stored once in the queries and subjects lists and the query
+    and subject columns contain their numbers in these lists. The
+    numeric arrays can be wrapped by numpy.frombuffer without
+    copying; other text columns are loaded to lists.
+
+    :param filename: a name of a BLAST tabular file
+    :param chunk_size: the approximate size of a chunk in bytes
+    :param columns: the column specification, either a string of
+        column specifiers or a sequence of them; by default, the
+        default 12 columns are assumed
+    :type filename: str
+    :type chunk_size: int
+    :type columns: str or tuple
+    :return: a named tuple of column arrays and lists of query and
+        subject names
+    :rtype: tuple
+    """
+    alignment_type, _, field_types = compile_parser(
+        default_columns if columns is None else get_columns(columns))
+    field_names = alignment_type._fields
+    column_num = len(field_names)
+    name_ids = {'query': dict(), 'subject': dict()}
+    table_columns = []
+    for field_name, field_type in zip(field_names, field_types):
+        if field_name in name_ids:
+            table_columns.append(array('l'))
+        elif field_type is str:
+            table_columns.append([])
+        else:
+            table_columns.append(
+                array(blast_table_typecodes[field_type]))
+    line_num = 1
+    with io.open(filename) as input_file:
+        while True:
+            # complete the last line of the chunk
+            data = input_file.read(chunk_size) + input_file.readline()
+            if not data:
+                break
+            lines = data.split('\n')
+            if not lines[-1]:
+                lines.pop()
+            chunk_lines = lines
+            if data.startswith('#') or '\n#' in data:
+                lines = [x for x in lines if not x.startswith('#')]
+            try:
+                if any(x.count('\t') != column_num - 1 for x in lines):
+                    raise ValueError
+                fields = '\t'.join(lines).split('\t') if lines else []
+                for i, column in enumerate(table_columns):
+                    values = fields[i::column_num]
+                    if field_names[i] in name_ids:
+                        column.extend(encode_names(
+                            values, name_ids[field_names[i]]))
+                    elif field_types[i] is str:
+                        column.extend(values)
+                    else:
+                        column.extend(map(field_types[i], values))
+            except ValueError:
+                check_table_lines(chunk_lines, line_num, field_types)
+                raise
+            line_num += len(chunk_lines)
+    return get_table_type(field_names)(*(
+        table_columns + [get_name_list(name_ids['query']),
+                         get_name_list(name_ids['subject'])]))
@@ -5,6 +5,7 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import argparse
+import logging
 import pyfaidx
 import re
 import sys
@@ -19,8 +20,14 @@ from . import repeatmasker
 from . import snpeff
 from . import variants
 from . import interval
+from . import lav
+from . import blast
+from . import agp
 from . import __version__
 
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
 
 def bioformats():
     """
@@ -52,12 +59,22 @@ def bioformats():
         'gff2to3': gff2to3_parser,
         'snpeff2pph': snpeff2pph_parser,
         'gff2bed': gff2bed_parser,
+        'gffsort': gffsort_parser,
         'snpeff2bed': snpeff2bed_parser,
         'vcfgeno2bed': vcfgeno2bed_parser,
         'vcfeffect2bed': vcfeffect2bed_parser,
         'flanknfilter': flanknfilter_parser,
         'interval2bed': interval2bed_parser,
-        'vcf2bed': vcf2bed_parser
+        'vcf2bed': vcf2bed_parser,
+        'lav2chain': lav2chain_parser,
+        'lav2psl': lav2psl_parser,
+        'lav2bed': lav2bed_parser,
+        'blastbest': blastbest_parser,
+        'blastfilter': blastfilter_parser,
+        'blastrbh': blastrbh_parser,
+        'blastcov': blastcov_parser,
+        'liftover': liftover_parser,
+        'agp2fasta': agp2fasta_parser
     }
 
     for i in sorted(subparser_routines):
@@ -78,12 +95,22 @@ def bioformats():
         ('gff2to3', gff2to3_launcher),
         ('snpeff2pph', snpeff2pph_launcher),
         ('gff2bed', gff2bed_launcher),
+        ('gffsort', gffsort_launcher),
         ('snpeff2bed', snpeff2bed_launcher),
         ('vcfgeno2bed', vcfgeno2bed_launcher),
         ('vcfeffect2bed', vcfeffect2bed_launcher),
         ('flanknfilter', flanknfilter_launcher),
         ('interval2bed', interval2bed_launcher),
-        ('vcf2bed', vcf2bed_launcher)
+        ('vcf2bed', vcf2bed_launcher),
+        ('lav2chain', lav2chain_launcher),
+        ('lav2psl', lav2psl_launcher),
+        ('lav2bed', lav2bed_launcher),
+        ('blastbest', blastbest_launcher),
+        ('blastfilter', blastfilter_launcher),
+        ('blastrbh', blastrbh_launcher),
+        ('blastcov', blastcov_launcher),
+        ('liftover', liftover_launcher),
+        ('agp2fasta', agp2fasta_launcher)
     ])
 
     launchers[args.command](args)
@@ -573,45 +600,71 @@ def gfftagstat_parser(subparsers):
     parser.add_argument('-t', '--type', default=None,
                         help='filter GFF3 features by the specified '
                              'type')
+    parser.add_argument('-b', '--by_type', action='store_true',
+                        help='report tag counts for each feature type')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to analyze '
+                             'parts of the GFF3 file in parallel')
 
 
 def gfftagstat_launcher(args):
     """
     Launcher for the gfftagstat tool.
     """
-    with open(args.gff_file) as gff_file:
-        tag_stats = gff3.analyze_tags(gff_file, args.source, args.type)
-        is_filtered = args.source is not None or args.type is not None
-        total_count = tag_stats['total']
-        filtered_count = tag_stats['filtered']
-        if is_filtered:
-            print('Tag\tCount\t% Filtered\t% Total')
-            output_template = '{0}\t{1}\t{2:.2f}\t{3:.2f}'
-        else:
-            print('Tag\tCount\t% Total')
-            output_template = '{0}\t{1}\t{3:.2f}'
-
+    if args.threads > 1:
+        tag_stats = gff3.analyze_tags_parallel(args.gff_file,
+                                               args.source, args.type,
+                                               args.threads)
+    else:
+        with open(args.gff_file) as gff_file:
+            tag_stats = gff3.analyze_tags(gff_file, args.source,
+                                          args.type)
+    if args.by_type:
+        print('Type\tTag\tCount\t% Type')
+        type_counts = tag_stats['type_counts']
+        type_tag_counts = tag_stats['type_tag_counts']
+        for feature_type in sorted(type_counts.keys()):
+            print('{0}\t{1}\t{2}\t{3:.2f}'.format(
+                feature_type, '#records', type_counts[feature_type],
+                100))
+            tag_counts = type_tag_counts.get(feature_type, {})
+            for tag in sorted(tag_counts.keys()):
+                print('{0}\t{1}\t{2}\t{3:.2f}'.format(
+                    feature_type, tag, tag_counts[tag],
+                    100.0 * tag_counts[tag] /
+                    type_counts[feature_type]))
+        return
+    is_filtered = args.source is not None or args.type is not None
+    total_count = tag_stats['total']
+    filtered_count = tag_stats['filtered']
+    if is_filtered:
+        print('Tag\tCount\t% Filtered\t% Total')
+        output_template = '{0}\t{1}\t{2:.2f}\t{3:.2f}'
+    else:
+        print('Tag\tCount\t% Total')
+        output_template = '{0}\t{1}\t{3:.2f}'
+
+    print(output_template.format(
+        '#records',
+        total_count,
+        100.0 * total_count / filtered_count,
+        100
+    ))
+    if is_filtered:
         print(output_template.format(
-            '#records',
-            total_count,
-            100.0 * total_count / filtered_count,
-            100
+            '#filtered',
+            filtered_count,
+            100,
+            100.0 * filtered_count / total_count
+        ))
+    tag_counts = tag_stats['tag_counts']
+    for tag in sorted(tag_counts.keys()):
+        print(output_template.format(
+            tag,
+            tag_counts[tag],
+            100.0 * tag_counts[tag] / filtered_count,
+            100.0 * tag_counts[tag] / total_count
         ))
-        if is_filtered:
-            print(output_template.format(
-                '#filtered',
-                filtered_count,
-                100,
-                100.0 * filtered_count / total_count
-            ))
-        tag_counts = tag_stats['tag_counts']
-        for tag in sorted(tag_counts.keys()):
-            print(output_template.format(
-                tag,
-                tag_counts[tag],
-                100.0 * tag_counts[tag] / filtered_count,
-                100.0 * tag_counts[tag] / total_count
-            ))
 
 
 def gff2to3_parser(subparsers):
@@ -631,12 +684,21 @@ def gff2to3_parser(subparsers):
                         action='store_true',
                         help='ignore incorrect records in the '
                              'specified input GFF2 file')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to convert '
+                             'parts of the GFF2 file in parallel')
 
 
 def gff2to3_launcher(args):
     """
     Launcher for the gff2to3 tool.
     """
+    if args.threads > 1:
+        with open(args.output_file, 'w') as output_file:
+            gff3.gff2to3_parallel(args.gff2_file, output_file,
+                                  not args.ignore_incorrect_records,
+                                  args.threads)
+        return
     with open(args.gff2_file) as input_file:
         with open(args.output_file, 'w') as output_file:
             gff3.gff2to3(input_file, output_file,
@@ -714,17 +776,68 @@ def gff2bed_parser(subparsers):
     parser.add_argument('--no_order_check', action='store_true',
                         help='do not check the order of GFF3 file '
                              'records')
+    parser.add_argument('-u', '--unsorted', action='store_true',
+                        help='group exons by their genes, so exons of '
+                             'a gene may be located anywhere in the '
+                             'GFF3 file')
+    parser.add_argument('--max_exons', type=int, default=1000000,
+                        help='the number of exons kept in memory in '
+                             'the unsorted mode; the rest are written '
+                             'to temporary files')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to convert '
+                             'parts of the GFF3 file in parallel (not '
+                             'used for BED12 files of genes)')
 
 
 def gff2bed_launcher(args):
     if args.genes:
         bed.convert_gff2bed_gene(args.gff_file, args.output_file,
                                  args.type, args.parent_tag,
-                                 args.no_order_check)
+                                 args.no_order_check, args.unsorted,
+                                 args.max_exons)
     else:
         bed.convert_gff2bed(args.gff_file, args.output_file,
                             args.type, args.name_tag,
-                            args.missing_value, args.attributes)
+                            args.missing_value, args.attributes,
+                            args.threads)
+
+
+def gffsort_parser(subparsers):
+    """
+    Parser for the gffsort tool.
+    """
+    parser = subparsers.add_parser(
+        'gffsort',
+        help='sort a GFF3 file',
+        description='Sort records of a GFF3 file by their sequences '
+                    'and start positions keeping parent features '
+                    'ahead of their children.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument('gff_file', help='a GFF3 file')
+    parser.add_argument('output_file',
+                        help='the output sorted GFF3 file')
+
+    # optional arguments
+    parser.add_argument('-b', '--buffer_size', type=int, default=256,
+                        help='the size of a file part sorted in '
+                             'memory in megabytes')
+    parser.add_argument('-T', '--tmp_dir', default=None,
+                        help='a directory for temporary files')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to sort parts '
+                             'of the GFF3 file in parallel')
+
+
+def gffsort_launcher(args):
+    """
+    Launcher for the gffsort tool.
+    """
+    gff3.sort_gff3(args.gff_file, args.output_file,
+                   args.buffer_size * 1024 * 1024, args.threads,
+                   args.tmp_dir)
 
 
 def snpeff2bed_parser(subparsers):
@@ -923,3 +1036,361 @@ def vcf2bed_launcher(args):
     Launcher for the vcf2bed tool.
     """
     variants.vcf2bed(args.vcf_file, args.bed_file)
+
+
+def lav2chain_parser(subparsers):
+    """
+    Parser for the lav2chain tool.
+    """
+    parser = subparsers.add_parser(
+        'lav2chain',
+        help='convert a LAV file to the chain format',
+        description='Convert alignment blocks of a LAV file to chains '
+                    'of gap-free segments.'
+    )
+    parser.add_argument('lav_file', help='a LAV file')
+    parser.add_argument('chain_file', help='the output chain file')
+
+
+def lav2chain_launcher(args):
+    """
+    Launcher for the lav2chain tool.
+    """
+    with open(args.chain_file, 'w') as chain_file:
+        lav.convert_lav(args.lav_file, chain_file, 'chain')
+
+
+def lav2psl_parser(subparsers):
+    """
+    Parser for the lav2psl tool.
+    """
+    parser = subparsers.add_parser(
+        'lav2psl',
+        help='convert a LAV file to the PSL format',
+        description='Convert alignment blocks of a LAV file to the '
+                    'PSL format; the first aligned sequence is the '
+                    'target and the second one is the query.'
+    )
+    parser.add_argument('lav_file', help='a LAV file')
+    parser.add_argument('psl_file', help='the output PSL file')
+
+
+def lav2psl_launcher(args):
+    """
+    Launcher for the lav2psl tool.
+    """
+    with open(args.psl_file, 'w') as psl_file:
+        lav.convert_lav(args.lav_file, psl_file, 'psl')
+
+
+def lav2bed_parser(subparsers):
+    """
+    Parser for the lav2bed tool.
+    """
+    parser = subparsers.add_parser(
+        'lav2bed',
+        help='convert a LAV file to the BED format',
+        description='Convert alignment blocks of a LAV file to BED12 '
+                    'records on the first aligned sequence.'
+    )
+    parser.add_argument('lav_file', help='a LAV file')
+    parser.add_argument('bed_file', help='the output BED file')
+
+
+def lav2bed_launcher(args):
+    """
+    Launcher for the lav2bed tool.
+    """
+    with open(args.bed_file, 'w') as bed_file:
+        lav.convert_lav(args.lav_file, bed_file, 'bed')
+
+
+def blastbest_parser(subparsers):
+    """
+    Parser for the blastbest tool.
+    """
+    parser = subparsers.add_parser(
+        'blastbest',
+        help='get the best hits from a BLAST tabular file',
+        description='Get the best alignments of each query from a file '
+                    'in the BLAST tabular format.'
+    )
+    parser.add_argument('blast_file', help='a BLAST tabular file')
+    parser.add_argument('output_file',
+                        help='the output BLAST tabular file')
+
+    # optional arguments
+    parser.add_argument('-k', '--hits', type=int, default=1,
+                        help='the number of best hits for each query')
+    parser.add_argument('--key', default='bit_score',
+                        help='the alignment field to select the best '
+                             'hits by, for example, bit_score, '
+                             'e_value or identity')
+    parser.add_argument('--columns',
+                        help='BLAST tabular column specifiers '
+                             'separated by spaces, for example, the '
+                             '-outfmt option value; by default, they '
+                             'are taken from the "# Fields:" lines '
+                             'or the default 12 columns are assumed')
+    parser.add_argument('-u', '--unsorted', action='store_true',
+                        help='alignments of the same query are not '
+                             'contiguous in the file')
+
+
+def blastbest_launcher(args):
+    """
+    Launcher for the blastbest tool.
+    """
+    with open(args.blast_file) as blast_file:
+        with open(args.output_file, 'w') as output_file:
+            for alignment in blast.top_hits(
+                    blast.BlastTab(blast_file,
+                                   args.columns).alignments(),
+                    args.hits, args.key, not args.unsorted):
+                output_file.write(blast.get_blast_line(alignment))
+
+
+def blastfilter_parser(subparsers):
+    """
+    Parser for the blastfilter tool.
+    """
+    parser = subparsers.add_parser(
+        'blastfilter',
+        help='filter alignments from a BLAST tabular file',
+        description='Filter alignments from a file in the BLAST '
+                    'tabular format by their e-values, identities and '
+                    'lengths.'
+    )
+    parser.add_argument('blast_file', help='a BLAST tabular file')
+    parser.add_argument('output_file',
+                        help='the output BLAST tabular file')
+
+    # optional arguments
+    parser.add_argument('-e', '--max_evalue', type=float,
+                        help='the greatest e-value of an alignment')
+    parser.add_argument('-i', '--min_identity', type=float,
+                        help='the smallest identity of an alignment')
+    parser.add_argument('-l', '--min_length', type=int,
+                        help='the smallest length of an alignment')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to filter parts '
+                             'of the BLAST tabular file in parallel')
+    parser.add_argument('--columns',
+                        help='BLAST tabular column specifiers '
+                             'separated by spaces, for example, the '
+                             '-outfmt option value; by default, the '
+                             'default 12 columns are assumed')
+
+
+def blastfilter_launcher(args):
+    """
+    Launcher for the blastfilter tool.
+    """
+    with open(args.output_file, 'w') as output_file:
+        blast.filter_blast(args.blast_file, output_file,
+                           args.max_evalue, args.min_identity,
+                           args.min_length, args.threads, args.columns)
+
+
+def blastrbh_parser(subparsers):
+    """
+    Parser for the blastrbh tool.
+    """
+    parser = subparsers.add_parser(
+        'blastrbh',
+        help='get reciprocal best hits from two BLAST tabular files',
+        description='Get reciprocal best hits from BLAST tabular files '
+                    'of two searches, the first sequences against the '
+                    'second ones and vice versa.'
+    )
+    parser.add_argument('first_blast_file',
+                        help='a BLAST tabular file of the first '
+                             'sequences against the second ones')
+    parser.add_argument('second_blast_file',
+                        help='a BLAST tabular file of the second '
+                             'sequences against the first ones')
+    parser.add_argument('output_file',
+                        help='the output file of reciprocal best hits')
+
+    # optional arguments
+    parser.add_argument('--key', default='bit_score',
+                        help='the alignment field to select the best '
+                             'hits by, for example, bit_score, '
+                             'e_value or identity')
+    parser.add_argument('--columns',
+                        help='BLAST tabular column specifiers '
+                             'separated by spaces, for example, the '
+                             '-outfmt option value; by default, they '
+                             'are taken from the "# Fields:" lines '
+                             'or the default 12 columns are assumed')
+
+
+def blastrbh_launcher(args):
+    """
+    Launcher for the blastrbh tool.
+    """
+    with open(args.first_blast_file) as first_file:
+        with open(args.second_blast_file) as second_file:
+            with open(args.output_file, 'w') as output_file:
+                for hit in blast.reciprocal_best_hits(
+                        blast.BlastTab(first_file,
+                                       args.columns).alignments(),
+                        blast.BlastTab(second_file,
+                                       args.columns).alignments(),
+                        args.key):
+                    output_file.write('\t'.join(
+                        [str(x) for x in hit]) + '\n')
+
+
+def blastcov_parser(subparsers):
+    """
+    Parser for the blastcov tool.
+    """
+    parser = subparsers.add_parser(
+        'blastcov',
+        help='get coverage of sequences by BLAST alignments',
+        description='Get fractions of queries or subjects covered by '
+                    'alignments from a BLAST tabular file.'
+    )
+    parser.add_argument('blast_file', help='a BLAST tabular file')
+    parser.add_argument('output_file',
+                        help='the output file of sequence coverage')
+
+    # optional arguments
+    parser.add_argument('-s', '--subject', action='store_true',
+                        help='get coverage of subjects instead of '
+                             'queries')
+    parser.add_argument('-f', '--fasta',
+                        help='a FASTA file of sequences to get their '
+                             'lengths from; by default, they are '
+                             'taken from the qlen or slen column')
+    parser.add_argument('-b', '--bed',
+                        help='a BED file to write covered regions to')
+    parser.add_argument('-u', '--unsorted', action='store_true',
+                        help='alignments of the same query are not '
+                             'contiguous in the file')
+    parser.add_argument('--columns',
+                        help='BLAST tabular column specifiers '
+                             'separated by spaces, for example, the '
+                             '-outfmt option value; by default, they '
+                             'are taken from the "# Fields:" lines '
+                             'or the default 12 columns are assumed')
+
+
+def blastcov_launcher(args):
+    """
+    Launcher for the blastcov tool.
+    """
+    target = 'subject' if args.subject else 'query'
+    grouped = not (args.subject or args.unsorted)
+    fasta = pyfaidx.Fasta(args.fasta) if args.fasta else None
+    bed_file = open(args.bed, 'w') if args.bed else None
+    try:
+        with open(args.blast_file) as blast_file:
+            with open(args.output_file, 'w') as output_file:
+                for seq, length, regions in blast.covered_regions(
+                        blast.BlastTab(blast_file,
+                                       args.columns).alignments(),
+                        target, grouped):
+                    if fasta is not None:
+                        try:
+                            length = len(fasta[seq])
+                        except KeyError:
+                            logger.error('sequence %s is missing in '
+                                         'FASTA file %s', seq,
+                                         args.fasta)
+                            raise exception.BlastTabError
+                    covered = sum(end - start + 1 for start, end in
+                                  regions)
+                    output_file.write('{}\t{}\t{}\t{}\n'.format(
+                        seq, 'NA' if length is None else length,
+                        covered, 'NA' if not length else
+                        '{:.4f}'.format(float(covered) / length)))
+                    if bed_file is not None:
+                        for start, end in regions:
+                            bed_file.write('{}\t{}\t{}\n'.format(
+                                seq, start - 1, end))
+    finally:
+        if bed_file is not None:
+            bed_file.close()
+
+
+def liftover_parser(subparsers):
+    """
+    Parser for the liftover tool.
+    """
+    parser = subparsers.add_parser(
+        'liftover',
+        help='translate coordinates between AGP components and objects',
+        description='Translate coordinates of records from a BED, VCF '
+                    'or GFF3 file from components of an AGP file to its '
+                    'objects or vice versa.'
+    )
+    parser.add_argument('agp_file', help='an AGP file')
+    parser.add_argument('input_file', help='a BED, VCF or GFF3 file')
+    parser.add_argument('output_file', help='the output file')
+
+    # optional arguments
+    parser.add_argument('-f', '--format',
+                        choices=sorted(agp.liftover_formats),
+                        help='the format of the input file; by '
+                             'default, it is guessed from the file '
+                             'extension')
+    parser.add_argument('-r', '--reverse', action='store_true',
+                        help='translate object coordinates to '
+                             'component ones')
+    parser.add_argument('-u', '--unmapped',
+                        help='a file to write records that cannot be '
+                             'translated to')
+
+
+def liftover_launcher(args):
+    """
+    Launcher for the liftover tool.
+    """
+    file_format = args.format
+    if file_format is None:
+        extension = args.input_file.rsplit('.', 1)[-1].lower()
+        file_format = {'gff': 'gff3'}.get(extension, extension)
+    with open(args.agp_file) as agp_file:
+        lifter = agp.Lifter(agp_file)
+    unmapped_file = open(args.unmapped, 'w') if args.unmapped else None
+    try:
+        with open(args.input_file) as input_file:
+            with open(args.output_file, 'w') as output_file:
+                agp.liftover(lifter, input_file, output_file,
+                             file_format, args.reverse, unmapped_file)
+    finally:
+        if unmapped_file is not None:
+            unmapped_file.close()
+
+
+def agp2fasta_parser(subparsers):
+    """
+    Parser for the agp2fasta tool.
+    """
+    parser = subparsers.add_parser(
+        'agp2fasta',
+        help='assemble sequences of AGP objects',
+        description='Assemble sequences of objects from an AGP file '
+                    'and a FASTA file of its components.'
+    )
+    parser.add_argument('agp_file', help='an AGP file')
+    parser.add_argument('fasta_file',
+                        help='a FASTA file of component sequences')
+    parser.add_argument('output_file', help='the output FASTA file')
+
+    # optional arguments
+    parser.add_argument('-w', '--width', type=int, default=72,
+                        help='the length of sequence lines')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='the number of processes to assemble '
+                             'objects in parallel')
+
+
+def agp2fasta_launcher(args):
+    """
+    Launcher for the agp2fasta tool.
+    """
+    agp.agp2fasta(args.agp_file, args.fasta_file, args.output_file,
+                  args.width, args.threads)
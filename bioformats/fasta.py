@@ -27,6 +27,7 @@ class Writer(object):
         """
         self.__filename = filename
         self.__width = width
+        self.__line_len = 0
 
     def __enter__(self):
         self.__output = open(self.__filename, 'w')
@@ -48,6 +49,49 @@ class Writer(object):
         self.__output.write('\n'.join(seq_lines))
         self.__output.write('\n')
 
+    def start(self, header):
+        """
+        Start a sequence which is written to the FASTA file by parts.
+
+        :param header: a sequence header
+        :type header: str
+        """
+        self.__output.write('>{}\n'.format(header))
+        self.__line_len = 0
+
+    def write_part(self, sequence):
+        """
+        Write a part of the started sequence to the FASTA file. The
+        part is wrapped to lines which continue the last line of the
+        previous part.
+
+        :param sequence: a part of a sequence
+        :type sequence: str
+        """
+        # the number of letters to complete the current line
+        head_len = self.__width - self.__line_len
+        if len(sequence) < head_len:
+            self.__output.write(sequence)
+            self.__line_len += len(sequence)
+            return
+        seq_lines = [sequence[:head_len]]
+        for i in range(head_len, len(sequence), self.__width):
+            seq_lines.append(sequence[i:i + self.__width])
+        self.__output.write('\n'.join(seq_lines))
+        if len(seq_lines) == 1 or len(seq_lines[-1]) == self.__width:
+            self.__output.write('\n')
+            self.__line_len = 0
+        else:
+            self.__line_len = len(seq_lines[-1])
+
+    def finish(self):
+        """
+        Finish the sequence written by parts.
+        """
+        if self.__line_len:
+            self.__output.write('\n')
+            self.__line_len = 0
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.__output.close()
 
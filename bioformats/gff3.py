@@ -5,10 +5,25 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import csv
+import heapq
+import io
 import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from array import array
 from collections import defaultdict, namedtuple, OrderedDict
+from itertools import groupby, islice
 from future.utils import iteritems
 from .exception import Gff3Error
+from . import bgzf
+from . import parallel
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -18,43 +33,439 @@ gff3_columns = ('seqid', 'source', 'type', 'start', 'end', 'score',
 
 Record = namedtuple('Record', gff3_columns)
 
+gff3_line_template = '\t'.join(['{}'] * 9) + '\n'
+gff3_short_line_template = '\t'.join(['{}'] * 8) + '\n'
+
+# a tag and a value of a GFF2 group column; a quoted value may
+# contain spaces, semicolons and escaped quotes
+gff2_attribute_pattern = re.compile(
+    r'\s*([^\s;"]+)\s+(?:"((?:[^"\\]|\\.)*)"|([^;]*?))\s*(?:;|$)')
+gff3_escape_pattern = re.compile('[%;=&,\t]')
+
+
+def iterate_attributes(attribute_line, line_num=None):
+    """
+    Given the attributes column of a GFF3 line, iterate through its
+    tags and values.
+
+    :param attribute_line: the attributes column of a GFF3 line
+    :param line_num: the number of the line the column was taken
+        from; it is used in error messages
+    :type attribute_line: str
+    :type line_num: int
+    :return: a tuple of an attribute tag and its value
+    :rtype: tuple
+    """
+    for x in attribute_line.split(';'):
+        try:
+            tag, value = x.split('=', 2)
+        except ValueError:
+            logger.error('line %d: the incorrect GFF3 attribute %s',
+                         line_num, x)
+            raise Gff3Error
+        if not tag or not value:
+            logger.error('line %d: the incorrect GFF3 attribute %s',
+                         line_num, x)
+            raise Gff3Error
+        yield tag, value
+
+
+def parse_attributes(attribute_line, line_num=None):
+    """
+    Given the attributes column of a GFF3 line, parse its tags and
+    values.
+
+    :param attribute_line: the attributes column of a GFF3 line
+    :param line_num: the number of the line the column was taken
+        from; it is used in error messages
+    :type attribute_line: str
+    :type line_num: int
+    :return: a dictionary of attribute tags and their values
+    :rtype: OrderedDict
+    """
+    return OrderedDict(iterate_attributes(attribute_line, line_num))
+
+
+class LazyAttributes(MutableMapping):
+    """
+    This class implements a dictionary of GFF3 record attributes that
+    parses the attributes column only when its tags or values are
+    accessed for the first time.
+    """
+    def __init__(self, attribute_line, line_num=None):
+        """
+        Given the attributes column of a GFF3 line, create a lazy
+        dictionary of attributes from it.
+
+        :param attribute_line: the attributes column of a GFF3 line
+        :param line_num: the number of the line the column was taken
+            from
+        :type attribute_line: str
+        :type line_num: int
+        """
+        self.__line = attribute_line
+        self.__line_num = line_num
+        self.__attributes = None
+        self.__modified = False
+
+    @property
+    def raw(self):
+        """
+        Get the original attributes column the object was created
+        from.
+
+        :return: the attributes column of a GFF3 line
+        :rtype: str
+        """
+        return self.__line
+
+    @property
+    def modified(self):
+        """
+        Check if the attributes were changed after they had been
+        read.
+
+        :return: if the attributes were changed
+        :rtype: bool
+        """
+        return self.__modified
+
+    def __parsed(self):
+        """
+        Get the dictionary of parsed attributes, parse the
+        attributes column if it has not been done yet.
+
+        :return: a dictionary of attribute tags and their values
+        :rtype: OrderedDict
+        """
+        if self.__attributes is None:
+            self.__attributes = parse_attributes(self.__line,
+                                                 self.__line_num)
+        return self.__attributes
+
+    def __getitem__(self, tag):
+        return self.__parsed()[tag]
+
+    def __setitem__(self, tag, value):
+        self.__parsed()[tag] = value
+        self.__modified = True
+
+    def __delitem__(self, tag):
+        del self.__parsed()[tag]
+        self.__modified = True
+
+    def __contains__(self, tag):
+        return tag in self.__parsed()
+
+    def __iter__(self):
+        return iter(self.__parsed())
+
+    def __len__(self):
+        return len(self.__parsed())
+
+    def __repr__(self):
+        return 'LazyAttributes({!r})'.format(self.__line)
+
+
+class CompactAttributes(Mapping):
+    """
+    This class implements a read-only dictionary of GFF3 record
+    attributes which values are kept in a tuple. Tags are kept in a
+    schema shared by all records with the same attribute tags.
+    """
+    __slots__ = ('__schema', '__values')
+
+    def __init__(self, schema, values):
+        """
+        Create a compact dictionary of attributes from a schema and a
+        tuple of values.
+
+        :param schema: a tuple of attribute tags and the dictionary
+            of their positions
+        :param values: a tuple of attribute values in the order of
+            the schema tags
+        :type schema: tuple
+        :type values: tuple
+        """
+        self.__schema = schema
+        self.__values = values
+
+    @property
+    def tags(self):
+        """
+        Get the tuple of attribute tags shared by records with the
+        same tags.
+
+        :return: a tuple of attribute tags
+        :rtype: tuple
+        """
+        return self.__schema[0]
+
+    def __getitem__(self, tag):
+        return self.__values[self.__schema[1][tag]]
+
+    def __contains__(self, tag):
+        return tag in self.__schema[1]
+
+    def __iter__(self):
+        return iter(self.__schema[0])
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __repr__(self):
+        return 'CompactAttributes({!r})'.format(
+            list(zip(self.__schema[0], self.__values)))
+
+
+class AttributeInterner(object):
+    """
+    This class implements interning of repeated strings of GFF3
+    records to keep many records in memory. Sequence names, sources,
+    types, attribute tags and values are replaced by shared string
+    objects and attributes are kept as compact dictionaries with
+    shared tag schemas.
+    """
+    def __init__(self, unique_tags=('ID', 'Name')):
+        """
+        Create an interner object.
+
+        :param unique_tags: attribute tags which values are mostly
+            unique, so they are not interned
+        :type unique_tags: tuple
+        """
+        self.__strings = dict()
+        self.__schemas = dict()
+        self.__unique_tags = frozenset(unique_tags)
+
+    def string(self, value):
+        """
+        Given a string, get its shared copy.
+
+        :param value: a string
+        :type value: str
+        :return: the shared copy of the string
+        :rtype: str
+        """
+        return self.__strings.setdefault(value, value)
+
+    def schema(self, tags):
+        """
+        Given a tuple of attribute tags, get its shared schema.
+
+        :param tags: a tuple of attribute tags
+        :type tags: tuple
+        :return: a tuple of attribute tags and the dictionary of their
+            positions
+        :rtype: tuple
+        """
+        if tags not in self.__schemas:
+            tags = tuple(self.string(x) for x in tags)
+            self.__schemas[tags] = (tags, dict(
+                (x, i) for i, x in enumerate(tags)))
+        return self.__schemas[tags]
+
+    def attributes(self, attribute_line, line_num=None):
+        """
+        Given the attributes column of a GFF3 line, parse it to a
+        compact dictionary of attributes.
+
+        :param attribute_line: the attributes column of a GFF3 line
+        :param line_num: the number of the line the column was taken
+            from; it is used in error messages
+        :type attribute_line: str
+        :type line_num: int
+        :return: a compact dictionary of attributes
+        :rtype: CompactAttributes
+        """
+        tags = []
+        values = []
+        for tag, value in iterate_attributes(attribute_line, line_num):
+            if tag not in self.__unique_tags:
+                value = self.string(value)
+            if tag in tags:
+                # the last value of a repeated tag is kept
+                values[tags.index(tag)] = value
+            else:
+                tags.append(tag)
+                values.append(value)
+        return CompactAttributes(self.schema(tuple(tags)),
+                                 tuple(values))
+
+    def record(self, line_parts, line_num=None):
+        """
+        Given a list of GFF3 record values with the unparsed
+        attributes column, form a compact record.
+
+        :param line_parts: a list of GFF3 record values
+        :param line_num: the number of the line the values were
+            taken from; it is used in error messages
+        :type line_parts: list
+        :type line_num: int
+        :return: a compact GFF3 record
+        :rtype: Record
+        """
+        for i in (0, 1, 2, 6):
+            line_parts[i] = self.string(line_parts[i])
+        if line_parts[8] is not None:
+            line_parts[8] = self.attributes(line_parts[8], line_num)
+        return Record(*line_parts)
+
 
 class Reader(object):
     """
     This class implements a parser to read data from a file in the
     GFF3 format.
     """
-    def __init__(self, handle):
+    def __init__(self, handle, check_header=True, interner=None):
         """
         Given a handle of a file, create a GFF3 reader object to read
         data from it.
 
         :param handle: a handle of a GFF3 file
+        :param check_header: check the GFF3 header line; it is
+            disabled to read a part of a GFF3 file
+        :param interner: if specified, then records are read in the
+            compact form using the interner; the lazy parsing of
+            attributes is not used in this case
+        :type check_header: bool
+        :type interner: AttributeInterner
         """
         self.__reader = csv.reader(handle, delimiter='\t')
         self.__line_parts = []
+        self.__record_count = 0
+        self.__check_header = check_header
+        self.__interner = interner
 
-    def records(self, check_order=False):
+    @property
+    def record_count(self):
+        """
+        Get the number of records read from a GFF3 file, including
+        the records skipped by the type and source filters.
+
+        :return: the number of read GFF3 records
+        :rtype: int
+        """
+        return self.__record_count
+
+    def records(self, check_order=False, types=None, sources=None,
+                lazy=False):
         """
         Iterate through records in the GFF3 file the object was
         created from.
 
         :param check_order: check if GFF3 records are sorted; if they
             are not, then raise the exception
+        :param types: if specified, then only records of the
+            specified types are returned
+        :param sources: if specified, then only records of the
+            specified sources are returned
+        :param lazy: parse the attributes column of a record only
+            when the attributes are accessed
         :type check_order: bool
+        :type types: iterable
+        :type sources: iterable
+        :type lazy: bool
         :return: a record from the GFF3 file the object was created
         from
         :rtype: Record
         """
+        for record in self.__read(check_order, types, sources, lazy):
+            if record is not None:
+                yield record
+
+    def batches(self, check_order=False, types=None, sources=None,
+                lazy=False):
+        """
+        Iterate through batches of records in the GFF3 file the
+        object was created from. Batches are separated by the ###
+        directive which indicates that all forward references to
+        features are resolved, so a batch usually contains one or
+        several complete gene models.
+
+        :param check_order: check if GFF3 records are sorted; if they
+            are not, then raise the exception
+        :param types: if specified, then only records of the
+            specified types are returned
+        :param sources: if specified, then only records of the
+            specified sources are returned
+        :param lazy: parse the attributes column of a record only
+            when the attributes are accessed
+        :type check_order: bool
+        :type types: iterable
+        :type sources: iterable
+        :type lazy: bool
+        :return: a list of records between two ### directives
+        :rtype: list
+        """
+        batch = []
+        for record in self.__read(check_order, types, sources, lazy):
+            if record is not None:
+                batch.append(record)
+            elif batch:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def __read(self, check_order, types, sources, lazy):
+        """
+        Iterate through records in the GFF3 file the object was
+        created from; the ### directive is denoted by None.
+
+        :param check_order: check if GFF3 records are sorted; if they
+            are not, then raise the exception
+        :param types: if specified, then only records of the
+            specified types are returned
+        :param sources: if specified, then only records of the
+            specified sources are returned
+        :param lazy: parse the attributes column of a record only
+            when the attributes are accessed
+        :type check_order: bool
+        :type types: iterable
+        :type sources: iterable
+        :type lazy: bool
+        :return: a record from the GFF3 file or None
+        :rtype: Record
+        """
+        if types is not None:
+            types = frozenset(types)
+        if sources is not None:
+            sources = frozenset(sources)
         # check the first line of the file
-        first_line = next(self.__reader)[0]
-        if first_line.rstrip() != '##gff-version 3':
-            logger.error('an incorrect GFF3 header')
-            raise Gff3Error
+        if self.__check_header:
+            first_line = next(self.__reader)[0]
+            if first_line.rstrip() != '##gff-version 3':
+                logger.error('an incorrect GFF3 header')
+                raise Gff3Error
         prev_seq = ''
         prev_start = -1
         for self.__line_parts in self.__reader:
-            new_record = self.__parse_gff3_line()
+            if self.__line_parts and \
+                    self.__line_parts[0].startswith('#'):
+                # process directives and skip comments
+                directive = self.__line_parts[0].rstrip()
+                if directive == '###':
+                    yield None
+                elif directive == '##FASTA':
+                    # the rest of the file contains sequences
+                    break
+                continue
+            self.__record_count += 1
+            if len(self.__line_parts) < 8:
+                logger.error('line %d: the incorrect number of '
+                             'columns - %d', self.__reader.line_num,
+                             len(self.__line_parts))
+                raise Gff3Error
+            # the type and source filters are checked on raw column
+            # values, so skipped records are never converted
+            if types is not None and self.__line_parts[2] not in \
+                    types:
+                continue
+            if sources is not None and self.__line_parts[1] not in \
+                    sources:
+                continue
+            new_record = self.__parse_gff3_line(lazy)
             if check_order and ((prev_seq > new_record.seqid) or (
                         (prev_seq == new_record.seqid) and
                         (prev_start > new_record.start))):
@@ -65,20 +476,17 @@ class Reader(object):
             prev_start = new_record.start
             yield new_record
 
-    def __parse_gff3_line(self):
+    def __parse_gff3_line(self, lazy=False):
         """
         Parse the current line from the GFF3 file.
 
+        :param lazy: postpone parsing of the attributes column until
+            the attributes are accessed
+        :type lazy: bool
         :return: a record from the GFF3 file the object was created
             from
         :rtype: Record
         """
-        if len(self.__line_parts) < 8:
-            logger.error('line %d: the incorrect number of columns - '
-                         '%d', self.__reader.line_num,
-                         len(self.__line_parts))
-            raise Gff3Error
-
         if len(self.__line_parts) > 9:
             # in the attributes column, some values may contain tab
             # characters that leads to multiple fields; so we
@@ -110,52 +518,567 @@ class Reader(object):
                              self.__line_parts[5])
                 raise Gff3Error
 
-        if len(self.__line_parts) == 9:
+        if len(self.__line_parts) < 9:
+            self.__line_parts += [None]
+
+        if self.__interner is not None:
+            return self.__interner.record(self.__line_parts,
+                                          self.__reader.line_num)
+
+        if self.__line_parts[8] is not None:
             # parse the attributes
-            attributes = OrderedDict()
-            for x in self.__line_parts[8].split(';'):
+            if lazy:
+                self.__line_parts[8] = LazyAttributes(
+                    self.__line_parts[8], self.__reader.line_num)
+            else:
+                self.__line_parts[8] = parse_attributes(
+                    self.__line_parts[8], self.__reader.line_num)
+
+        return Record(*self.__line_parts)
+
+
+class FeatureIndex(object):
+    """
+    This class implements an index of the feature hierarchy of a GFF3
+    file. The index is built in one pass over the file; features are
+    referred to by their offsets, that is, their numbers in the file,
+    and parent-child links are kept in integer arrays.
+    """
+    def __init__(self, handle):
+        """
+        Given a handle of a GFF3 file, read its records and index
+        their IDs and parent-child links.
+
+        :param handle: a handle of a GFF3 file
+        """
+        self.__records = []
+        self.__ids = dict()
+        link_children = array('l')
+        link_parents = []
+        for offset, record in enumerate(Reader(handle).records(
+                lazy=True)):
+            self.__records.append(record)
+            if record.attributes is None:
+                continue
+            feature_id = record.attributes.get('ID')
+            # a feature spanning multiple lines shares its ID between
+            # them, the first line of the feature is indexed
+            if feature_id is not None and feature_id not in \
+                    self.__ids:
+                self.__ids[feature_id] = offset
+            parent_line = record.attributes.get('Parent')
+            if parent_line is not None:
+                for parent_id in parent_line.split(','):
+                    link_children.append(offset)
+                    link_parents.append(parent_id)
+
+        # parents may be specified before or after their children,
+        # so the links are resolved when all IDs are known
+        resolved_parents = array('l')
+        for child, parent_id in zip(link_children, link_parents):
+            if parent_id not in self.__ids:
+                logger.error('record %d: the missing parent feature '
+                             '%s', child + 1, parent_id)
+                raise Gff3Error
+            resolved_parents.append(self.__ids[parent_id])
+
+        self.__parent_starts, self.__parents = self.__group_links(
+            link_children, resolved_parents)
+        self.__child_starts, self.__children = self.__group_links(
+            resolved_parents, link_children)
+
+    def __group_links(self, sources, targets):
+        """
+        Given two arrays of linked feature offsets, group the targets
+        by their sources using the counting sort.
+
+        :param sources: offsets of features the links start from
+        :param targets: offsets of features the links lead to
+        :type sources: array
+        :type targets: array
+        :return: a tuple of two arrays: the first one contains
+            start positions of feature link groups in the second one
+        :rtype: tuple
+        """
+        starts = array('l', [0] * (len(self.__records) + 1))
+        for i in sources:
+            starts[i + 1] += 1
+        for i in range(len(self.__records)):
+            starts[i + 1] += starts[i]
+        grouped = array('l', [0] * len(targets))
+        next_pos = array('l', starts)
+        for i, j in zip(sources, targets):
+            grouped[next_pos[i]] = j
+            next_pos[i] += 1
+        return starts, grouped
+
+    def __len__(self):
+        return len(self.__records)
+
+    def __contains__(self, feature_id):
+        return feature_id in self.__ids
+
+    def offset(self, feature):
+        """
+        Given a feature ID or offset, get the feature offset.
+
+        :param feature: a feature ID or offset
+        :type feature: str or int
+        :return: the feature offset
+        :rtype: int
+        """
+        if feature in self.__ids:
+            return self.__ids[feature]
+        if isinstance(feature, int) and \
+                0 <= feature < len(self.__records):
+            return feature
+        logger.error('the missing feature %s', feature)
+        raise Gff3Error
+
+    def record(self, feature):
+        """
+        Given a feature ID or offset, get its GFF3 record.
+
+        :param feature: a feature ID or offset
+        :type feature: str or int
+        :return: the GFF3 record of the feature
+        :rtype: Record
+        """
+        return self.__records[self.offset(feature)]
+
+    def children(self, feature, feature_type=None):
+        """
+        Given a feature ID or offset, get records of its children.
+
+        :param feature: a feature ID or offset
+        :param feature_type: if specified, then only children of the
+            specified type are returned
+        :type feature: str or int
+        :type feature_type: str
+        :return: a list of GFF3 records
+        :rtype: list
+        """
+        i = self.offset(feature)
+        return [self.__records[j] for j in self.__children[
+            self.__child_starts[i]:self.__child_starts[i + 1]]
+                if feature_type is None or
+                self.__records[j].type == feature_type]
+
+    def parents(self, feature, feature_type=None):
+        """
+        Given a feature ID or offset, get records of its parents.
+
+        :param feature: a feature ID or offset
+        :param feature_type: if specified, then only parents of the
+            specified type are returned
+        :type feature: str or int
+        :type feature_type: str
+        :return: a list of GFF3 records
+        :rtype: list
+        """
+        i = self.offset(feature)
+        return [self.__records[j] for j in self.__parents[
+            self.__parent_starts[i]:self.__parent_starts[i + 1]]
+                if feature_type is None or
+                self.__records[j].type == feature_type]
+
+    def descendants(self, feature, feature_type=None):
+        """
+        Given a feature ID or offset, get records of all features
+        below it in the hierarchy, for example, all exons of a gene.
+
+        :param feature: a feature ID or offset
+        :param feature_type: if specified, then only descendants of
+            the specified type are returned
+        :type feature: str or int
+        :type feature_type: str
+        :return: a list of GFF3 records
+        :rtype: list
+        """
+        return self.__walk(self.offset(feature), self.__child_starts,
+                           self.__children, feature_type)
+
+    def ancestors(self, feature, feature_type=None):
+        """
+        Given a feature ID or offset, get records of all features
+        above it in the hierarchy, for example, the gene of an exon.
+
+        :param feature: a feature ID or offset
+        :param feature_type: if specified, then only ancestors of the
+            specified type are returned
+        :type feature: str or int
+        :type feature_type: str
+        :return: a list of GFF3 records
+        :rtype: list
+        """
+        return self.__walk(self.offset(feature), self.__parent_starts,
+                           self.__parents, feature_type)
+
+    def __walk(self, offset, starts, links, feature_type):
+        """
+        Traverse the feature hierarchy from the specified feature
+        following the given links.
+
+        :param offset: the offset of a feature to start from
+        :param starts: start positions of link groups
+        :param links: grouped feature links
+        :param feature_type: if specified, then only features of the
+            specified type are returned
+        :type offset: int
+        :type starts: array
+        :type links: array
+        :type feature_type: str
+        :return: a list of GFF3 records in the traversal order
+        :rtype: list
+        """
+        result = []
+        visited = {offset}
+        queue = [offset]
+        for i in queue:
+            for j in links[starts[i]:starts[i + 1]]:
+                if j not in visited:
+                    visited.add(j)
+                    queue.append(j)
+                    if feature_type is None or \
+                            self.__records[j].type == feature_type:
+                        result.append(self.__records[j])
+        return result
+
+
+class IndexedReader(object):
+    """
+    This class implements random access to records of a GFF3 file by
+    their locations. A sidecar index keeps byte offsets of sequence
+    blocks of the file and, for each block, offsets of the first
+    records overlapping fixed-size coordinate bins. Records of a
+    sequence must be contiguous and sorted by their start positions.
+    """
+    index_header = '#bioformats GFF3 index'
+
+    def __init__(self, filename, index_filename=None, bin_size=16384):
+        """
+        Given a name of a GFF3 file, create an indexed reader for it.
+        The index is read from the specified sidecar file; if the file
+        is missing, outdated or has another bin size, then the index
+        is built and written to it. If the sidecar file cannot be
+        written, for example, in a read-only directory, then the
+        index is kept in memory only.
+
+        :param filename: a name of a GFF3 file
+        :param index_filename: a name of the index file; by default,
+            the '.idx' suffix is added to the GFF3 file name
+        :param bin_size: the size of a coordinate bin in bp
+        :type filename: str
+        :type index_filename: str
+        :type bin_size: int
+        """
+        self.__filename = filename
+        if index_filename is None:
+            index_filename = filename + '.idx'
+        self.__index_filename = index_filename
+        self.__bin_size = bin_size
+        self.__blocks = OrderedDict()
+        if not self.__read_index():
+            self.build_index()
+            self.__write_index()
+
+    @property
+    def seqids(self):
+        """
+        Get names of sequences which records are in the GFF3 file.
+
+        :return: a list of sequence names
+        :rtype: list
+        """
+        return list(self.__blocks.keys())
+
+    def __file_stamp(self):
+        """
+        Get the size and the modification time of the GFF3 file to
+        check if its index is up to date.
+
+        :return: a string of the GFF3 file size and modification time
+        :rtype: str
+        """
+        stat = os.stat(self.__filename)
+        return '{}\t{}'.format(stat.st_size, int(stat.st_mtime))
+
+    def __read_index(self):
+        """
+        Read the index from its sidecar file.
+
+        :return: if the index was read; False means that the index
+            file is missing, outdated or has another bin size
+        :rtype: bool
+        """
+        if not os.path.isfile(self.__index_filename):
+            return False
+        with open(self.__index_filename) as index_file:
+            if index_file.readline().rstrip('\n') != \
+                    '{}\t{}'.format(IndexedReader.index_header,
+                                    self.__file_stamp()):
+                return False
+            if int(index_file.readline()) != self.__bin_size:
+                return False
+            for line in index_file:
+                seqid, block_start, block_end, bins = \
+                    line.rstrip('\n').split('\t')
+                self.__blocks[seqid] = (
+                    int(block_start), int(block_end),
+                    array('l', [int(x) for x in bins.split(',')]))
+        return True
+
+    def __write_index(self):
+        """
+        Write the index to its sidecar file. If the file cannot be
+        written, then the error is reported as a warning and an
+        incomplete file is removed.
+        """
+        try:
+            with open(self.__index_filename, 'w') as index_file:
+                index_file.write('{}\t{}\n'.format(
+                    IndexedReader.index_header, self.__file_stamp()))
+                index_file.write('{}\n'.format(self.__bin_size))
+                for seqid, (block_start, block_end, bins) in iteritems(
+                        self.__blocks):
+                    index_file.write('{}\t{}\t{}\t{}\n'.format(
+                        seqid, block_start, block_end,
+                        ','.join(str(x) for x in bins)))
+        except (IOError, OSError) as error:
+            logger.warning('cannot write the GFF3 index file %s: %s',
+                           self.__index_filename, error)
+            if os.path.isfile(self.__index_filename):
+                try:
+                    os.unlink(self.__index_filename)
+                except OSError:
+                    pass
+
+    def build_index(self):
+        """
+        Read the GFF3 file and build the index of its records.
+        """
+        self.__blocks = OrderedDict()
+        offset = get_header_size(self.__filename)
+        bins = None
+        cur_seqid = None
+        block_start = prev_start = 0
+        with io.open(self.__filename, 'rb') as gff_file:
+            gff_file.seek(offset)
+            for line_num, line in enumerate(gff_file, start=2):
+                if line.startswith(b'##FASTA'):
+                    break
+                if line.startswith(b'#'):
+                    offset += len(line)
+                    continue
+                line_parts = line.split(b'\t', 5)
+                if len(line_parts) < 6:
+                    logger.error('line %d: the incorrect number of '
+                                 'columns', line_num)
+                    raise Gff3Error
+                seqid = line_parts[0].decode('utf-8')
                 try:
-                    tag, value = x.split('=', 2)
+                    start = int(line_parts[3])
+                    end = int(line_parts[4])
                 except ValueError:
-                    logger.error('line %d: the incorrect GFF3 '
-                                 'attribute %s',
-                                 self.__reader.line_num, x)
+                    logger.error('line %d: the incorrect numeric '
+                                 'value', line_num)
                     raise Gff3Error
-                if not tag or not value:
-                    logger.error('line %d: the incorrect GFF3 '
-                                 'attribute %s',
-                                 self.__reader.line_num, x)
+                if seqid != cur_seqid:
+                    if cur_seqid is not None:
+                        self.__add_block(cur_seqid, block_start,
+                                         offset, bins)
+                    if seqid in self.__blocks:
+                        logger.error('line %d: records of sequence %s '
+                                     'are not contiguous', line_num,
+                                     seqid)
+                        raise Gff3Error
+                    cur_seqid = seqid
+                    block_start = offset
+                    prev_start = 0
+                    bins = array('l')
+                if start < prev_start:
+                    logger.error('line %d: GFF3 record order violated',
+                                 line_num)
                     raise Gff3Error
-                attributes[tag] = value
-            self.__line_parts[8] = attributes
-        else:
-            self.__line_parts += [None]
+                prev_start = start
+                # mark the bins the record overlaps
+                last_bin = (max(start, end) - 1) // self.__bin_size
+                if len(bins) <= last_bin:
+                    bins.extend([-1] * (last_bin + 1 - len(bins)))
+                for i in range((start - 1) // self.__bin_size,
+                               last_bin + 1):
+                    if bins[i] < 0:
+                        bins[i] = offset
+                offset += len(line)
+        if cur_seqid is not None:
+            self.__add_block(cur_seqid, block_start, offset, bins)
 
-        return Record(*self.__line_parts)
+    def __add_block(self, seqid, block_start, block_end, bins):
+        """
+        Add a block of sequence records to the index.
+
+        :param seqid: a sequence name
+        :param block_start: the offset of the first block record
+        :param block_end: the offset of the block end
+        :param bins: offsets of the first records overlapping
+            coordinate bins; -1 denotes a bin without records
+        :type seqid: str
+        :type block_start: int
+        :type block_end: int
+        :type bins: array
+        """
+        # a bin without records starts from the next non-empty bin
+        next_offset = block_end
+        for i in range(len(bins) - 1, -1, -1):
+            if bins[i] < 0:
+                bins[i] = next_offset
+            else:
+                next_offset = bins[i]
+        self.__blocks[seqid] = (block_start, block_end, bins)
+
+    def fetch(self, seqid, start=None, end=None, lazy=False):
+        """
+        Iterate through records of the GFF3 file that overlap the
+        specified region.
+
+        :param seqid: a sequence name
+        :param start: the region start position (1-based); if it is
+            not specified, then records from the sequence start are
+            returned
+        :param end: the region end position (inclusive); if it is not
+            specified, then records up to the sequence end are
+            returned
+        :param lazy: parse the attributes column of a record only
+            when the attributes are accessed
+        :type seqid: str
+        :type start: int
+        :type end: int
+        :type lazy: bool
+        :return: a record from the GFF3 file
+        :rtype: Record
+        """
+        if seqid not in self.__blocks:
+            return
+        block_start, block_end, bins = self.__blocks[seqid]
+        offset = block_start
+        if start is not None:
+            start_bin = (start - 1) // self.__bin_size
+            offset = bins[start_bin] if start_bin < len(bins) else \
+                block_end
+        with io.open(self.__filename, 'rb') as gff_file:
+            gff_file.seek(offset)
+            lines = self.__read_lines(gff_file, block_end)
+            for record in Reader(lines, check_header=False).records(
+                    lazy=lazy):
+                if end is not None and record.start > end:
+                    break
+                if start is None or record.end >= start:
+                    yield record
+
+    @staticmethod
+    def __read_lines(gff_file, end_offset):
+        """
+        Iterate through lines of a GFF3 file up to the specified
+        offset.
+
+        :param gff_file: a GFF3 file opened in the binary mode
+        :param end_offset: the offset to stop reading lines at
+        :type end_offset: int
+        :return: a line from the GFF3 file
+        :rtype: str
+        """
+        while gff_file.tell() < end_offset:
+            line = gff_file.readline()
+            if not isinstance(line, str):
+                line = line.decode('utf-8')
+            yield line
+
+
+def get_attribute_line(attributes):
+    """
+    Given attributes of a GFF3 record, form its attributes column.
+    The raw column of lazily parsed attributes is returned unchanged
+    if they were not modified.
+
+    :param attributes: attributes of a GFF3 record
+    :type attributes: dict
+    :return: the attributes column
+    :rtype: str
+    """
+    if isinstance(attributes, LazyAttributes) and \
+            not attributes.modified:
+        return attributes.raw
+    return ';'.join(['{}={}'.format(x, y) for x, y in
+                     iteritems(attributes)])
+
+
+def get_record_line(gff3_record):
+    """
+    Given a GFF3 record, form its line.
+
+    :param gff3_record: a GFF3 record
+    :type gff3_record: Record
+    :return: the GFF3 line of the record
+    :rtype: str
+    """
+    attributes = gff3_record[8]
+    if isinstance(attributes, LazyAttributes) and \
+            not attributes.modified:
+        # the raw column is written without parsing it
+        attribute_line = attributes.raw
+    elif attributes is not None and len(attributes) > 0:
+        attribute_line = get_attribute_line(attributes)
+    else:
+        attribute_line = None
+    if attribute_line:
+        return gff3_line_template.format(
+            *(tuple(gff3_record[:8]) + (attribute_line, )))
+    # records without attributes are written without the last column
+    return gff3_short_line_template.format(*gff3_record[:8])
 
 
 class Writer(object):
     """
     The class implements writing to a file in the GFF3 format.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, buffer_size=1, compress=False):
         """
         Given a name of a file, create a GFF3 writer object to write
         data to it.
 
         :param filename: a name of a file to write GFF3 records to
+        :param buffer_size: the number of records kept in memory
+            before they are written to the file
+        :param compress: compress the file in the BGZF format
         :type filename: str
+        :type buffer_size: int
+        :type compress: bool
         """
         self.__filename = filename
+        self.__buffer_size = buffer_size
+        self.__compress = compress
+        self.__buffer = []
 
     def __enter__(self):
-        self.__output = open(self.__filename, 'w')
+        if self.__compress:
+            self.__output = bgzf.Writer(self.__filename)
+        else:
+            self.__output = open(self.__filename, 'w')
         self.__output.write('##gff-version 3\n')
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
         self.__output.close()
 
+    def flush(self):
+        """
+        Write the buffered records to the file.
+        """
+        if self.__buffer:
+            self.__output.writelines(self.__buffer)
+            self.__buffer = []
+
     def write(self, gff3_record):
         """
         Given a GFF3 record, write it to the file specified when the
@@ -164,97 +1087,683 @@ class Writer(object):
         :param gff3_record: a GFF3 record to be written to the file
         :type gff3_record: Record
         """
-        gff3_record = list(gff3_record)
-        # prepare the attributes line
-        if gff3_record[-1]:
-            attributes = ['{}={}'.format(x, y) for x, y in
-                          iteritems(gff3_record[-1])]
-            gff3_record[-1] = ';'.join(attributes)
-        else:
-            gff3_record = gff3_record[:-1]
+        self.__buffer.append(get_record_line(gff3_record))
+        if len(self.__buffer) >= self.__buffer_size:
+            self.flush()
 
-        template = '\t'.join(['{}'] * len(gff3_record)) + '\n'
-        self.__output.write(template.format(*gff3_record))
+    def write_many(self, gff3_records):
+        """
+        Given an iterable of GFF3 records, write them to the file
+        specified when the object was created.
 
+        :param gff3_records: GFF3 records to be written to the file
+        """
+        for gff3_record in gff3_records:
+            self.__buffer.append(get_record_line(gff3_record))
+            if len(self.__buffer) >= self.__buffer_size:
+                self.flush()
 
-def analyze_tags(handle, feature_source=None, feature_type=None):
+
+def count_tags(lines, feature_source=None, feature_type=None):
     """
-    Given a handle of a GFF3 file, collect statistics on attribute
-    tags in it.
+    Given lines of GFF3 records, count attribute tags in them. Only
+    the source, type and attributes columns are read and tags are
+    extracted from the attributes column without parsing their
+    values, so the records are not checked for errors.
 
-    :param handle: a handle of a GFF3 file
+    :param lines: lines of GFF3 records
     :param feature_source: if specified, then only features of the
         specified source are considered
     :param feature_type: if specified, then only features of the
         specified type are considered
     :type feature_source: str
     :type feature_type: str
-    :return: a dictionary of three values: the total number of
-        processed features, the number of filtered features and the
-        dictionary of attribute tag counts
+    :return: a dictionary of tag statistics; see analyze_tags for
+        its description
     :rtype: dict
     """
     total_features = filtered_features = 0
     tag_counts = defaultdict(int)
-    for record in Reader(handle).records():
+    type_counts = defaultdict(int)
+    type_tag_counts = defaultdict(lambda: defaultdict(int))
+    for line in lines:
+        if line.startswith('#'):
+            # skip comments and directives
+            if line.startswith('##FASTA'):
+                break
+            continue
+        line_parts = line.rstrip('\r\n').split('\t', 8)
         total_features += 1
-        if feature_source is not None and record.source != \
+        if len(line_parts) < 8:
+            logger.error('record %d: the incorrect number of columns '
+                         '- %d', total_features, len(line_parts))
+            raise Gff3Error
+        if feature_source is not None and line_parts[1] != \
                 feature_source:
             continue
-        if feature_type is not None and record.type != feature_type:
+        if feature_type is not None and line_parts[2] != feature_type:
             continue
         filtered_features += 1
-        if record.attributes is not None:
-            for tag in record.attributes:
-                tag_counts[tag] += 1
+        type_counts[line_parts[2]] += 1
+        if len(line_parts) == 9:
+            cur_type_tag_counts = type_tag_counts[line_parts[2]]
+            # a tag repeated in a record is counted once
+            for tag in set(x.partition('=')[0] for x in
+                           line_parts[8].split(';')):
+                if tag:
+                    tag_counts[tag] += 1
+                    cur_type_tag_counts[tag] += 1
 
     return {'total': total_features,
             'filtered': filtered_features,
-            'tag_counts': tag_counts}
+            'tag_counts': tag_counts,
+            'type_counts': type_counts,
+            'type_tag_counts': type_tag_counts}
+
+
+def merge_tag_stats(stats, other_stats):
+    """
+    Given two dictionaries of tag statistics, add values of the
+    second one to the first one.
+
+    :param stats: a dictionary of tag statistics to be updated
+    :param other_stats: a dictionary of tag statistics to be added
+    :type stats: dict
+    :type other_stats: dict
+    :return: the updated dictionary of tag statistics
+    :rtype: dict
+    """
+    stats['total'] += other_stats['total']
+    stats['filtered'] += other_stats['filtered']
+    for tag, count in iteritems(other_stats['tag_counts']):
+        stats['tag_counts'][tag] += count
+    for feature_type, count in iteritems(other_stats['type_counts']):
+        stats['type_counts'][feature_type] += count
+    for feature_type, counts in iteritems(
+            other_stats['type_tag_counts']):
+        for tag, count in iteritems(counts):
+            stats['type_tag_counts'][feature_type][tag] += count
+    return stats
+
+
+def analyze_tags(handle, feature_source=None, feature_type=None):
+    """
+    Given a handle of a GFF3 file, collect statistics on attribute
+    tags in it.
+
+    :param handle: a handle of a GFF3 file
+    :param feature_source: if specified, then only features of the
+        specified source are considered
+    :param feature_type: if specified, then only features of the
+        specified type are considered
+    :type feature_source: str
+    :type feature_type: str
+    :return: a dictionary of five values: the total number of
+        processed features, the number of filtered features, the
+        dictionary of attribute tag counts, the dictionary of filtered
+        feature type counts and the dictionary of attribute tag counts
+        for each feature type
+    :rtype: dict
+    """
+    lines = iter(handle)
+    # check the first line of the file
+    if next(lines).rstrip() != '##gff-version 3':
+        logger.error('an incorrect GFF3 header')
+        raise Gff3Error
+    return count_tags(lines, feature_source, feature_type)
+
 
+def analyze_tags_chunk(filename, start, end, feature_source=None,
+                       feature_type=None):
+    """
+    Collect statistics on attribute tags from the specified byte
+    range of a GFF3 file.
 
-def gff2to3(input_handle, output_handle, strict=True):
+    :param filename: a name of a GFF3 file
+    :param start: the range start position
+    :param end: the range end position
+    :param feature_source: if specified, then only features of the
+        specified source are considered
+    :param feature_type: if specified, then only features of the
+        specified type are considered
+    :type filename: str
+    :type start: int
+    :type end: int
+    :type feature_source: str
+    :type feature_type: str
+    :return: a dictionary of tag statistics
+    :rtype: dict
+    """
+    stats = count_tags(parallel.read_lines(filename, start, end),
+                       feature_source, feature_type)
+    # nested default dictionaries with lambdas cannot be pickled
+    stats['type_tag_counts'] = dict(
+        (k, dict(v)) for k, v in iteritems(stats['type_tag_counts']))
+    return stats
+
+
+def analyze_tags_parallel(filename, feature_source=None,
+                          feature_type=None, threads=2):
+    """
+    Given a name of a GFF3 file, collect statistics on attribute tags
+    in it processing parts of the file in parallel.
+
+    :param filename: a name of a GFF3 file
+    :param feature_source: if specified, then only features of the
+        specified source are considered
+    :param feature_type: if specified, then only features of the
+        specified type are considered
+    :param threads: the number of worker processes
+    :type filename: str
+    :type feature_source: str
+    :type feature_type: str
+    :type threads: int
+    :return: a dictionary of tag statistics; see analyze_tags for
+        its description
+    :rtype: dict
+    """
+    stats = count_tags([])
+    for chunk_stats in parallel.map_chunks(
+            analyze_tags_chunk, filename, threads,
+            (feature_source, feature_type),
+            start=get_header_size(filename)):
+        merge_tag_stats(stats, chunk_stats)
+    return stats
+
+
+def get_header_size(filename):
+    """
+    Given a name of a GFF3 file, check its header line and get its
+    size in bytes.
+
+    :param filename: a name of a GFF3 file
+    :type filename: str
+    :return: the size of the GFF3 header line in bytes
+    :rtype: int
+    """
+    with io.open(filename, 'rb') as gff_file:
+        header = gff_file.readline()
+    if header.rstrip() != b'##gff-version 3':
+        logger.error('an incorrect GFF3 header')
+        raise Gff3Error
+    return len(header)
+
+
+def escape_gff3_value(value):
+    """
+    Escape characters that have special meaning in the GFF3 attribute
+    column.
+
+    :param value: an attribute value
+    :type value: str
+    :return: the escaped attribute value
+    :rtype: str
+    """
+    return gff3_escape_pattern.sub(
+        lambda x: '%{:02X}'.format(ord(x.group(0))), value)
+
+
+def convert_gff2_group(group):
+    """
+    Convert the group column of a GFF2 line to the GFF3 attribute
+    column.
+
+    :param group: the group column of a GFF2 line
+    :type group: str
+    :return: the GFF3 attribute column
+    :rtype: str
+    """
+    if ' ' not in group:
+        # we are dealing with a single attribute value in the
+        # group columns
+        return 'ATTR=' + escape_gff3_value(group)
+    attributes = []
+    position = 0
+    group_len = len(group)
+    while position < group_len:
+        match = gff2_attribute_pattern.match(group, position)
+        if match is None:
+            if group[position:].strip():
+                logger.error('the incorrect GFF2 group %s', group)
+                raise Gff3Error
+            break
+        tag, quoted_value, value = match.groups()
+        if quoted_value is not None:
+            # a quoted value may contain spaces and semicolons
+            value = quoted_value.replace('\\"', '"')
+        elif value[:1] == '"':
+            logger.error('the unterminated quoted value in the GFF2 '
+                         'group %s', group)
+            raise Gff3Error
+        attributes.append(tag + '=' + escape_gff3_value(value))
+        position = match.end()
+    return ';'.join(attributes)
+
+
+def convert_gff2_line(gff2_line, strict=True):
+    """
+    Convert a line from a GFF2 file to the GFF3 format.
+
+    :param gff2_line: a line from a GFF2 file
+    :param strict: throw an exception if the line is an incorrect
+        GFF2 record; otherwise just ignore it
+    :type gff2_line: str
+    :type strict: bool
+    :return: the GFF3 line or None if the line was ignored
+    :rtype: str
+    """
+    gff2_line = gff2_line.rstrip()
+    if not gff2_line:
+        # skip an empty line
+        return None
+    line_parts = gff2_line.split('\t', 8)
+    try:
+        if len(line_parts) < 9:
+            logger.error('an incorrect GFF2 line')
+            raise Gff3Error
+        line_parts[8] = convert_gff2_group(line_parts[8])
+    except Gff3Error:
+        if strict:
+            raise
+        return None
+    return '\t'.join(line_parts) + '\n'
+
+
+def convert_gff2_lines(gff2_lines, strict=True):
+    """
+    Convert a batch of lines from a GFF2 file to the GFF3 format.
+
+    :param gff2_lines: a list of lines from a GFF2 file
+    :param strict: throw an exception if an incorrect GFF2 record was
+        read; otherwise just ignore it
+    :type gff2_lines: list
+    :type strict: bool
+    :return: a list of the converted GFF3 lines
+    :rtype: list
+    """
+    gff3_lines = []
+    for gff2_line in gff2_lines:
+        gff3_line = convert_gff2_line(gff2_line, strict)
+        if gff3_line is not None:
+            gff3_lines.append(gff3_line)
+    return gff3_lines
+
+
+def gff2to3(input_handle, output_handle, strict=True,
+            batch_size=65536):
     """
     Convert records from a GFF2 file to the GFF3 format and write
-    them to the specified destionation.
+    them to the specified destionation. Lines are converted and
+    written in batches.
 
     :param input_handle: a handle of an input GFF2 file
     :param output_handle: a handle of an output file in the GFF3 format
     :param strict: throw an exception if an incorrect GFF2 record
         from the specified input file was read; otherwise just ignore
         it
+    :param batch_size: the number of lines in a batch
     :type strict: bool
-    :return: the number of processed records
-    :rtype: int
+    :type batch_size: int
     """
-    output_template = '\t'.join(['{}'] * 9) + '\n'
     output_handle.write('##gff-version 3\n')
-    for gff2_line in input_handle:
-        gff2_line = gff2_line.rstrip()
-        if not gff2_line:
-            # skip an empty line
-            continue
-        line_parts = gff2_line.split('\t', 8)
-        if len(line_parts) < 9:
-            if strict:
-                logger.error('an incorrect GFF2 line')
-                raise Gff3Error
-        else:
-            # get the group column and convert it to the GFF3 format
-            if ' ' in line_parts[8]:
-                group_parts = line_parts[8].split(';')
-                group_parts = map(str.split, map(str.strip,
-                                                 group_parts),
-                                  [' '] * len(group_parts))
-                attribures = []
-                for tag, value in group_parts:
-                    attribures.append('{}={}'.format(
-                        tag, value.strip('"')))
-
-                line_parts[8] = ';'.join(attribures)
+    while True:
+        gff2_lines = list(islice(input_handle, batch_size))
+        if not gff2_lines:
+            break
+        output_handle.writelines(convert_gff2_lines(gff2_lines,
+                                                    strict))
+
+
+def gff2to3_chunk(filename, start, end, strict=True):
+    """
+    Convert lines from the specified byte range of a GFF2 file to the
+    GFF3 format.
+
+    :param filename: a name of a GFF2 file
+    :param start: the range start position
+    :param end: the range end position
+    :param strict: throw an exception if an incorrect GFF2 record was
+        read; otherwise just ignore it
+    :type filename: str
+    :type start: int
+    :type end: int
+    :type strict: bool
+    :return: the converted GFF3 lines
+    :rtype: str
+    """
+    return ''.join(convert_gff2_lines(
+        parallel.read_lines(filename, start, end), strict))
+
+
+def gff2to3_parallel(input_file, output_handle, strict=True,
+                     threads=2):
+    """
+    Convert records from a GFF2 file to the GFF3 format in parallel
+    and write them to the specified destination.
+
+    :param input_file: a name of an input GFF2 file
+    :param output_handle: a handle of an output file in the GFF3 format
+    :param strict: throw an exception if an incorrect GFF2 record
+        from the specified input file was read; otherwise just ignore
+        it
+    :param threads: the number of worker processes
+    :type input_file: str
+    :type strict: bool
+    :type threads: int
+    """
+    output_handle.write('##gff-version 3\n')
+    for gff3_lines in parallel.map_chunks(gff2to3_chunk, input_file,
+                                          threads, (strict, )):
+        output_handle.write(gff3_lines)
+
+
+def get_sort_key(line, line_num=None):
+    """
+    Given a line of a GFF3 record, get its sort key. Records are
+    sorted by their sequences and start positions; of records with
+    the same start, longer ones and ones without parents go first.
+    Records with the same coordinates are further ordered by
+    order_parents_first.
+
+    :param line: a line of a GFF3 record
+    :param line_num: the number of the line used in error messages
+    :type line: str
+    :type line_num: int
+    :return: a tuple of the sequence, the start position, the negated
+        end position and the flag of the Parent attribute presence
+    :rtype: tuple
+    """
+    line_parts = line.rstrip('\r\n').split('\t', 8)
+    if len(line_parts) < 8:
+        logger.error('line %d: the incorrect number of columns - %d',
+                     line_num, len(line_parts))
+        raise Gff3Error
+    try:
+        start = int(line_parts[3])
+        end = int(line_parts[4])
+    except ValueError:
+        logger.error('line %d: the incorrect numeric value', line_num)
+        raise Gff3Error
+    has_parent = len(line_parts) == 9 and (
+        line_parts[8].startswith('Parent=') or
+        ';Parent=' in line_parts[8])
+    return line_parts[0], start, -end, has_parent
+
+
+def get_id_and_parents(line):
+    """
+    Given a line of a GFF3 record, get its ID and Parent attribute
+    values without parsing other attributes.
+
+    :param line: a line of a GFF3 record
+    :type line: str
+    :return: a tuple of the record ID or None if it is missing and
+        the list of its parent IDs
+    :rtype: tuple
+    """
+    line_parts = line.rstrip('\r\n').split('\t', 8)
+    record_id = None
+    parents = []
+    if len(line_parts) == 9:
+        for attribute in line_parts[8].split(';'):
+            if attribute.startswith('ID='):
+                record_id = attribute[3:]
+            elif attribute.startswith('Parent='):
+                parents = attribute[7:].split(',')
+    return record_id, parents
+
+
+def order_parents_first(lines):
+    """
+    Order lines of GFF3 records with the same coordinates so that
+    parent features precede their children, for example, an mRNA and
+    its exon or an exon and its CDS. Records that are not related
+    keep their order.
+
+    :param lines: lines of GFF3 records with the same coordinates
+    :type lines: list
+    :return: the indices of the lines in the new order
+    :rtype: list
+    """
+    if len(lines) < 2:
+        return list(range(len(lines)))
+    records = [get_id_and_parents(x) for x in lines]
+    id_indices = defaultdict(list)
+    for i, (record_id, _) in enumerate(records):
+        if record_id is not None:
+            id_indices[record_id].append(i)
+    children = [[] for _ in lines]
+    parent_nums = [0] * len(lines)
+    for i, (_, parents) in enumerate(records):
+        for parent in parents:
+            for j in id_indices.get(parent, ()):
+                if j != i:
+                    children[j].append(i)
+                    parent_nums[i] += 1
+    # records without parents among the lines are taken in their
+    # order and their children become available after them
+    ready = [i for i, x in enumerate(parent_nums) if x == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        i = heapq.heappop(ready)
+        order.append(i)
+        for j in children[i]:
+            parent_nums[j] -= 1
+            if parent_nums[j] == 0:
+                heapq.heappush(ready, j)
+    if len(order) < len(lines):
+        # the records refer to each other in a cycle
+        order += [i for i, x in enumerate(parent_nums) if x > 0]
+    return order
+
+
+def sort_gff3_chunk(filename, start, end, tmp_dir=None):
+    """
+    Sort records from the specified byte range of a GFF3 file and
+    write them to a temporary file. Comment lines are written before
+    the record that follows them and the ### directive is written
+    after the record that precedes it.
+
+    :param filename: a name of a GFF3 file
+    :param start: the range start position
+    :param end: the range end position
+    :param tmp_dir: a directory for the temporary file
+    :type filename: str
+    :type start: int
+    :type end: int
+    :type tmp_dir: str
+    :return: a tuple of the temporary file name, the list of
+        directives from the range, the flag if the ### directive
+        precedes the first record of the range, the last record line
+        of the range and comment lines following it
+    :rtype: tuple
+    """
+    records = []
+    directives = []
+    comments = []
+    resolved = False
+    last_line = None
+    for line_num, line in enumerate(parallel.read_lines(
+            filename, start, end)):
+        if not line.endswith('\n'):
+            line += '\n'
+        if line.startswith('#'):
+            if line.rstrip() == '###':
+                if records:
+                    records[-1][2] = True
+                else:
+                    resolved = True
+            elif line.startswith('##'):
+                directives.append(line.rstrip('\r\n'))
             else:
-                # we are dealing with a single attribute value in the
-                # group columns
-                line_parts[8] = 'ATTR={}'.format(line_parts[8])
+                comments.append(line)
+            continue
+        records.append([get_sort_key(line, line_num + 1),
+                        ''.join(comments) + line, False])
+        comments = []
+        last_line = line
+    records.sort(key=lambda x: x[0])
+    spill_handle, spill_name = tempfile.mkstemp(suffix='.gff',
+                                                dir=tmp_dir)
+    with os.fdopen(spill_handle, 'w') as spill_file:
+        for _, lines, record_resolved in records:
+            spill_file.write(lines)
+            if record_resolved:
+                spill_file.write('###\n')
+    return spill_name, directives, resolved, last_line, ''.join(comments)
+
+
+def read_sorted_chunk(spill_name, chunk_num):
+    """
+    Iterate through records of a sorted temporary file.
+
+    :param spill_name: a name of a temporary file of sorted records
+    :param chunk_num: the number of the file chunk the records were
+        taken from; it keeps the input order of records with equal
+        keys
+    :type spill_name: str
+    :type chunk_num: int
+    :return: a tuple of the record sort key, the chunk number, the
+        record line, comment lines preceding it and the flag if the
+        ### directive follows it
+    :rtype: tuple
+    """
+    with open(spill_name) as spill_file:
+        record = None
+        comments = []
+        resolved = False
+        for line in spill_file:
+            if line.startswith('#'):
+                if line == '###\n':
+                    resolved = True
+                else:
+                    comments.append(line)
+                continue
+            if record is not None:
+                yield record + (resolved, )
+            record = get_sort_key(line) + (chunk_num, line,
+                                           ''.join(comments))
+            comments = []
+            resolved = False
+        if record is not None:
+            yield record + (resolved, )
+
+
+def sort_gff3(input_file, output_file, buffer_size=256 * 1024 * 1024,
+              threads=1, tmp_dir=None):
+    """
+    Sort records of a GFF3 file by their sequences and start
+    positions. The file is split into parts of the specified size
+    that are sorted in memory and written to temporary files; then
+    the temporary files are merged. Of records with the same
+    coordinates, parent features precede their children. Header
+    directives are written before the sorted records. Comment lines
+    move together with the record that follows them or, if no record
+    follows them in a file part, with the record that precedes them.
+    A ### directive is written after the locus of overlapping
+    features which contains the record that preceded the directive
+    in the input file. The FASTA section of the file is copied
+    unchanged.
+
+    :param input_file: a name of an input GFF3 file
+    :param output_file: a name of an output GFF3 file
+    :param buffer_size: the size of a file part sorted in memory in
+        bytes
+    :param threads: the number of processes to sort file parts
+    :param tmp_dir: a directory for temporary files
+    :type input_file: str
+    :type output_file: str
+    :type buffer_size: int
+    :type threads: int
+    :type tmp_dir: str
+    """
+    header_size = get_header_size(input_file)
+    # find the FASTA section which is not sorted
+    features_end = os.path.getsize(input_file)
+    if features_end > header_size:
+        with io.open(input_file, 'rb') as gff_file:
+            gff_map = mmap.mmap(gff_file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+            try:
+                fasta_start = gff_map.find(b'\n##FASTA',
+                                           header_size - 1)
+            finally:
+                gff_map.close()
+        if fasta_start >= 0:
+            features_end = fasta_start + 1
+
+    spill_names = []
+    directives = OrderedDict()
+    # the ### directives and comments which are placed after the last
+    # records of file parts
+    last_lines = []
+    last_record = None
+    trailing_text = dict()
+    resolved_records = set()
+    leading_comments = ''
+    try:
+        for spill_name, chunk_directives, chunk_resolved, last_line, \
+                comments in parallel.map_chunks(
+                    sort_gff3_chunk, input_file, threads, (tmp_dir, ),
+                    start=header_size, end=features_end,
+                    chunk_size=buffer_size):
+            spill_names.append(spill_name)
+            for i in chunk_directives:
+                directives[i] = True
+            if chunk_resolved and last_record is not None:
+                resolved_records.add(last_record)
+            if last_line is not None:
+                last_record = (len(last_lines), last_line)
+            last_lines.append(last_line)
+            if last_record is None:
+                leading_comments += comments
+            elif comments:
+                trailing_text[last_record] = \
+                    trailing_text.get(last_record, '') + comments
 
-            output_handle.write(output_template.format(*line_parts))
+        with open(output_file, 'w') as output:
+            output.write('##gff-version 3\n')
+            for i in directives:
+                output.write(i + '\n')
+            output.write(leading_comments)
+            cur_seqid = None
+            locus_end = 0
+            locus_resolved = False
+            for (seqid, start, neg_end), group in groupby(
+                    heapq.merge(*[read_sorted_chunk(x, i) for i, x in
+                                  enumerate(spill_names)]),
+                    key=lambda x: x[:3]):
+                # a new locus starts when a record does not overlap
+                # previous ones
+                if seqid != cur_seqid or start > locus_end:
+                    if locus_resolved:
+                        output.write('###\n')
+                    locus_resolved = False
+                    cur_seqid = seqid
+                    locus_end = -neg_end
+                else:
+                    locus_end = max(locus_end, -neg_end)
+                group = list(group)
+                for i in order_parents_first([x[5] for x in group]):
+                    _, _, _, _, chunk_num, line, comments, \
+                        resolved = group[i]
+                    output.write(comments)
+                    output.write(line)
+                    if line == last_lines[chunk_num]:
+                        record = (chunk_num, line)
+                        output.write(trailing_text.pop(record, ''))
+                        if record in resolved_records:
+                            resolved_records.discard(record)
+                            resolved = True
+                    locus_resolved = locus_resolved or resolved
+            if locus_resolved:
+                output.write('###\n')
+        # copy the FASTA section
+        with io.open(input_file, 'rb') as gff_file:
+            gff_file.seek(features_end)
+            with io.open(output_file, 'ab') as output:
+                shutil.copyfileobj(gff_file, output)
+    finally:
+        for spill_name in spill_names:
+            os.unlink(spill_name)
@@ -4,14 +4,53 @@
 # Copyright (C) 2015 by Gaik Tamazian
 # gaik (dot) tamazian (at) gmail (dot) com
 
+from array import array
 from builtins import range  # pylint:disable=redefined-builtin
 from collections import namedtuple
+from contextlib import contextmanager
+from itertools import chain, repeat
+from operator import itemgetter, mul, sub, truediv
 from .exception import LavError
+from . import bed
+from . import parallel
+import io
 import logging
+import mmap
+import os
+import re
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+# the size of file blocks scanned to count lines
+block_size = 16 * 1024 * 1024
+
+# the approximate size of a file window which a-stanzas are tokenized
+# and converted in at once
+stanza_window_size = 1024 * 1024
+
+chain_header_template = 'chain ' + ' '.join(['{}'] * 12) + '\n'
+
+psl_line_template = '\t'.join(['{}'] * 21) + '\n'
+
+# a whole a-stanza: its score, start and end positions of the
+# alignment block, gap-free segment lines and the closing brace
+a_stanza_pattern = re.compile(
+    br'a \{[ \t\r]*\n'
+    br'[ \t]*s[ \t]+(-?\d+)[ \t\r]*\n'
+    br'[ \t]*b[ \t]+(\d+)[ \t]+(\d+)[ \t\r]*\n'
+    br'[ \t]*e[ \t]+(\d+)[ \t]+(\d+)[ \t\r]*\n'
+    br'((?:[ \t]*l[ \t]+\d+[ \t]+\d+[ \t]+\d+[ \t]+\d+[ \t]+\d+'
+    br'[ \t\r]*\n)*)'
+    br'(\})[ \t\r]*(?:\n|\Z)')
+
+# a whole a-stanza or any other line; the last group keeps lines that
+# are not parts of regular a-stanzas
+a_stanza_run_pattern = re.compile(a_stanza_pattern.pattern +
+                                  br'|([^\n]*\n|[^\n]+)')
+
+get_other_line = itemgetter(7)
+
 
 class Lav(object):
     """
@@ -44,6 +83,11 @@ class Lav(object):
 
     MStanzaItem = namedtuple('MStanzaItem', ('start', 'end'))
 
+    Section = namedtuple('Section', (
+        'first_seq', 'second_seq', 'first_size', 'second_size',
+        'first_rev_comp', 'second_rev_comp'
+    ))
+
     GapFreeAlignment = namedtuple('GapFreeAlignment', (
         'first_seq', 'second_seq', 'first_start', 'first_end',
         'second_start', 'second_end', 'identity'
@@ -54,100 +98,498 @@ class Lav(object):
         'second_start', 'second_end', 'score', 'identity'
     ))
 
-    def __init__(self, filename):
+    def __init__(self, filename, index_filename=None):
         """
         Given a name of a file, create a LAV alignment format parser
         from it.
 
         :param filename: a name of a file in the LAV format
+        :param index_filename: a name of the section index file used
+            to read alignments of specified sequences; by default, the
+            '.idx' suffix is added to the LAV file name
         :type filename: str
+        :type index_filename: str
         """
         self.__filename = filename
-        self.__handler = None
-        self.__lineno = 0
+        self.__index_filename = index_filename
+        self.__data = None
+        self.__pos = 0
+        self.__end = 0
+        self.__line_start = 0
         self.__line = None
+        self.__tokenized = False
 
-    def alignments(self, gapped=True):
+    def alignments(self, gapped=True, threads=1, min_score=None,
+                   min_identity=None, first_seqs=None,
+                   second_seqs=None, first_seq=None, second_seq=None):
         """
         Iterate through alignments in the file the object was created
-        from.
+        from. Sections of sequences that are not requested are skipped
+        without parsing them and gap-free segments of alignment blocks
+        with low scores are not converted. If a single sequence pair
+        is requested by the first_seq or second_seq arguments, then
+        its sections are read directly using the sidecar section
+        index of the file; see LavIndex.
 
         :param gapped: return gapped alignments
+        :param threads: the number of worker processes to parse
+            sections of the file in parallel
+        :param min_score: if specified, then only alignment blocks
+            with the score not less than the specified value are
+            returned
+        :param min_identity: if specified, then only alignments with
+            the identity not less than the specified value are
+            returned
+        :param first_seqs: if specified, then only alignments of the
+            specified first sequences are returned
+        :param second_seqs: if specified, then only alignments of the
+            specified second sequences are returned
+        :param first_seq: the name of the first sequence which
+            sections are read using the section index
+        :param second_seq: the name of the second sequence which
+            sections are read using the section index
         :type gapped: bool
+        :type threads: int
+        :type min_score: int
+        :type min_identity: int
+        :type first_seqs: list
+        :type second_seqs: list
+        :type first_seq: str
+        :type second_seq: str
 
         :return: an iterator to iterate through gapped or ungapped
             alignments
         """
-        with open(self.__filename) as self.__handler:
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
-            # first, we read the d-stanza
+        filters = (min_score, min_identity, first_seqs, second_seqs)
+        if first_seq is not None or second_seq is not None:
+            sections = LavIndex(self.__filename,
+                                self.__index_filename).find(
+                first_seq, second_seq)
+            if threads > 1:
+                for alignment in self.__parallel_alignments(
+                        gapped, threads, filters, sections):
+                    yield alignment
+                return
+            for start, end in sections:
+                for alignment in self.section_alignments(
+                        start, end, gapped, *filters):
+                    yield alignment
+            return
+        if threads > 1:
+            for alignment in self.__parallel_alignments(
+                    gapped, threads, filters, self.sections()):
+                yield alignment
+            return
+        for alignment in batch_alignments(
+                self.__batches(min_score, first_seqs, second_seqs),
+                gapped, min_identity):
+            yield alignment
+
+    def blocks(self, min_score=None, first_seqs=None,
+               second_seqs=None):
+        """
+        Iterate through alignment blocks of the file the object was
+        created from. A block is a tuple of the section it belongs to,
+        the list of the a-stanza values and the flat list of gap-free
+        segment values; see form_alignments for the order of the
+        values.
+
+        :param min_score: if specified, then only alignment blocks
+            with the score not less than the specified value are
+            returned
+        :param first_seqs: if specified, then only alignment blocks of
+            the specified first sequences are returned
+        :param second_seqs: if specified, then only alignment blocks
+            of the specified second sequences are returned
+        :type min_score: int
+        :type first_seqs: list
+        :type second_seqs: list
+        :return: an iterator to iterate through alignment blocks
+        """
+        for section, batch in self.__batches(min_score, first_seqs,
+                                             second_seqs):
+            for block in get_batch_blocks(section, batch):
+                yield block
+
+    def __batches(self, min_score=None, first_seqs=None,
+                  second_seqs=None):
+        """
+        Iterate through batches of alignment blocks of the file.
+
+        :param min_score: the minimal score of alignment blocks
+        :param first_seqs: the first sequences of alignment blocks
+        :param second_seqs: the second sequences of alignment blocks
+        :type min_score: int
+        :type first_seqs: list
+        :type second_seqs: list
+        :return: an iterator to iterate through tuples of a section
+            and a batch of its alignment blocks
+        """
+        with self.__mapped_file():
+            self.__read_d_section()
+            for batch in self.__read_sections(
+                    self.__end, min_score, first_seqs, second_seqs):
+                yield batch
+
+    def sections(self):
+        """
+        Get byte ranges of alignment sections of the file the object
+        was created from. Each section starts with the #:lav line and
+        contains alignments of a pair of sequences.
+
+        :return: a list of tuples of section start and end positions
+        :rtype: list
+        """
+        with self.__mapped_file():
+            self.__read_d_section()
+            if self.__line == '#:eof':
+                return []
+            # check the header of the first section
             self.__parse_section_header()
-            self.__parse_d_stanza()
-            # read alignments
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
-            while self.__parse_section_header():
-                self.__parse_s_stanza()
-                h_stanza = self.__parse_h_stanza()
-                first_seq = h_stanza[0].seq_name.split()[0]
-                second_seq = h_stanza[1].seq_name.split()[0]
-                self.__line = self.__handler.readline().rstrip()
-                self.__lineno += 1
-                # read a stanza of the corresponding type according
-                # to the header that we read
-                while not self.__line.startswith('#'):
-                    if self.__line.startswith('a'):
+            section_starts = [self.__line_start]
+            sections_end = self.__end
+            pos = self.__line_start
+            while True:
+                pos = self.__data.find(b'\n#:', pos + 1, self.__end)
+                if pos < 0:
+                    break
+                header = self.__data[pos + 1:pos + 6]
+                if header == b'#:lav':
+                    section_starts.append(pos + 1)
+                elif header == b'#:eof':
+                    sections_end = pos + 1
+                    break
+            return list(zip(section_starts,
+                            section_starts[1:] + [sections_end]))
+
+    def section_headers(self):
+        """
+        Get byte ranges and descriptions of alignment sections of the
+        file the object was created from. Only the s- and h-stanzas
+        of sections are parsed.
+
+        :return: a list of tuples of section start and end positions
+            and section descriptions
+        :rtype: list
+        """
+        sections = self.sections()
+        result = []
+        with self.__mapped_file():
+            for start, end in sections:
+                self.__pos = start
+                self.__line = self.__next_line()
+                self.__parse_section_header()
+                result.append((start, end,
+                               self.__read_section_header()))
+        return result
+
+    def section_alignments(self, start, end, gapped=True,
+                           min_score=None, min_identity=None,
+                           first_seqs=None, second_seqs=None):
+        """
+        Iterate through alignments of sections in the specified byte
+        range of the file.
+
+        :param start: the start position of the first section
+        :param end: the end position of the last section
+        :param gapped: return gapped alignments
+        :param min_score: if specified, then only alignment blocks
+            with the score not less than the specified value are
+            returned
+        :param min_identity: if specified, then only alignments with
+            the identity not less than the specified value are
+            returned
+        :param first_seqs: if specified, then only alignments of the
+            specified first sequences are returned
+        :param second_seqs: if specified, then only alignments of the
+            specified second sequences are returned
+        :type start: int
+        :type end: int
+        :type gapped: bool
+        :type min_score: int
+        :type min_identity: int
+        :type first_seqs: list
+        :type second_seqs: list
+        :return: an iterator to iterate through gapped or ungapped
+            alignments
+        """
+        with self.__mapped_file():
+            self.__pos = start
+            self.__line = self.__next_line()
+            for alignment in batch_alignments(
+                    self.__read_sections(end, min_score, first_seqs,
+                                         second_seqs),
+                    gapped, min_identity):
+                yield alignment
+
+    def __parallel_alignments(self, gapped, threads, filters,
+                              sections):
+        """
+        Parse groups of sections of the file in worker processes and
+        iterate through their alignments in the file order.
+
+        :param gapped: return gapped alignments
+        :param threads: the number of worker processes
+        :param filters: a tuple of the minimal score, the minimal
+            identity, the first sequences and the second sequences to
+            filter alignments
+        :param sections: a list of byte ranges of sections to be
+            parsed
+        :type gapped: bool
+        :type threads: int
+        :type filters: tuple
+        :type sections: list
+        :return: an iterator to iterate through gapped or ungapped
+            alignments
+        """
+        if not sections:
+            return
+        # several groups of adjacent sections per worker balance the
+        # load between them; the groups are limited by the chunk size,
+        # so the alignments of a group returned by a worker fit in
+        # memory
+        group_size = min((sections[-1][1] - sections[0][0]) //
+                         (threads * 4) + 1, parallel.max_chunk_size)
+        section_groups = []
+        for start, end in sections:
+            if section_groups and start == section_groups[-1][1] and \
+                    end - section_groups[-1][0] <= group_size:
+                section_groups[-1] = (section_groups[-1][0], end)
+            else:
+                section_groups.append((start, end))
+        for alignments in parallel.map_ranges(
+                read_sections, self.__filename, section_groups,
+                threads, (gapped, ) + filters):
+            for alignment in alignments:
+                yield alignment
+
+    @contextmanager
+    def __mapped_file(self):
+        """
+        Map the file to memory for reading.
+        """
+        with io.open(self.__filename, 'rb') as lav_file:
+            file_size = os.fstat(lav_file.fileno()).st_size
+            if file_size > 0:
+                self.__data = mmap.mmap(lav_file.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            else:
+                self.__data = b''
+            self.__pos = self.__line_start = 0
+            self.__end = file_size
+            try:
+                yield
+            finally:
+                if file_size > 0:
+                    self.__data.close()
+                self.__data = None
+
+    def __read_d_section(self):
+        """
+        Read the first section of the file that contains the d-stanza
+        and the header line of the next section.
+        """
+        self.__line = self.__next_line()
+        self.__parse_section_header()
+        self.__parse_d_stanza()
+        self.__line = self.__next_line()
+
+    def __read_section_header(self):
+        """
+        Read the s- and h-stanzas of the current section.
+
+        :return: the description of the section
+        :rtype: Lav.Section
+        """
+        s_stanza = self.__parse_s_stanza()
+        h_stanza = self.__parse_h_stanza()
+        return Lav.Section(
+            first_seq=h_stanza[0].seq_name.split()[0],
+            second_seq=h_stanza[1].seq_name.split()[0],
+            first_size=s_stanza[0].stop,
+            second_size=s_stanza[1].stop,
+            first_rev_comp=h_stanza[0].rev_comp_flag or
+            bool(s_stanza[0].rev_comp_flag),
+            second_rev_comp=h_stanza[1].rev_comp_flag or
+            bool(s_stanza[1].rev_comp_flag))
+
+    def __skip_section(self):
+        """
+        Skip stanzas of the current section up to the header line of
+        the next section.
+        """
+        next_section = self.__data.find(b'\n#', self.__pos - 1,
+                                        self.__end)
+        if next_section < 0:
+            self.__pos = self.__end
+        else:
+            self.__pos = next_section + 1
+        self.__line = self.__next_line()
+
+    def __read_sections(self, end, min_score=None, first_seqs=None,
+                        second_seqs=None):
+        """
+        Iterate through batches of alignment blocks of the sections
+        starting from the current line.
+
+        :param end: the position to stop reading sections at
+        :param min_score: the minimal score of alignment blocks
+        :param first_seqs: the first sequences of alignment blocks
+        :param second_seqs: the second sequences of alignment blocks
+        :type end: int
+        :type min_score: int
+        :type first_seqs: list
+        :type second_seqs: list
+        :return: an iterator to iterate through tuples of a section
+            and a batch of its alignment blocks
+        """
+        if first_seqs is not None:
+            first_seqs = frozenset(first_seqs)
+        if second_seqs is not None:
+            second_seqs = frozenset(second_seqs)
+        while self.__line_start < end and \
+                self.__parse_section_header():
+            section = self.__read_section_header()
+            if (first_seqs is not None and
+                    section.first_seq not in first_seqs) or \
+                    (second_seqs is not None and
+                     section.second_seq not in second_seqs):
+                self.__skip_section()
+                continue
+            self.__line = self.__next_line()
+            # read a stanza of the corresponding type according
+            # to the header that we read
+            while not self.__line.startswith('#'):
+                if self.__line.startswith('a'):
+                    self.__tokenized = False
+                    if self.__line == 'a {':
+                        for batch in self.__tokenize_a_stanzas(
+                                min_score):
+                            yield section, batch
+                    if not self.__tokenized:
+                        # parse the stanza line by line to report
+                        # the error
                         a_stanza = self.__parse_a_stanza()
-                        identical_bases = total_bases = 0
+                        segment_values = []
                         for segment in a_stanza.segments:
-                            assert isinstance(segment,
-                                              Lav.GapFreeSegment)
-                            if gapped:
-                                gap_free_alignment = \
-                                    Lav.GapFreeAlignment(
-                                        first_seq=first_seq,
-                                        second_seq=second_seq,
-                                        first_start=segment.first_start,
-                                        first_end=segment.first_end,
-                                        second_start=
-                                        segment.second_start,
-                                        second_end=segment.second_end,
-                                        identity=segment.identity
-                                    )
-                                yield gap_free_alignment
-                            else:
-                                segment_len = segment.first_end - \
-                                    segment.first_start
-                                identical_bases += segment.identity * \
-                                    float(segment_len) / 100
-                                total_bases += segment_len
-                        if not gapped:
-                            gapped_alignment = Lav.GappedAlignment(
-                                first_seq=first_seq,
-                                second_seq=second_seq,
-                                first_start=a_stanza.first_start,
-                                first_end=a_stanza.first_end,
-                                second_start=a_stanza.second_start,
-                                second_end=a_stanza.second_end,
-                                score=a_stanza.score,
-                                identity=int(round(
-                                    identical_bases * 100 /
-                                    total_bases))
-                            )
-                            yield gapped_alignment
-                    elif self.__line.startswith('x'):
-                        self.__parse_x_stanza()
-                    elif self.__line.startswith('m'):
-                        self.__parse_m_stanza()
-                    elif self.__line.startswith('Census'):
-                        self.__parse_census_stanza()
-                    else:
-                        logger.error('line %d: an incorrect section',
-                                     self.__lineno)
-                        raise LavError
-                    self.__line = self.__handler.readline().rstrip()
-                    self.__lineno += 1
+                            segment_values.extend(segment)
+                        if min_score is not None and \
+                                a_stanza.score < min_score:
+                            self.__line = self.__next_line()
+                            continue
+                        yield section, (
+                            [a_stanza.score, a_stanza.first_start,
+                             a_stanza.second_start, a_stanza.first_end,
+                             a_stanza.second_end],
+                            [len(a_stanza.segments)], segment_values)
+                elif self.__line.startswith('x'):
+                    self.__parse_x_stanza()
+                elif self.__line.startswith('m'):
+                    self.__parse_m_stanza()
+                elif self.__line.startswith('Census'):
+                    self.__parse_census_stanza()
+                else:
+                    logger.error('line %d: an incorrect section',
+                                 self.__get_lineno())
+                    raise LavError
+                self.__line = self.__next_line()
+
+    def __next_line(self):
+        """
+        Read the next line of the file without trailing whitespace
+        characters. An empty string is returned at the end of the
+        file.
+
+        :return: the next line of the file
+        :rtype: str
+        """
+        if self.__pos > self.__end:
+            return ''
+        line_end = self.__data.find(b'\n', self.__pos, self.__end)
+        if line_end < 0:
+            line_end = self.__end
+        line = self.__data[self.__pos:line_end]
+        self.__line_start = self.__pos
+        self.__pos = line_end + 1
+        if not isinstance(line, str):
+            # in Python 3, lines are decoded to native strings
+            line = line.decode('utf-8')
+        return line.rstrip()
+
+    def __get_lineno(self, offset=None):
+        """
+        Get the number of a line; it is counted on demand to report
+        errors.
+
+        :param offset: the start position of the line; by default,
+            the current line is taken
+        :type offset: int
+        :return: the number of the line
+        :rtype: int
+        """
+        if offset is None:
+            offset = self.__line_start
+        lineno = 1
+        for i in range(0, offset, block_size):
+            lineno += self.__data[i:min(i + block_size,
+                                        offset)].count(b'\n')
+        return lineno
+
+    def __tokenize_a_stanzas(self, min_score=None):
+        """
+        Tokenize consecutive a-stanzas starting at the current line by
+        a regular expression. The stanzas are matched in windows of the
+        file and values of a window are converted at once. The
+        tokenizing stops at the first stanza that does not match the
+        expected layout.
+
+        :param min_score: the minimal score of alignment blocks; values
+            of blocks with lower scores are not converted
+        :type min_score: int
+        :return: an iterator to iterate through batches of alignment
+            blocks; see convert_a_stanzas
+        """
+        data = self.__data
+        pos = self.__line_start
+        # the stanzas are tokenized up to the end of the last a-stanza
+        # of the current section
+        section_end = data.find(b'\n#', pos, self.__end)
+        section_end = self.__end if section_end < 0 else section_end + 1
+        run_end = data.find(b'\n}', max(data.rfind(
+            b'\na {', max(pos - 1, 0), section_end), pos), section_end)
+        if run_end >= 0:
+            run_end = data.find(b'\n', run_end + 1, section_end)
+        run_end = section_end if run_end < 0 else run_end + 1
+        while pos < run_end:
+            window_end = data.find(b'\n}', pos + stanza_window_size,
+                                   run_end)
+            if window_end >= 0:
+                window_end = data.find(b'\n', window_end + 1, run_end)
+            window_end = run_end if window_end < 0 else window_end + 1
+            stanzas = a_stanza_run_pattern.findall(data, pos,
+                                                   window_end)
+            other_lines = list(map(get_other_line, stanzas))
+            complete = not any(other_lines)
+            if not complete:
+                # the stanzas before the first irregular line are
+                # matched again to find its position
+                stanza_num = 0
+                window_end = pos
+                while not other_lines[stanza_num]:
+                    window_end = a_stanza_pattern.match(
+                        data, window_end).end()
+                    stanza_num += 1
+                del stanzas[stanza_num:]
+            if not stanzas:
+                return
+            self.__tokenized = True
+            # the current line is the closing brace of the last stanza
+            self.__line_start = data.rfind(b'\n', pos,
+                                           window_end - 1) + 1
+            self.__pos = pos = window_end
+            yield convert_a_stanzas(stanzas, min_score)
+            if not complete:
+                return
 
     def __parse_section_header(self):
         """
@@ -164,7 +606,7 @@ class Lav(object):
             return False
         else:
             logger.error('line %d: an incorrect section header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
     def __parse_d_stanza(self):
@@ -174,23 +616,24 @@ class Lav(object):
         :return: a string representing the d-stanza contents
         :rtype: str
         """
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         if self.__line != 'd {':
             logger.error('line %d: an incorrect d-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
         # start reading the d-stanza contents
         stanza_contents = []
-        self.__line = self.__handler.readline()
-        self.__lineno += 1
-        while self.__line.rstrip() != '}':
+        self.__line = self.__next_line()
+        while self.__line != '}':
+            if self.__pos > self.__end:
+                logger.error('line %d: the d-stanza missed the proper '
+                             'ending', self.__get_lineno())
+                raise LavError
             stanza_contents.append(self.__line)
-            self.__line = self.__handler.readline()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
-        return ''.join(stanza_contents)
+        return '\n'.join(stanza_contents)
 
     def __parse_s_stanza(self):
         """
@@ -200,27 +643,25 @@ class Lav(object):
             s-stanza contents
         :rtype: tuple
         """
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
 
         # check the first line of the stanza
         if self.__line != 's {':
             logger.error('line %d: an incorrect s-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
-        first_line = self.__lineno
+        first_line_start = self.__line_start
 
         # start reading the s-stanza
         sequence_files = []
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         while self.__line != '}':
             # there must be only two sequence descriptions in the
             # stanza
             if len(sequence_files) >= 2:
                 logger.error('line %d: too many sequence files in'
-                             'the s stanza', self.__lineno)
+                             'the s stanza', self.__get_lineno())
                 raise LavError
             # parse each sequence line; 5 is the greatest number of
             # parts in the sequence description
@@ -229,14 +670,14 @@ class Lav(object):
             if len(line_parts) not in {3, 5}:
                 logger.error('line %d: the incorrect number of '
                              'sequence file description parts (%d)',
-                             self.__lineno, len(line_parts))
+                             self.__get_lineno(), len(line_parts))
                 raise LavError
             # remove quotes from the file name
             if len(line_parts[0]) > 2:
                 line_parts[0] = line_parts[0][1:-1]
             else:
                 logger.error('line %d: an empty file name',
-                             self.__lineno)
+                             self.__get_lineno())
                 raise LavError
             # convert numeric values
             try:
@@ -247,7 +688,7 @@ class Lav(object):
                     line_parts[4] = int(line_parts[4])
             except ValueError:
                 logger.error('line %d: incorrect numeric values',
-                             self.__lineno)
+                             self.__get_lineno())
                 raise LavError
             # form a SStanzaField tuple and write it to the sequence
             # list
@@ -255,13 +696,13 @@ class Lav(object):
                 line_parts = line_parts + [None] * 2
             sequence_files.append(Lav.SStanzaItem(*line_parts))
             # read the next line
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
         # check that there are exactly two sequence files
         if len(sequence_files) < 2:
             logger.error('lines %d--%d: a pair of sequence lines '
-                         'required', first_line, self.__lineno)
+                         'required', self.__get_lineno(first_line_start),
+                         self.__get_lineno())
             raise LavError
 
         return sequence_files
@@ -274,48 +715,51 @@ class Lav(object):
             the h-stanza contents
         :rtype: Lav.HStanzaItem
         """
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
 
         # check the first line of the stanza
         if self.__line != 'h {':
             logger.error('line %d: an incorrect h-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
-        first_line = self.__lineno
+        first_line_start = self.__line_start
 
         # start reading the h stanza
         header_lines = []
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         while self.__line != '}':
             # there must be only two sequence descriptions in the
             # stanza
             if len(header_lines) >= 2:
                 logger.error('line %d: too many header lines in the '
-                             'h stanza', self.__lineno)
+                             'h stanza', self.__get_lineno())
                 raise LavError
             # parse the header line having been read
             line_parts = self.__line.split()
             # remove quote symbols
             if len(line_parts[0]) > 2:
-                line_parts[0] = line_parts[0][1:-1]
+                if len(line_parts) > 1:
+                    # the quotes enclose several words
+                    line_parts[0] = line_parts[0][1:]
+                    line_parts[-1] = line_parts[-1][:-1]
+                else:
+                    line_parts[0] = line_parts[0][1:-1]
             else:
                 logger.error('line %d: an empty sequence '
-                             'header', self.__lineno)
+                             'header', self.__get_lineno())
                 raise LavError
             # each header line must start with '>'
             if not line_parts[0].startswith('>'):
                 logger.error('line %d: the header line must start '
-                             'with >', self.__lineno)
+                             'with >', self.__get_lineno())
                 raise LavError
             # remove '>' from the header
             line_parts[0] = line_parts[0][1:]
             # check if there is the reverse complement flag in the line
             if len(line_parts) > 2:
                 reverse_flag = line_parts[-2] == '(reverse' and \
-                               line_parts[-1] == 'complement)"'
+                               line_parts[-1] == 'complement)'
             else:
                 reverse_flag = False
             # cut line parts with the '>' sign and the reverse
@@ -328,13 +772,13 @@ class Lav(object):
                 rev_comp_flag=reverse_flag))
 
             # read the next line
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
         # check that there are exactly two header lines
         if len(header_lines) < 2:
             logger.error('lines %d--%d: a pair of header lines '
-                         'required', first_line, self.__lineno)
+                         'required', self.__get_lineno(first_line_start),
+                         self.__get_lineno())
             raise LavError
 
         return header_lines
@@ -350,31 +794,29 @@ class Lav(object):
         # check the first line of the a stanza
         if self.__line != 'a {':
             logger.error('line %d: an incorrect a-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
         # start reading the a stanza: read three lines describing the
         # alignment block
 
         # score
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         line_parts = self.__line.split(None, 2)
         if len(line_parts) == 2 and line_parts[0] == 's':
             try:
                 alignment_block_score = int(line_parts[1])
             except ValueError:
                 logger.error('line %d: the incorrect score value %s',
-                             self.__lineno, line_parts[1])
+                             self.__get_lineno(), line_parts[1])
                 raise LavError
         else:
             logger.error('line %d: the incorrect score record in an a-'
-                         'stanza', self.__lineno)
+                         'stanza', self.__get_lineno())
             raise LavError
 
         # start positions of aligned sequences
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         line_parts = self.__line.split(None, 3)
         if len(line_parts) == 3 and line_parts[0] == 'b':
             try:
@@ -382,16 +824,15 @@ class Lav(object):
                 alignment_block_second_start = int(line_parts[2])
             except ValueError:
                 logger.error('line %d: the incorrect position value '
-                             '%s or %s', self.__lineno, *line_parts)
+                             '%s or %s', self.__get_lineno(), *line_parts)
                 raise LavError
         else:
             logger.error('line %d: an incorrect aligned block record '
-                         'in an a-stanza', self.__lineno)
+                         'in an a-stanza', self.__get_lineno())
             raise LavError
 
         # end positions of aligned sequences
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         line_parts = self.__line.split(None, 3)
         if len(line_parts) == 3 and line_parts[0] == 'e':
             try:
@@ -399,11 +840,11 @@ class Lav(object):
                 alignment_block_second_end = int(line_parts[2])
             except ValueError:
                 logger.error('line %d: an incorrect position value '
-                             '%s or %s', self.__lineno, *line_parts)
+                             '%s or %s', self.__get_lineno(), *line_parts)
                 raise LavError
         else:
             logger.error('line %d: an incorrect aligned block record '
-                         'in an a-stanza', self.__lineno)
+                         'in an a-stanza', self.__get_lineno())
             raise LavError
 
         alignment_block = Lav.AStanzaItem(
@@ -425,8 +866,7 @@ class Lav(object):
         """
         segments = []
         # read gap-free segments of the alignment block
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         while self.__line != '}':
             line_parts = self.__line.split(None, 6)
             if len(line_parts) == 6 and line_parts[0] == 'l':
@@ -436,16 +876,15 @@ class Lav(object):
                     except ValueError:
                         logger.error(
                             'line %d: the incorrect numeric value %s',
-                            self.__lineno, line_parts[i])
+                            self.__get_lineno(), line_parts[i])
                         raise LavError
                 segments.append(Lav.GapFreeSegment(*line_parts[1:]))
             else:
                 logger.error('line %d: the incorrect segment record '
-                             'in an a-stanza', self.__lineno)
+                             'in an a-stanza', self.__get_lineno())
                 raise LavError
             # read the next line
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
         return segments
 
@@ -458,12 +897,11 @@ class Lav(object):
         """
         if self.__line != 'x {':
             logger.error('line %d: an incorrect x-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
         # read a sigle line containing the number of newly masked bases
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         line_parts = self.__line.split(None, 2)
         newly_masked_bases = None
         if len(line_parts) == 2 and line_parts[0] == 'n':
@@ -471,19 +909,18 @@ class Lav(object):
                 newly_masked_bases = int(line_parts[1])
             except ValueError:
                 logger.error('line %d: the incorrect numeric value %s',
-                             self.__lineno, line_parts[1])
+                             self.__get_lineno(), line_parts[1])
                 raise LavError
         else:
             logger.error('line %d: an incorrect score record in an'
-                         'x-stanza', self.__lineno)
+                         'x-stanza', self.__get_lineno())
             raise LavError
 
         # make sure that the stanza has the proper end
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         if self.__line != '}':
             logger.error('line %d: the x-stanza missed the proper '
-                         'ending', self.__lineno)
+                         'ending', self.__get_lineno())
             raise LavError
 
         return newly_masked_bases
@@ -497,12 +934,11 @@ class Lav(object):
         """
         if self.__line != 'm {':
             logger.error('line %d: an incorrect m-stanza header',
-                         self.__lineno)
+                         self.__get_lineno())
             raise LavError
 
         # the lines containing masked regions
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         n_flag = False
         result_regions = []
         result_base_count = None
@@ -517,7 +953,7 @@ class Lav(object):
                     except ValueError:
                         logger.error(
                             'line %d: the incorrect numeric '
-                            'value %s', self.__lineno,
+                            'value %s', self.__get_lineno(),
                             line_parts[i])
                         raise LavError
                 result_regions.append(Lav.MStanzaItem(
@@ -528,7 +964,7 @@ class Lav(object):
                 except ValueError:
                     logger.error(
                         'line %d: the incorrect numeric value '
-                        '%s', self.__lineno, line_parts[1])
+                        '%s', self.__get_lineno(), line_parts[1])
                     raise LavError
                 n_flag = True
             else:
@@ -536,11 +972,10 @@ class Lav(object):
                 # 'x' or 'n', otherwise show the error message and
                 # throw the exception
                 logger.error('line %d: an incorrect line inside the '
-                             'm-stanza', self.__lineno)
+                             'm-stanza', self.__get_lineno())
                 raise LavError
             # read the next line
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
         result = Lav.MStanza(regions=result_regions,
                              base_count=result_base_count)
@@ -548,7 +983,7 @@ class Lav(object):
         # make sure that the stanza has the proper end
         if self.__line != '}':
             logger.error('line %d: the m-stanza missed the proper '
-                         'ending', self.__lineno)
+                         'ending', self.__get_lineno())
             raise LavError
 
         return result
@@ -563,14 +998,13 @@ class Lav(object):
         # check the first self.__line of the stanza
         if self.__line != 'Census {':
             logger.error('line %d: an incorrect Census-stanza '
-                         'header', self.__lineno)
+                         'header', self.__get_lineno())
             raise LavError
 
         # start reading the Census stanza contents
         result = []
         i = 1
-        self.__line = self.__handler.readline().rstrip()
-        self.__lineno += 1
+        self.__line = self.__next_line()
         while self.__line != '}':
             line_parts = self.__line.split(None, 2)
             try:
@@ -578,17 +1012,585 @@ class Lav(object):
                 if line_parts[0] != i:
                     logger.error(
                         'line %d: the incorrect Census record number '
-                        '%s', self.__lineno, i)
+                        '%s', self.__get_lineno(), i)
                     raise LavError
                 else:
                     result.append(line_parts[1])
             except ValueError:
                 logger.error('line %d: the incorrect numeric value '
-                             '%s or %s', self.__lineno, *line_parts)
+                             '%s or %s', self.__get_lineno(), *line_parts)
                 raise LavError
             i += 1
             # read the next self.__line
-            self.__line = self.__handler.readline().rstrip()
-            self.__lineno += 1
+            self.__line = self.__next_line()
 
         return result
+
+
+class LavIndex(object):
+    """
+    This class implements the index of alignment sections of a LAV
+    file. For each section, the index keeps its byte range, the names
+    of the aligned sequences, their sizes and reverse complement
+    flags. The index is kept in a sidecar file.
+    """
+    index_header = '#bioformats LAV index'
+
+    def __init__(self, filename, index_filename=None):
+        """
+        Given a name of a LAV file, create its section index. The
+        index is read from the specified sidecar file; if the file is
+        missing or outdated, then the index is built and written to
+        it. If the sidecar file cannot be written, for example, in a
+        read-only directory, then the index is kept in memory only.
+
+        :param filename: a name of a LAV file
+        :param index_filename: a name of the index file; by default,
+            the '.idx' suffix is added to the LAV file name
+        :type filename: str
+        :type index_filename: str
+        """
+        self.__filename = filename
+        if index_filename is None:
+            index_filename = filename + '.idx'
+        self.__index_filename = index_filename
+        self.__sections = []
+        if not self.__read_index():
+            self.build_index()
+            self.__write_index()
+
+    @property
+    def sections(self):
+        """
+        Get sections of the LAV file.
+
+        :return: a list of tuples of section start and end positions
+            and section descriptions
+        :rtype: list
+        """
+        return self.__sections
+
+    def __file_stamp(self):
+        """
+        Get the size and the modification time of the LAV file to
+        check if its index is up to date.
+
+        :return: a string of the LAV file size and modification time
+        :rtype: str
+        """
+        stat = os.stat(self.__filename)
+        return '{}\t{}'.format(stat.st_size, int(stat.st_mtime))
+
+    def __read_index(self):
+        """
+        Read the index from its sidecar file.
+
+        :return: if the index was read; False means that the index
+            file is missing or outdated
+        :rtype: bool
+        """
+        if not os.path.isfile(self.__index_filename):
+            return False
+        with open(self.__index_filename) as index_file:
+            if index_file.readline().rstrip('\n') != \
+                    '{}\t{}'.format(LavIndex.index_header,
+                                    self.__file_stamp()):
+                return False
+            for line in index_file:
+                line_parts = line.rstrip('\n').split('\t')
+                self.__sections.append((
+                    int(line_parts[0]), int(line_parts[1]),
+                    Lav.Section(
+                        first_seq=line_parts[2],
+                        second_seq=line_parts[3],
+                        first_size=int(line_parts[4]),
+                        second_size=int(line_parts[5]),
+                        first_rev_comp=line_parts[6] == '1',
+                        second_rev_comp=line_parts[7] == '1')))
+        return True
+
+    def __write_index(self):
+        """
+        Write the index to its sidecar file. If the file cannot be
+        written, then the error is reported as a warning and an
+        incomplete file is removed.
+        """
+        try:
+            with open(self.__index_filename, 'w') as index_file:
+                index_file.write('{}\t{}\n'.format(
+                    LavIndex.index_header, self.__file_stamp()))
+                for start, end, section in self.__sections:
+                    index_file.write('\t'.join(map(str, (
+                        start, end, section.first_seq,
+                        section.second_seq, section.first_size,
+                        section.second_size,
+                        int(section.first_rev_comp),
+                        int(section.second_rev_comp)))) + '\n')
+        except (IOError, OSError) as error:
+            logger.warning('cannot write the LAV index file %s: %s',
+                           self.__index_filename, error)
+            if os.path.isfile(self.__index_filename):
+                try:
+                    os.unlink(self.__index_filename)
+                except OSError:
+                    pass
+
+    def build_index(self):
+        """
+        Read headers of sections of the LAV file and build the index.
+        """
+        self.__sections = Lav(self.__filename).section_headers()
+
+    def find(self, first_seq=None, second_seq=None):
+        """
+        Find sections of the specified aligned sequences.
+
+        :param first_seq: the name of the first sequence; if it is
+            not specified, then sections of any first sequence are
+            returned
+        :param second_seq: the name of the second sequence; if it is
+            not specified, then sections of any second sequence are
+            returned
+        :type first_seq: str
+        :type second_seq: str
+        :return: a list of tuples of section start and end positions
+        :rtype: list
+        """
+        return [(start, end) for start, end, section in self.__sections
+                if (first_seq is None or section.first_seq == first_seq)
+                and (second_seq is None or
+                     section.second_seq == second_seq)]
+
+
+def get_identity(segment_values):
+    """
+    Given gap-free segments of an alignment block, get its identity.
+
+    :param segment_values: a flat list of gap-free segment values
+    :type segment_values: list
+    :return: the identity percentage of the alignment block
+    :rtype: int
+    """
+    identical_bases = total_bases = 0
+    for i in range(0, len(segment_values), 5):
+        segment_len = segment_values[i + 2] - segment_values[i]
+        identical_bases += segment_values[i + 4] * \
+            float(segment_len) / 100
+        total_bases += segment_len
+    return int(round(identical_bases * 100 / total_bases))
+
+
+def form_alignments(section, a_values, segment_values, gapped=True):
+    """
+    Given values of an a-stanza, form its alignments.
+
+    :param section: the section the a-stanza belongs to
+    :param a_values: the score, the start positions and the end
+        positions of the alignment block in the order of the a-stanza
+    :param segment_values: a flat list of gap-free segment values,
+        five values per segment in the order of the a-stanza
+    :param gapped: return gapped alignments
+    :type section: Lav.Section
+    :type a_values: list
+    :type segment_values: list
+    :type gapped: bool
+    :return: a list of gap-free alignments or a list of a single
+        gapped alignment
+    :rtype: list
+    """
+    if gapped:
+        segment_num = len(segment_values) // 5
+        return list(map(
+            Lav.GapFreeAlignment, [section.first_seq] * segment_num,
+            [section.second_seq] * segment_num, segment_values[0::5],
+            segment_values[2::5], segment_values[1::5],
+            segment_values[3::5], segment_values[4::5]))
+    return [Lav.GappedAlignment(
+        section.first_seq, section.second_seq, a_values[1],
+        a_values[3], a_values[2], a_values[4], a_values[0],
+        get_identity(segment_values))]
+
+
+def convert_a_stanzas(stanzas, min_score=None):
+    """
+    Convert values of tokenized a-stanzas at once to a batch of
+    alignment blocks.
+
+    :param stanzas: tuples of the score, the start and end positions
+        and the gap-free segment lines of a-stanzas
+    :param min_score: the minimal score of alignment blocks; values
+        of blocks with lower scores are not converted
+    :type stanzas: list
+    :type min_score: int
+    :return: a tuple of a flat list of a-stanza values, five values
+        per stanza in the order of form_alignments, the list of
+        numbers of gap-free segments of the stanzas and a flat list of
+        their segment values
+    :rtype: tuple
+    """
+    if min_score is not None:
+        stanzas = [x for x in stanzas if int(x[0]) >= min_score]
+    a_values = list(map(int, chain.from_iterable(
+        map(itemgetter(0, 1, 2, 3, 4), stanzas))))
+    segment_lines = list(map(itemgetter(5), stanzas))
+    segment_nums = list(map(bytes.count, segment_lines,
+                            repeat(b'\n')))
+    tokens = b''.join(segment_lines).split()
+    # remove the 'l' prefixes of segment lines
+    del tokens[::6]
+    return a_values, segment_nums, list(map(int, tokens))
+
+
+def get_batch_blocks(section, batch):
+    """
+    Iterate through alignment blocks of a batch.
+
+    :param section: the section the blocks belong to
+    :param batch: a batch of alignment blocks; see convert_a_stanzas
+    :type section: Lav.Section
+    :type batch: tuple
+    :return: an iterator to iterate through alignment blocks
+    """
+    a_values, segment_nums, segment_values = batch
+    segment_start = 0
+    for i, segment_num in enumerate(segment_nums):
+        segment_end = segment_start + segment_num * 5
+        yield (section, a_values[i * 5:i * 5 + 5],
+               segment_values[segment_start:segment_end])
+        segment_start = segment_end
+
+
+def get_batch_identities(segment_nums, segment_values):
+    """
+    Given gap-free segments of a batch of alignment blocks, get the
+    identities of the blocks. The identities are the same as ones of
+    get_identity, but lists of values are processed at once.
+
+    :param segment_nums: numbers of gap-free segments of the blocks
+    :param segment_values: a flat list of gap-free segment values
+    :type segment_nums: list
+    :type segment_values: list
+    :return: the identity percentages of the alignment blocks
+    :rtype: list
+    """
+    segment_lengths = list(map(sub, segment_values[2::5],
+                               segment_values[0::5]))
+    identical_bases = list(map(truediv, map(
+        mul, segment_values[4::5], map(float, segment_lengths)),
+        repeat(100)))
+    block_ends = [0] * (len(segment_nums) + 1)
+    for i, segment_num in enumerate(segment_nums):
+        block_ends[i + 1] = block_ends[i] + segment_num
+    block_slices = list(map(slice, block_ends[:-1], block_ends[1:]))
+    return list(map(int, map(round, map(truediv, map(
+        mul, map(sum, map(identical_bases.__getitem__, block_slices)),
+        repeat(100)), map(sum, map(segment_lengths.__getitem__,
+                                   block_slices))))))
+
+
+def form_batch_alignments(section, batch, gapped=True):
+    """
+    Form alignments of a batch of alignment blocks; see
+    form_alignments.
+
+    :param section: the section the blocks belong to
+    :param batch: a batch of alignment blocks; see convert_a_stanzas
+    :param gapped: return gapped alignments
+    :type section: Lav.Section
+    :type batch: tuple
+    :type gapped: bool
+    :return: a list of gap-free alignments or gapped alignments
+    :rtype: list
+    """
+    a_values, segment_nums, segment_values = batch
+    if gapped:
+        segment_num = len(segment_values) // 5
+        return list(map(
+            Lav.GapFreeAlignment, repeat(section.first_seq, segment_num),
+            repeat(section.second_seq, segment_num),
+            segment_values[0::5], segment_values[2::5],
+            segment_values[1::5], segment_values[3::5],
+            segment_values[4::5]))
+    block_num = len(segment_nums)
+    return list(map(
+        Lav.GappedAlignment, repeat(section.first_seq, block_num),
+        repeat(section.second_seq, block_num), a_values[1::5],
+        a_values[3::5], a_values[2::5], a_values[4::5], a_values[0::5],
+        get_batch_identities(segment_nums, segment_values)))
+
+
+def batch_alignments(batches, gapped=True, min_identity=None):
+    """
+    Given batches of alignment blocks, iterate through their
+    alignments with the specified minimal identity.
+
+    :param batches: an iterable of tuples of a section and a batch of
+        its alignment blocks
+    :param gapped: return gapped alignments
+    :param min_identity: if specified, then only alignments with the
+        identity not less than the specified value are returned
+    :type gapped: bool
+    :type min_identity: int
+    :return: an iterator to iterate through gapped or ungapped
+        alignments
+    """
+    for section, batch in batches:
+        alignments = form_batch_alignments(section, batch, gapped)
+        if min_identity is not None:
+            alignments = [x for x in alignments
+                          if x.identity >= min_identity]
+        for alignment in alignments:
+            yield alignment
+
+
+def filter_alignments(blocks, gapped=True, min_identity=None):
+    """
+    Given alignment blocks, iterate through their alignments with the
+    specified minimal identity.
+
+    :param blocks: an iterable of alignment blocks
+    :param gapped: return gapped alignments
+    :param min_identity: if specified, then only alignments with the
+        identity not less than the specified value are returned
+    :type gapped: bool
+    :type min_identity: int
+    :return: an iterator to iterate through gapped or ungapped
+        alignments
+    """
+    for section, a_values, segment_values in blocks:
+        for alignment in form_alignments(section, a_values,
+                                         segment_values, gapped):
+            if min_identity is None or \
+                    alignment.identity >= min_identity:
+                yield alignment
+
+
+def read_sections(filename, start, end, gapped=True, min_score=None,
+                  min_identity=None, first_seqs=None,
+                  second_seqs=None):
+    """
+    Read alignments from sections in the specified byte range of a
+    LAV file. The routine is launched in worker processes.
+
+    :param filename: a name of a LAV file
+    :param start: the start position of the first section
+    :param end: the end position of the last section
+    :param gapped: return gapped alignments
+    :param min_score: the minimal score of alignment blocks
+    :param min_identity: the minimal identity of alignments
+    :param first_seqs: the first sequences of alignments
+    :param second_seqs: the second sequences of alignments
+    :type filename: str
+    :type start: int
+    :type end: int
+    :type gapped: bool
+    :type min_score: int
+    :type min_identity: int
+    :type first_seqs: list
+    :type second_seqs: list
+    :return: a list of alignments from the sections
+    :rtype: list
+    """
+    return list(Lav(filename).section_alignments(
+        start, end, gapped, min_score, min_identity, first_seqs,
+        second_seqs))
+
+
+LavSegments = namedtuple('LavSegments', (
+    'first_start', 'first_end', 'second_start', 'second_end',
+    'identity', 'block_id', 'block_score', 'block_pair', 'seq_pairs'
+))
+
+
+def load_segments(filename):
+    """
+    Load gap-free segments of a LAV file to columnar arrays. Segment
+    columns are arrays of the same length; the block_id column
+    contains the number of the alignment block a segment belongs to.
+    Block columns contain the score and the number of the aligned
+    sequence pair of each block; the pairs themselves are listed in
+    seq_pairs. The arrays can be wrapped by numpy.frombuffer without
+    copying.
+
+    :param filename: a name of a LAV file
+    :type filename: str
+    :return: a named tuple of segment and block arrays and the list
+        of aligned sequence pairs
+    :rtype: LavSegments
+    """
+    segments = LavSegments(*([array('l') for _ in range(4)] +
+                             [array('B')] +
+                             [array('l') for _ in range(3)] + [[]]))
+    pair_ids = dict()
+    block_id = 0
+    for section, a_values, segment_values in Lav(filename).blocks():
+        pair = (section.first_seq, section.second_seq)
+        if pair not in pair_ids:
+            pair_ids[pair] = len(segments.seq_pairs)
+            segments.seq_pairs.append(pair)
+        segments.block_score.append(a_values[0])
+        segments.block_pair.append(pair_ids[pair])
+        segments.first_start.extend(segment_values[0::5])
+        segments.second_start.extend(segment_values[1::5])
+        segments.first_end.extend(segment_values[2::5])
+        segments.second_end.extend(segment_values[3::5])
+        segments.identity.extend(segment_values[4::5])
+        segments.block_id.extend([block_id] * (len(segment_values) //
+                                               5))
+        block_id += 1
+    return segments
+
+
+def get_chain_lines(chain_id, section, a_values, segment_values):
+    """
+    Given an alignment block, form its record in the chain format.
+
+    :param chain_id: the chain ID
+    :param section: the section the alignment block belongs to
+    :param a_values: the a-stanza values of the alignment block
+    :param segment_values: a flat list of gap-free segment values
+    :type chain_id: int
+    :type section: Lav.Section
+    :type a_values: list
+    :type segment_values: list
+    :return: lines of the chain record
+    :rtype: list
+    """
+    lines = [chain_header_template.format(
+        a_values[0], section.first_seq, section.first_size,
+        '-' if section.first_rev_comp else '+', a_values[1] - 1,
+        a_values[3], section.second_seq, section.second_size,
+        '-' if section.second_rev_comp else '+', a_values[2] - 1,
+        a_values[4], chain_id)]
+    for i in range(0, len(segment_values) - 5, 5):
+        lines.append('{}\t{}\t{}\n'.format(
+            segment_values[i + 2] - segment_values[i] + 1,
+            segment_values[i + 5] - segment_values[i + 2] - 1,
+            segment_values[i + 6] - segment_values[i + 3] - 1))
+    lines.append('{}\n\n'.format(
+        segment_values[-3] - segment_values[-5] + 1))
+    return lines
+
+
+def get_psl_line(section, a_values, segment_values):
+    """
+    Given an alignment block, form its record in the PSL format. The
+    first sequence is the target and the second one is the query.
+
+    :param section: the section the alignment block belongs to
+    :param a_values: the a-stanza values of the alignment block
+    :param segment_values: a flat list of gap-free segment values
+    :type section: Lav.Section
+    :type a_values: list
+    :type segment_values: list
+    :return: the PSL line of the alignment block
+    :rtype: str
+    """
+    first_starts = segment_values[0::5]
+    second_starts = segment_values[1::5]
+    first_ends = segment_values[2::5]
+    second_ends = segment_values[3::5]
+    block_sizes = [y - x + 1 for x, y in zip(first_starts, first_ends)]
+    matches = int(round(sum(
+        x * y / 100.0 for x, y in zip(block_sizes,
+                                      segment_values[4::5]))))
+    first_gaps = [x - y - 1 for x, y in zip(first_starts[1:],
+                                            first_ends)]
+    second_gaps = [x - y - 1 for x, y in zip(second_starts[1:],
+                                             second_ends)]
+    if section.second_rev_comp:
+        # query positions are given for the reverse strand
+        second_start = section.second_size - a_values[4]
+        second_end = section.second_size - a_values[2] + 1
+    else:
+        second_start = a_values[2] - 1
+        second_end = a_values[4]
+    return psl_line_template.format(
+        matches, sum(block_sizes) - matches, 0, 0,
+        sum(1 for x in second_gaps if x > 0),
+        sum(x for x in second_gaps if x > 0),
+        sum(1 for x in first_gaps if x > 0),
+        sum(x for x in first_gaps if x > 0),
+        '-' if section.second_rev_comp else '+',
+        section.second_seq, section.second_size, second_start,
+        second_end, section.first_seq, section.first_size,
+        a_values[1] - 1, a_values[3], len(block_sizes),
+        ''.join('{},'.format(x) for x in block_sizes),
+        ''.join('{},'.format(x - 1) for x in second_starts),
+        ''.join('{},'.format(x - 1) for x in first_starts))
+
+
+def get_bed_record(section, a_values, segment_values):
+    """
+    Given an alignment block, form its BED12 record on the first
+    sequence. The record name contains the location of the block on
+    the second sequence, its score is the block identity and its
+    blocks are gap-free segments.
+
+    :param section: the section the alignment block belongs to
+    :param a_values: the a-stanza values of the alignment block
+    :param segment_values: a flat list of gap-free segment values
+    :type section: Lav.Section
+    :type a_values: list
+    :type segment_values: list
+    :return: the BED12 record of the alignment block
+    :rtype: bed.Record
+    """
+    block_starts, block_sizes = bed.get_blocks(segment_values[0::5],
+                                               segment_values[2::5])
+    return bed.Record(
+        seq=section.first_seq,
+        start=a_values[1] - 1,
+        end=a_values[3],
+        name='{}:{}-{}'.format(section.second_seq, a_values[2] - 1,
+                               a_values[4]),
+        score=get_identity(segment_values),
+        strand='-' if section.second_rev_comp else '+',
+        thick_start=a_values[1] - 1,
+        thick_end=a_values[3],
+        color='0',
+        block_num=len(block_sizes),
+        block_sizes=','.join(map(str, block_sizes)),
+        block_starts=','.join(map(str, block_starts)),
+        extra=[]
+    )
+
+
+def convert_lav(lav_file, output_handle, output_format,
+                buffer_size=65536):
+    """
+    Convert alignment blocks of a LAV file to the chain, PSL or BED
+    format and write them to the specified destination.
+
+    :param lav_file: a name of a LAV file
+    :param output_handle: a handle of an output file
+    :param output_format: the output format: 'chain', 'psl' or 'bed'
+    :param buffer_size: the number of alignment blocks kept in memory
+        before they are written to the output file
+    :type lav_file: str
+    :type output_format: str
+    :type buffer_size: int
+    """
+    lines = []
+    block_num = 0
+    for section, a_values, segment_values in Lav(lav_file).blocks():
+        block_num += 1
+        if output_format == 'chain':
+            lines.extend(get_chain_lines(block_num, section, a_values,
+                                         segment_values))
+        elif output_format == 'psl':
+            lines.append(get_psl_line(section, a_values,
+                                      segment_values))
+        else:
+            lines.append(bed.get_record_line(get_bed_record(
+                section, a_values, segment_values)))
+        if block_num % buffer_size == 0:
+            output_handle.writelines(lines)
+            lines = []
+    output_handle.writelines(lines)
+
+
+# alignment types are available at the module level to pass
+# alignments from worker processes
+GapFreeAlignment = Lav.GapFreeAlignment
+GappedAlignment = Lav.GappedAlignment
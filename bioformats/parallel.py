@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import io
+import logging
+import multiprocessing
+import os
+from collections import deque
+
+# the greatest size of a file chunk processed by a single worker
+max_chunk_size = 64 * 1024 * 1024
+
+# the size of a block read at once to count lines
+block_size = 1024 * 1024
+
+
+def get_chunks(filename, chunk_num, start=0, end=None):
+    """
+    Given a name of a file, split it into byte ranges that start and
+    end at line boundaries.
+
+    :param filename: a name of a file
+    :param chunk_num: the number of chunks to split the file into
+    :param start: the position to start splitting the file from
+    :param end: the position to stop splitting the file at; it must
+        be a line boundary
+    :type filename: str
+    :type chunk_num: int
+    :type start: int
+    :type end: int
+    :return: a list of tuples of chunk start and end positions
+    :rtype: list
+    """
+    if end is None:
+        file_size = os.path.getsize(filename)
+    else:
+        file_size = end
+    chunk_size = max(1, (file_size - start) // max(1, chunk_num))
+    chunks = []
+    with io.open(filename, 'rb') as input_file:
+        chunk_start = start
+        while chunk_start < file_size:
+            # move the chunk end to the beginning of the next line
+            input_file.seek(min(chunk_start + chunk_size, file_size))
+            if input_file.tell() > chunk_start:
+                input_file.seek(-1, os.SEEK_CUR)
+            input_file.readline()
+            chunk_end = input_file.tell()
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+    return chunks
+
+
+def read_lines(filename, start, end):
+    """
+    Read lines from the specified byte range of a file.
+
+    :param filename: a name of a file
+    :param start: the range start position
+    :param end: the range end position
+    :type filename: str
+    :type start: int
+    :type end: int
+    :return: a list of lines from the range
+    :rtype: list
+    """
+    with io.open(filename, 'rb') as input_file:
+        input_file.seek(start)
+        data = input_file.read(end - start)
+    if not isinstance(data, str):
+        # in Python 3, lines are decoded to native strings
+        data = data.decode('utf-8')
+    lines = [x + '\n' for x in data.split('\n')]
+    # the last part is either empty or a line without the newline
+    last_line = lines.pop()
+    if last_line != '\n':
+        lines.append(last_line[:-1])
+    return lines
+
+
+def count_lines(filename, start, end):
+    """
+    Count lines in the specified byte range of a file.
+
+    :param filename: a name of a file
+    :param start: the range start position
+    :param end: the range end position
+    :type filename: str
+    :type start: int
+    :type end: int
+    :return: the number of newline characters in the range
+    :rtype: int
+    """
+    line_num = 0
+    with io.open(filename, 'rb') as input_file:
+        input_file.seek(start)
+        for block_start in range(start, end, block_size):
+            line_num += input_file.read(
+                min(block_size, end - block_start)).count(b'\n')
+    return line_num
+
+
+class LineNumberFilter(logging.Filter):
+    """
+    This class implements a logging filter that shifts line numbers
+    in messages logged while a file chunk is processed, so they point
+    at lines of the whole file rather than lines of the chunk. The
+    lines preceding the chunk are counted only when such a message
+    is logged.
+    """
+    def __init__(self, filename, start):
+        """
+        Given a name of a file and the start position of its chunk,
+        create a filter for messages logged while the chunk is
+        processed.
+
+        :param filename: a name of a file
+        :param start: the chunk start position
+        :type filename: str
+        :type start: int
+        """
+        super(LineNumberFilter, self).__init__()
+        self.__filename = filename
+        self.__start = start
+        self.__line_offset = None
+
+    def filter(self, record):
+        """
+        Shift the line number of a message which starts with it.
+
+        :param record: a logging record
+        :type record: logging.LogRecord
+        :return: the record is always logged
+        :rtype: bool
+        """
+        if not getattr(record, 'line_shifted', False) and \
+                str(record.msg).startswith('line %d') and \
+                isinstance(record.args, tuple) and record.args:
+            if self.__line_offset is None:
+                self.__line_offset = count_lines(self.__filename, 0,
+                                                 self.__start)
+            record.args = (record.args[0] + self.__line_offset, ) + \
+                record.args[1:]
+            record.line_shifted = True
+        return True
+
+
+def apply_to_chunk(task):
+    """
+    Apply a function to a file chunk. The routine is launched in
+    worker processes. If the chunk lines are numbered from its start,
+    then line numbers in logged messages are shifted to lines of the
+    whole file.
+
+    :param task: a tuple of a function, a file name, chunk start and
+        end positions, extra arguments to the function and the flag
+        if the function numbers lines from the chunk start
+    :type task: tuple
+    :return: the value returned by the function
+    """
+    function, filename, start, end, args, relative_lines = task
+    if not relative_lines or start == 0:
+        return function(filename, start, end, *args)
+    line_filter = LineNumberFilter(filename, start)
+    handlers = list(logging.getLogger().handlers)
+    for handler in handlers:
+        handler.addFilter(line_filter)
+    try:
+        return function(filename, start, end, *args)
+    finally:
+        for handler in handlers:
+            handler.removeFilter(line_filter)
+
+
+def map_chunks(function, filename, threads, args=(), start=0,
+               end=None, chunk_size=None):
+    """
+    Split a file into chunks of lines and apply a function to each of
+    them in worker processes. The function receives a file name,
+    chunk start and end positions and the specified extra arguments;
+    it must be defined at the module level. Line numbers in messages
+    logged by the function are counted from the chunk start; they are
+    shifted to point at lines of the whole file.
+
+    :param function: a function to be applied to file chunks
+    :param filename: a name of a file
+    :param threads: the number of worker processes
+    :param args: extra arguments to the function
+    :param start: the position to start processing the file from,
+        for example, to skip its header
+    :param end: the position to stop processing the file at; by
+        default, the file is processed to its end
+    :param chunk_size: the approximate size of a chunk in bytes; by
+        default, it is chosen to balance the load between workers
+    :type filename: str
+    :type threads: int
+    :type args: tuple
+    :type start: int
+    :type end: int
+    :type chunk_size: int
+    :return: an iterator of values returned by the function for file
+        chunks in the order of the chunks
+    """
+    if end is None:
+        end = os.path.getsize(filename)
+    if chunk_size is None:
+        # several chunks per worker balance the load between them
+        chunk_num = max(threads * 4,
+                        (end - start) // max_chunk_size + 1)
+    else:
+        chunk_num = (end - start) // chunk_size + 1
+    return map_ranges(function, filename,
+                      get_chunks(filename, chunk_num, start, end),
+                      threads, args, relative_lines=True)
+
+
+def map_ranges(function, filename, ranges, threads, args=(),
+               relative_lines=False, max_pending=None):
+    """
+    Apply a function to the specified byte ranges of a file in worker
+    processes. The function receives a file name, range start and end
+    positions and the specified extra arguments; it must be defined at
+    the module level. Only a limited number of ranges are submitted to
+    workers ahead of the returned values consumed, so the results do
+    not pile up in memory if they are consumed slowly.
+
+    :param function: a function to be applied to file ranges
+    :param filename: a name of a file
+    :param ranges: a list of tuples of range start and end positions
+    :param threads: the number of worker processes
+    :param args: extra arguments to the function
+    :param relative_lines: the function numbers lines from the range
+        start in logged messages, so the numbers are to be shifted
+    :param max_pending: the greatest number of ranges submitted to
+        workers and not consumed yet; by default, it is twice the
+        number of workers
+    :type filename: str
+    :type ranges: list
+    :type threads: int
+    :type args: tuple
+    :type relative_lines: bool
+    :type max_pending: int
+    :return: an iterator of values returned by the function for file
+        ranges in the order of the ranges
+    """
+    tasks = [(function, filename, range_start, range_end, args,
+              relative_lines) for range_start, range_end in ranges]
+    if threads < 2:
+        for task in tasks:
+            yield apply_to_chunk(task)
+        return
+    if max_pending is None:
+        max_pending = threads * 2
+    pool = multiprocessing.Pool(threads)
+    try:
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(apply_to_chunk, (task, )))
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
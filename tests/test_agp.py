@@ -6,8 +6,10 @@
 
 import logging
 import os
+import tempfile
 import unittest
-from bioformats.agp import Reader
+from bioformats.agp import Reader, Lifter, liftover, agp2fasta
+from bioformats.exception import AgpError
 
 
 path = os.path.dirname(__file__)
@@ -31,3 +33,146 @@ class TestReader(unittest.TestCase):
             parser = Reader(input_file)
             for _ in parser.records():
                 pass
+
+
+class TestLifter(unittest.TestCase):
+    def setUp(self):
+        self.__agp_file = os.path.join('data', 'agp', 'liftover.agp')
+        with open(self.__agp_file) as agp_file:
+            self.__lifter = Lifter(agp_file)
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
+
+    def test_lift(self):
+        """
+        Check if coordinates are translated between objects and
+        components.
+        """
+        lifter = self.__lifter
+        self.assertEqual(lifter.lift('ctg1', 3, 5),
+                         ('scaf1', 3, 5, False))
+        self.assertEqual(lifter.lift('ctg2', 1, 3),
+                         ('scaf1', 23, 25, True))
+        self.assertEqual(lifter.lift('ctg3', 3), ('scaf2', 1, 1, False))
+        self.assertEqual(lifter.lift('scaf1', 23, 25, True),
+                         ('ctg2', 1, 3, True))
+        self.assertEqual(lifter.lift('scaf2', 8, to_component=True),
+                         ('ctg3', 10, 10, False))
+        # positions outside components or spanning gaps
+        self.assertIsNone(lifter.lift('ctg3', 1, 3))
+        self.assertIsNone(lifter.lift('ctg1', 5, 11))
+        self.assertIsNone(lifter.lift('ctg4', 1))
+        self.assertIsNone(lifter.lift('scaf1', 12, to_component=True))
+        self.assertIsNone(lifter.lift('scaf1', 8, 18,
+                                      to_component=True))
+        self.assertIsNone(lifter.lift('ctg1', 1, to_component=True))
+
+    def __liftover(self, file_format, to_component=False):
+        """
+        Translate the test file of the specified format and return the
+        output lines and the number of untranslated records.
+        """
+        input_file = os.path.join('data', 'agp',
+                                  'liftover.' + file_format)
+        with open(input_file) as input_handle:
+            with open(self.__output_file, 'w') as output_handle:
+                unmapped_num = liftover(self.__lifter, input_handle,
+                                        output_handle, file_format,
+                                        to_component)
+        with open(self.__output_file) as output_handle:
+            return output_handle.read().splitlines(), unmapped_num
+
+    def test_liftover(self):
+        """
+        Check if BED, VCF and GFF3 files are translated.
+        """
+        lines, unmapped_num = self.__liftover('bed')
+        self.assertEqual(unmapped_num, 1)
+        self.assertEqual(lines, [
+            'track name=test',
+            'scaf1\t2\t5\ta\t0\t+',
+            'scaf1\t22\t25\tb\t0\t-\t23\t24\t0\t2\t1,1\t0,2',
+            'scaf2\t2\t4\tc\t0\t-'])
+
+        lines, unmapped_num = self.__liftover('vcf')
+        self.assertEqual(unmapped_num, 1)
+        self.assertEqual(lines[1:], [
+            '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO',
+            'scaf1\t3\t.\tC\tT\t.\tPASS\t.',
+            'scaf1\t24\t.\tT\tC\t.\tPASS\t.'])
+
+        lines, unmapped_num = self.__liftover('gff3')
+        self.assertEqual(unmapped_num, 0)
+        self.assertEqual(lines, [
+            '##gff-version 3',
+            'scaf1\ttest\tgene\t16\t25\t.\t-\t.\tID=gene1',
+            'scaf1\ttest\tmRNA\t17\t24\t.\t-\t.\t'
+            'ID=mRNA1;Parent=gene1'])
+
+        # object coordinates are translated back to component ones
+        with open(self.__output_file) as input_handle:
+            lifted_lines = input_handle.readlines()
+        with open(self.__output_file, 'w') as output_handle:
+            liftover(self.__lifter, lifted_lines, output_handle, 'gff3',
+                     to_component=True)
+        with open(self.__output_file) as output_handle:
+            self.assertEqual(output_handle.read().splitlines()[1:], [
+                'ctg2\ttest\tgene\t1\t10\t.\t+\t.\tID=gene1',
+                'ctg2\ttest\tmRNA\t2\t9\t.\t+\t.\t'
+                'ID=mRNA1;Parent=gene1'])
+
+        with self.assertRaises(AgpError):
+            self.__liftover('agp')
+
+
+class TestAgp2Fasta(unittest.TestCase):
+    def setUp(self):
+        self.__agp_file = os.path.join('data', 'agp', 'liftover.agp')
+        self.__fasta_file = os.path.join('data', 'agp',
+                                         'components.fa')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def tearDown(self):
+        for filename in (self.__output_file, self.__fasta_file + '.fai'):
+            if os.path.isfile(filename):
+                os.unlink(filename)
+
+    def test_agp2fasta(self):
+        """
+        Check if sequences of objects are assembled from components.
+        """
+        for threads in (1, 2):
+            for chunk_size in (3, 1048576):
+                agp2fasta(self.__agp_file, self.__fasta_file,
+                          self.__output_file, 7, threads, chunk_size)
+                with open(self.__output_file) as output_file:
+                    self.assertEqual(output_file.read().splitlines(), [
+                        '>scaf1', 'ACGTACG', 'TAANNNN', 'NGTAACC',
+                        'GGTT', '>scaf2', 'GCCCATA', 'T'])
+
+        # a component sequence is missing
+        missing_file = os.path.join('data', 'agp', 'correct.agp')
+        with self.assertRaises(AgpError):
+            agp2fasta(missing_file, self.__fasta_file,
+                      self.__output_file)
+        # temporary files are removed if assembly of a part fails
+        temp_dir = tempfile.mkdtemp()
+        default_temp_dir = tempfile.tempdir
+        tempfile.tempdir = temp_dir
+        try:
+            with self.assertRaises(AgpError):
+                agp2fasta(missing_file, self.__fasta_file,
+                          self.__output_file, threads=2)
+            self.assertEqual(os.listdir(temp_dir), [])
+        finally:
+            tempfile.tempdir = default_temp_dir
+            os.rmdir(temp_dir)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestAgp2Fasta(unittest.TestCase):
+    def setUp(self):
+        self.__agp_file = os.path.join('data', 'agp', 'liftover.agp')
+        self.__fasta_file = os.path.join('data', 'agp',
+                                         'components.fa')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_agp2fasta(self):
+        sys.argv = ['', 'agp2fasta', self.__agp_file,
+                    self.__fasta_file, self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'agp2fasta', '-w', '5', '--threads', '2',
+                    self.__agp_file, self.__fasta_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        for filename in (self.__output_file, self.__fasta_file + '.fai'):
+            if os.path.isfile(filename):
+                os.unlink(filename)
@@ -246,6 +246,44 @@ class TestConvertGff2BedGene(unittest.TestCase):
             for _ in reader.records():
                 pass
 
+    def test_convert_gff2bed_gene_unsorted(self):
+        interleaved_file = os.path.join('data', 'gff3',
+                                        'exons_interleaved.gff')
+        # a small exon limit makes the grouper use temporary files
+        for max_exons in (1000000, 2):
+            bioformats.bed.convert_gff2bed_gene(interleaved_file,
+                                                self.__output_file,
+                                                unsorted=True,
+                                                max_exons=max_exons)
+            with open(self.__output_file) as bed_file:
+                reader = Reader(bed_file)
+                genes = dict((x.name, x) for x in reader.records())
+            self.assertEqual(len(genes), 4)
+            gene = genes['comp166861_c0_seq1.mrna1']
+            self.assertEqual(gene.start, 179429)
+            self.assertEqual(gene.end, 180222)
+            self.assertEqual(gene.block_num, 2)
+            self.assertEqual(genes['comp187267_c0_seq1.mrna1'].strand,
+                             '-')
+
+    def test_exon_grouper(self):
+        """
+        Check if the exon grouper returns genes in the same order
+        regardless of the hash seed.
+        """
+        for max_exons, order in ((1000, [0, 1, 2, 3, 4, 5]),
+                                 (3, [4, 5, 0, 1, 2, 3])):
+            grouper = bioformats.bed.ExonGrouper(max_exons, 2)
+            for start in (100, 10):
+                for i in range(6):
+                    grouper.add('gene{}'.format(i), 'chr1', '+',
+                                start + i, start + i + 5)
+            self.assertEqual(
+                list(grouper.genes()),
+                [('gene{}'.format(i), 'chr1', '+',
+                  [(10 + i, 15 + i), (100 + i, 105 + i)])
+                 for i in order])
+
     def test_convert_gff2bed(self):
         bioformats.bed.convert_gff2bed(self.__input_file,
                                        self.__output_file,
@@ -276,6 +314,24 @@ class TestConvertGff2BedGene(unittest.TestCase):
             for _ in reader.records():
                 pass
 
+    def test_convert_gff2bed_parallel(self):
+        serial_output = tempfile.NamedTemporaryFile().name
+        for name_tag in (None, 'ID'):
+            bioformats.bed.convert_gff2bed(self.__input_file,
+                                           serial_output, 'exon',
+                                           name_tag=name_tag,
+                                           attributes=['Parent'])
+            bioformats.bed.convert_gff2bed(self.__input_file,
+                                           self.__output_file, 'exon',
+                                           name_tag=name_tag,
+                                           attributes=['Parent'],
+                                           threads=2)
+            with open(serial_output) as serial_file:
+                with open(self.__output_file) as parallel_file:
+                    self.assertEqual(serial_file.read(),
+                                     parallel_file.read())
+        os.unlink(serial_output)
+
     def tearDown(self):
         if os.path.isfile(self.__output_file):
             os.unlink(self.__output_file)
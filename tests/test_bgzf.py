@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from bioformats import bgzf
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestBgzfWriter(unittest.TestCase):
+    def setUp(self):
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_write(self):
+        """
+        Check if text is written to BGZF blocks readable by gzip.
+        """
+        lines = ['line {}\n'.format(i) for i in range(20000)]
+        with bgzf.Writer(self.__output_file) as output_file:
+            output_file.writelines(lines[:10])
+            for line in lines[10:]:
+                output_file.write(line)
+        with gzip.open(self.__output_file, 'rt') as input_file:
+            self.assertEqual(input_file.readlines(), lines)
+
+        # check that the file ends with the end-of-file marker
+        with io.open(self.__output_file, 'rb') as input_file:
+            data = input_file.read()
+        self.assertTrue(data.endswith(bgzf.eof_block))
+        # the data must be split into several blocks
+        self.assertGreater(data.count(b'\x1f\x8b\x08\x04'), 2)
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
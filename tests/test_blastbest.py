@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestBlastBest(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join(
+            'data', 'blast', 'blast_tabular_alignments.txt'
+        )
+        self.__extended_file = os.path.join(
+            'data', 'blast', 'blast_tabular_extended.txt'
+        )
+        self.__columns = 'qseqid sseqid pident length mismatch ' \
+            'gapopen qstart qend sstart send evalue bitscore qlen slen ' \
+            'qcovs staxids'
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_blastbest(self):
+        sys.argv = ['', 'blastbest', self.__input_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastbest', '-k', '2', '--key', 'e_value',
+                    '-u', self.__input_file, self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastbest', '--key', 'qlen', '--columns',
+                    self.__columns, self.__extended_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
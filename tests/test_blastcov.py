@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+from bioformats.exception import BlastTabError
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestBlastCov(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join(
+            'data', 'blast', 'blast_tabular_extended.txt'
+        )
+        self.__output_file = tempfile.NamedTemporaryFile().name
+        self.__bed_file = tempfile.NamedTemporaryFile().name
+        self.__fasta_file = tempfile.NamedTemporaryFile(
+            suffix='.fa').name
+
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def test_blastcov(self):
+        sys.argv = ['', 'blastcov', self.__input_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastcov', '-s', '-b', self.__bed_file,
+                    self.__input_file, self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastcov', '--columns',
+                    'qseqid sseqid pident length mismatch gapopen '
+                    'qstart qend sstart send evalue bitscore qlen slen '
+                    'qcovs staxids', self.__input_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+        with open(self.__output_file) as output_file:
+            self.assertEqual(output_file.readline().split('\t')[1],
+                             '2856')
+
+        # query lengths are taken from the FASTA file
+        with open(self.__fasta_file, 'w') as fasta_file:
+            for i in range(5374, 5380):
+                fasta_file.write('>lcl|BA000007.2_gene_{}\n{}\n'.format(
+                    i, 'A' * 10000))
+        sys.argv = ['', 'blastcov', '-f', self.__fasta_file,
+                    self.__input_file, self.__output_file]
+        bioformats.cli.bioformats()
+        with open(self.__output_file) as output_file:
+            self.assertEqual(output_file.readline().split('\t')[1:],
+                             ['10000', '2856', '0.2856\n'])
+
+        # a query is missing in the FASTA file
+        os.unlink(self.__fasta_file + '.fai')
+        with open(self.__fasta_file, 'w') as fasta_file:
+            fasta_file.write('>lcl|BA000007.2_gene_5374\nACGT\n')
+        with self.assertRaises(BlastTabError):
+            bioformats.cli.bioformats()
+
+    def tearDown(self):
+        for filename in (self.__output_file, self.__bed_file,
+                         self.__fasta_file, self.__fasta_file + '.fai'):
+            if os.path.isfile(filename):
+                os.unlink(filename)
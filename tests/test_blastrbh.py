@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestBlastRbh(unittest.TestCase):
+    def setUp(self):
+        self.__first_file = os.path.join('data', 'blast',
+                                         'blast_rbh_first.txt')
+        self.__second_file = os.path.join('data', 'blast',
+                                          'blast_rbh_second.txt')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_blastrbh(self):
+        sys.argv = ['', 'blastrbh', self.__first_file,
+                    self.__second_file, self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastrbh', '--key', 'e_value',
+                    self.__first_file, self.__second_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+        sys.argv = ['', 'blastrbh', '--columns', '6', self.__first_file,
+                    self.__second_file, self.__output_file]
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
@@ -6,8 +6,12 @@
 
 import os
 import logging
+import tempfile
 import unittest
-from bioformats.blast import BlastTab
+from array import array
+from bioformats.blast import BlastTab, load_table, top_hits, \
+    get_blast_line, filter_blast, reciprocal_best_hits, merge_intervals, \
+    covered_regions
 from bioformats.exception import BlastTabError
 
 path = os.path.dirname(__file__)
@@ -78,3 +82,296 @@ class TestBlastTab(unittest.TestCase):
                 parser = BlastTab(incorrect_file)
                 with self.assertRaises(BlastTabError):
                     next(parser.alignments())
+
+    def test_load_table(self):
+        """
+        Check if a BLAST tabular file is loaded to columnar arrays.
+        """
+        with open(self.__correct_file) as correct_file:
+            alignments = list(BlastTab(correct_file).alignments())
+        for chunk_size in (100, 8 * 1024 * 1024):
+            table = load_table(self.__correct_file, chunk_size)
+            self.assertEqual(len(table.query), len(alignments))
+            self.assertEqual(len(table.queries),
+                             len(set(x.query for x in alignments)))
+            self.assertEqual(table.subjects,
+                             ['gi|556503834|ref|NC_000913.3|'])
+            for i, alignment in enumerate(alignments):
+                self.assertEqual(
+                    (table.queries[table.query[i]],
+                     table.subjects[table.subject[i]]) +
+                    tuple(x[i] for x in table[2:12]), alignment)
+
+        for incorrect_input in self.__incorrect_lines:
+            with self.assertRaises(BlastTabError):
+                load_table(os.path.join('data', 'blast',
+                                        'incorrect_input',
+                                        incorrect_input))
+
+    def test_top_hits(self):
+        """
+        Check if the best alignments of each query are selected.
+        """
+        with open(self.__correct_file) as correct_file:
+            alignments = list(BlastTab(correct_file).alignments())
+        queries = []
+        for alignment in alignments:
+            if alignment.query not in queries:
+                queries.append(alignment.query)
+        for k in (1, 2):
+            for key in ('bit_score', 'e_value', 'length'):
+                expected = []
+                for query in queries:
+                    query_hits = [x for x in alignments
+                                  if x.query == query]
+                    query_hits.sort(key=lambda x: x.e_value
+                                    if key == 'e_value' else
+                                    -getattr(x, key))
+                    expected += query_hits[:k]
+                self.assertEqual(list(top_hits(alignments, k, key)),
+                                 expected)
+                self.assertEqual(
+                    list(top_hits(alignments, k, key, grouped=False)),
+                    expected)
+                # alignments of a query are not contiguous
+                mixed_hits = list(top_hits(
+                    alignments[1::2] + alignments[::2], k, key,
+                    grouped=False))
+                self.assertEqual(
+                    sorted((x.query, getattr(x, key)) for x in
+                           mixed_hits),
+                    sorted((x.query, getattr(x, key)) for x in
+                           expected))
+        self.assertEqual(list(top_hits([], 1)), [])
+        with self.assertRaises(BlastTabError):
+            next(top_hits(alignments, 1, 'query'))
+
+        # the best alignments are written in the BLAST tabular format
+        with open(self.__correct_file) as correct_file:
+            lines = correct_file.readlines()
+        self.assertEqual(
+            list(BlastTab([get_blast_line(x) for x in
+                           alignments]).alignments()), alignments)
+        self.assertEqual(get_blast_line(alignments[0]).split(),
+                         lines[0].split())
+
+    def test_filter_blast(self):
+        """
+        Check if alignments are filtered by their e-values, identities
+        and lengths.
+        """
+        with open(self.__correct_file) as correct_file:
+            alignments = list(BlastTab(correct_file).alignments())
+        output_file = tempfile.NamedTemporaryFile().name
+        try:
+            for threads in (1, 2):
+                with open(output_file, 'w') as output:
+                    filter_blast(self.__correct_file, output, 1e-50, 99,
+                                 100, threads)
+                with open(output_file) as output:
+                    self.assertEqual(
+                        list(BlastTab(output).alignments()),
+                        [x for x in alignments if x.e_value <= 1e-50 and
+                         x.identity >= 99 and x.length >= 100])
+                with open(output_file, 'w') as output:
+                    filter_blast(self.__correct_file, output,
+                                 threads=threads)
+                with open(output_file) as output:
+                    self.assertEqual(
+                        list(BlastTab(output).alignments()), alignments)
+            with self.assertRaises(BlastTabError):
+                with open(output_file, 'w') as output:
+                    filter_blast(os.path.join(
+                        'data', 'blast', 'incorrect_input',
+                        'blast_tabular_line_incomplete.txt'), output)
+        finally:
+            os.unlink(output_file)
+
+    def test_custom_columns(self):
+        """
+        Check if BLAST tabular files with custom columns are read.
+        """
+        extended_file = os.path.join('data', 'blast',
+                                     'blast_tabular_extended.txt')
+        with open(self.__correct_file) as correct_file:
+            alignments = list(BlastTab(correct_file).alignments())[:6]
+        # the columns are taken from the '# Fields:' line
+        with open(extended_file) as input_file:
+            parser = BlastTab(input_file)
+            extended_alignments = list(parser.alignments())
+        self.assertEqual(parser.alignment_type._fields[12:],
+                         ('qlen', 'slen', 'qcovs', 'staxids'))
+        self.assertEqual([x[:12] for x in extended_alignments],
+                         [tuple(x) for x in alignments])
+        self.assertEqual(extended_alignments[0][12:],
+                         (2856, 4641652, 100.0, '511145'))
+        self.assertEqual(list(top_hits(extended_alignments, 1, 'qlen')),
+                         extended_alignments)
+        self.assertEqual(get_blast_line(extended_alignments[0]).split(),
+                         ['lcl|BA000007.2_gene_5374',
+                          'gi|556503834|ref|NC_000913.3|', '98.14',
+                          '2856', '53', '0', '1', '2856', '4483837',
+                          '4480982', '0.0', '4981', '2856', '4641652',
+                          '100.0', '511145'])
+
+        # the columns are specified explicitly
+        for columns in ('6 qseqid sseqid pident length mismatch gapopen '
+                        'qstart qend sstart send evalue bitscore qlen '
+                        'slen qcovs staxids',
+                        ['qseqid', 'sseqid', 'pident', 'length',
+                         'mismatch', 'gapopen', 'qstart', 'qend',
+                         'sstart', 'send', 'evalue', 'bitscore', 'qlen',
+                         'slen', 'qcovs', 'staxids']):
+            with open(extended_file) as input_file:
+                self.assertEqual(
+                    list(BlastTab(input_file, columns).alignments()),
+                    extended_alignments)
+        # the default columns do not match the extended file
+        with open(extended_file) as input_file:
+            with self.assertRaises(BlastTabError):
+                next(BlastTab(input_file, '6').alignments())
+        with open(self.__correct_file) as correct_file:
+            parser = BlastTab(correct_file, 'qseqid sseqid pident')
+            with self.assertRaises(BlastTabError):
+                next(parser.alignments())
+        for columns in ('qseqid qseqid+1', 'qseqid sseqid qseqid'):
+            with self.assertRaises(BlastTabError):
+                BlastTab([], columns)
+
+        # custom columns are loaded to arrays and filtered
+        columns = ('qseqid sseqid pident length mismatch gapopen qstart '
+                   'qend sstart send evalue bitscore qlen slen qcovs '
+                   'staxids')
+        table = load_table(extended_file, columns=columns)
+        self.assertEqual(table._fields[12:],
+                         ('qlen', 'slen', 'qcovs', 'staxids', 'queries',
+                          'subjects'))
+        self.assertEqual(
+            [(table.queries[table.query[i]],
+              table.subjects[table.subject[i]]) +
+             tuple(x[i] for x in table[2:16])
+             for i in range(len(table.query))], extended_alignments)
+        output_file = tempfile.NamedTemporaryFile().name
+        try:
+            for threads in (1, 2):
+                with open(output_file, 'w') as output:
+                    filter_blast(extended_file, output, 1e-50, 99, 100,
+                                 threads, columns)
+                with open(output_file) as output:
+                    self.assertEqual(
+                        list(BlastTab(output, columns).alignments()),
+                        [x for x in extended_alignments
+                         if x.e_value <= 1e-50 and x.identity >= 99 and
+                         x.length >= 100])
+            with self.assertRaises(BlastTabError):
+                with open(output_file, 'w') as output:
+                    filter_blast(extended_file, output, 1e-50,
+                                 columns='qseqid sseqid pident')
+        finally:
+            os.unlink(output_file)
+
+    def test_sequence_id_columns(self):
+        """
+        Check if alignments with accession sequence ID columns, as
+        BLAST+ reports them by default, have the query and subject
+        fields.
+        """
+        accver_file = os.path.join('data', 'blast',
+                                   'blast_tabular_accver.txt')
+        with open(accver_file) as input_file:
+            parser = BlastTab(input_file)
+            alignments = list(parser.alignments())
+        self.assertEqual(parser.alignment_type._fields,
+                         BlastTab.blast_field_names)
+        self.assertEqual(alignments[0].query, 'BA000007.2_gene_5374')
+        self.assertEqual(alignments[0].subject, 'NC_000913.3')
+        self.assertEqual(list(top_hits(alignments)), alignments)
+        self.assertEqual(list(reciprocal_best_hits(alignments, [])), [])
+        self.assertEqual(
+            list(covered_regions(alignments, 'subject')),
+            [('NC_000913.3', None, [(4480982, 4484280),
+                                    (4484440, 4485951),
+                                    (4486218, 4488400),
+                                    (4488561, 4490063)])])
+        with open(accver_file) as input_file:
+            self.assertEqual(
+                list(BlastTab(input_file, '6 qaccver saccver pident '
+                              'length mismatch gapopen qstart qend '
+                              'sstart send evalue bitscore').alignments()),
+                alignments)
+        # only the first sequence ID column names the sequence
+        with open(accver_file) as input_file:
+            alignment = next(BlastTab(input_file, 'qaccver qseqid '
+                                      'pident length mismatch gapopen '
+                                      'qstart qend sstart send evalue '
+                                      'bitscore').alignments())
+        self.assertEqual(alignment._fields[:2], ('query', 'qseqid'))
+        self.assertEqual(alignment[:2], ('BA000007.2_gene_5374',
+                                         'NC_000913.3'))
+        # alignments without the subject field cannot be selected
+        with self.assertRaises(BlastTabError):
+            list(covered_regions([alignment], 'subject'))
+        with self.assertRaises(BlastTabError):
+            list(reciprocal_best_hits([alignment], []))
+
+    def test_reciprocal_best_hits(self):
+        """
+        Check if reciprocal best hits of two searches are found.
+        """
+        first_file = os.path.join('data', 'blast', 'blast_rbh_first.txt')
+        second_file = os.path.join('data', 'blast',
+                                   'blast_rbh_second.txt')
+        for key, values in (('bit_score', (500, 490, 400, 390, 250,
+                                           240)),
+                            ('e_value', (1e-100, 1e-98, 1e-80, 1e-78,
+                                         1e-40, 1e-38))):
+            with open(first_file) as first_input:
+                with open(second_file) as second_input:
+                    self.assertEqual(list(reciprocal_best_hits(
+                        BlastTab(first_input).alignments(),
+                        BlastTab(second_input).alignments(), key)),
+                        [('a1', 'b1') + values[0:2],
+                         ('a2', 'b2') + values[2:4],
+                         ('a4', 'b4') + values[4:6]])
+        with open(first_file) as first_input:
+            with self.assertRaises(BlastTabError):
+                list(reciprocal_best_hits(
+                    BlastTab(first_input).alignments(), [], 'query'))
+
+    def test_covered_regions(self):
+        """
+        Check if regions of queries and subjects covered by alignments
+        are found.
+        """
+        self.assertEqual(merge_intervals(array('l', [10, 20, 1, 5, 6, 8,
+                                                     15, 30, 40, 50])),
+                         [(1, 8), (10, 30), (40, 50)])
+        self.assertEqual(merge_intervals(array('l')), [])
+
+        extended_file = os.path.join('data', 'blast',
+                                     'blast_tabular_extended.txt')
+        with open(extended_file) as input_file:
+            alignments = list(BlastTab(input_file).alignments())
+        # the second subject region is on the reverse strand
+        subject_regions = list(covered_regions(alignments[:2],
+                                               'subject'))
+        self.assertEqual(subject_regions, [
+            ('gi|556503834|ref|NC_000913.3|', 4641652,
+             [(4480982, 4484280)])])
+        query_regions = list(covered_regions(alignments, grouped=True))
+        self.assertEqual(len(query_regions), 6)
+        self.assertEqual(query_regions[0],
+                         ('lcl|BA000007.2_gene_5374', 2856, [(1, 2856)]))
+        self.assertEqual(list(covered_regions(alignments)),
+                         query_regions)
+
+        with open(self.__correct_file) as correct_file:
+            alignments = list(BlastTab(correct_file).alignments())
+        query_regions = list(covered_regions(alignments, grouped=True))
+        # alignments of a query are not contiguous
+        self.assertEqual(
+            sorted(covered_regions(alignments[1::2] + alignments[::2])),
+            sorted(query_regions))
+        self.assertTrue(all(x[1] is None for x in query_regions))
+        with self.assertRaises(BlastTabError):
+            list(covered_regions(alignments, 'sequence'))
@@ -49,6 +49,23 @@ class TestWriter(unittest.TestCase):
         for (header, sequence) in iteritems(sequences):
             self.assertEqual(sequence, reader[header][:].seq)
 
+    def test_write_part(self):
+        """
+        Check if sequences written by parts are wrapped properly.
+        """
+        with Writer(self.__output_file, 4) as output_fasta:
+            output_fasta.start('chr1')
+            for part in ('AC', 'GTA', '', 'CGTACGT', 'A'):
+                output_fasta.write_part(part)
+            output_fasta.finish()
+            output_fasta.start('chr2')
+            output_fasta.write_part('ACGT')
+            output_fasta.finish()
+
+        with open(self.__output_file) as output_fasta:
+            self.assertEqual(output_fasta.read().splitlines(), [
+                '>chr1', 'ACGT', 'ACGT', 'ACGT', 'A', '>chr2', 'ACGT'])
+
     def tearDown(self):
         for i in (self.__output_file, self.__output_file + '.fai'):
             if os.path.isfile(i):
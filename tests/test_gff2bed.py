@@ -31,6 +31,14 @@ class TestGff2Bed(unittest.TestCase):
         sys.argv = ['', 'gff2bed', self.__input_file, 'exon',
                     self.__output_file, '-a', 'Parent']
         bioformats.cli.bioformats()
+        sys.argv = ['', 'gff2bed', self.__input_file, 'exon',
+                    self.__output_file, '-a', 'Parent', '--threads',
+                    '2']
+        bioformats.cli.bioformats()
+        sys.argv = ['', 'gff2bed', '-g', '-u',
+                    self.__input_file_unordered, 'exon',
+                    self.__output_file, '--max_exons', '4']
+        bioformats.cli.bioformats()
 
     def tearDown(self):
         if os.path.isfile(self.__output_file):
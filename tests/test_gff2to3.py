@@ -24,6 +24,9 @@ class TestGff2to3(unittest.TestCase):
         sys.argv = ['', 'gff2to3', self.__input_file,
                     self.__output_file]
         bioformats.cli.bioformats()
+        sys.argv = ['', 'gff2to3', self.__input_file,
+                    self.__output_file, '--threads', '2']
+        bioformats.cli.bioformats()
 
     def tearDown(self):
         if os.path.isfile(self.__output_file):
@@ -5,12 +5,20 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import glob
+import gzip
 import os
 import logging
 import tempfile
 import unittest
+from collections import OrderedDict
 from bioformats.gff3 import Record, Reader, Writer, analyze_tags
-from bioformats.gff3 import gff2to3
+from bioformats.gff3 import analyze_tags_parallel
+from bioformats.gff3 import gff2to3, gff2to3_parallel, sort_gff3
+from bioformats.gff3 import LazyAttributes, FeatureIndex, IndexedReader
+from bioformats.gff3 import AttributeInterner, CompactAttributes
+from bioformats.gff3 import get_record_line
+from bioformats.gff3 import convert_gff2_group, convert_gff2_line
+from bioformats import gff3
 from bioformats.exception import Gff3Error
 try:
     import itertools.izip as zip
@@ -59,6 +67,190 @@ class TestGff3Reader(unittest.TestCase):
                     for _ in parser.records():
                         pass
 
+    def test_batches(self):
+        """
+        Check if GFF3 records are grouped by the ### directives.
+        """
+        resolved_file = os.path.join('data', 'gff3', 'resolved.gff')
+        with open(resolved_file) as gff_file:
+            batches = list(Reader(gff_file).batches())
+        self.assertEqual([len(x) for x in batches], [4, 5, 1])
+        self.assertEqual(batches[1][0].attributes['ID'], 'ADAM')
+        with open(resolved_file) as gff_file:
+            batches = list(Reader(gff_file).batches(types=('exon', )))
+        self.assertEqual([len(x) for x in batches], [2, 3])
+        # the records method ignores the directives
+        with open(resolved_file) as gff_file:
+            self.assertEqual(len(list(Reader(gff_file).records())), 10)
+
+    def test_lazy_records(self):
+        """
+        Check if attributes of GFF3 records are parsed on demand.
+        """
+        with open(self.__correct_file) as gff_file:
+            eager_records = list(Reader(gff_file).records())
+        with open(self.__correct_file) as gff_file:
+            lazy_records = list(Reader(gff_file).records(lazy=True))
+        self.assertEqual(len(eager_records), len(lazy_records))
+        for x, y in zip(eager_records, lazy_records):
+            if x.attributes is None:
+                self.assertIsNone(y.attributes)
+            else:
+                self.assertIsInstance(y.attributes, LazyAttributes)
+                self.assertFalse(y.attributes.modified)
+                self.assertEqual(list(x.attributes.items()),
+                                 list(y.attributes.items()))
+
+        # an incorrect attribute is reported when it is accessed
+        incorrect_file = os.path.join(self.__incorrect_file_dir,
+                                      'empty_tag.gff')
+        with open(incorrect_file) as gff_file:
+            records = list(Reader(gff_file).records(lazy=True))
+        with self.assertRaises(Gff3Error):
+            for record in records:
+                if record.attributes is not None:
+                    len(record.attributes)
+
+    def test_compact_records(self):
+        """
+        Check if GFF3 records are read in the compact form.
+        """
+        with open(self.__correct_file) as gff_file:
+            eager_records = list(Reader(gff_file).records())
+        interner = AttributeInterner()
+        with open(self.__correct_file) as gff_file:
+            compact_records = list(Reader(
+                gff_file, interner=interner).records())
+        self.assertEqual(len(eager_records), len(compact_records))
+        schemas = dict()
+        for x, y in zip(eager_records, compact_records):
+            self.assertEqual(x[:8], y[:8])
+            if x.attributes is None:
+                self.assertIsNone(y.attributes)
+            else:
+                self.assertIsInstance(y.attributes, CompactAttributes)
+                self.assertEqual(list(x.attributes.items()),
+                                 list(y.attributes.items()))
+                # records with the same tags share their schema
+                tags = schemas.setdefault(y.attributes.tags,
+                                          y.attributes.tags)
+                self.assertIs(tags, y.attributes.tags)
+        self.assertIs(compact_records[0].seqid,
+                      compact_records[-1].seqid)
+
+        # an incorrect attribute is reported immediately
+        incorrect_file = os.path.join(self.__incorrect_file_dir,
+                                      'empty_tag.gff')
+        with self.assertRaises(Gff3Error):
+            with open(incorrect_file) as gff_file:
+                for _ in Reader(gff_file,
+                                interner=AttributeInterner()).records():
+                    pass
+
+    def test_record_filters(self):
+        """
+        Check if GFF3 records are filtered by their types and sources.
+        """
+        with open(self.__correct_file) as gff_file:
+            parser = Reader(gff_file)
+            records = list(parser.records(types=('CDS', 'mRNA'),
+                                          sources=('example', )))
+            self.assertEqual(parser.record_count, 26)
+        self.assertEqual(len(records), 13)
+        for record in records:
+            self.assertIn(record.type, ('CDS', 'mRNA'))
+            self.assertEqual(record.source, 'example')
+
+
+class TestFeatureIndex(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join('data', 'gff3', 'correct.gff')
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def test_feature_index(self):
+        """
+        Check if the GFF3 feature hierarchy is indexed properly.
+        """
+        with open(self.__input_file) as gff_file:
+            index = FeatureIndex(gff_file)
+        self.assertEqual(len(index), 26)
+        self.assertIn('EDEN.1', index)
+        self.assertEqual(index.record('EDEN').type, 'gene')
+
+        transcripts = index.children('EDEN')
+        self.assertEqual([x.attributes['ID'] for x in transcripts],
+                         ['EDEN.1', 'EDEN.2', 'EDEN.3'])
+        self.assertEqual(len(index.children('EDEN.1', 'CDS')), 4)
+        self.assertEqual(len(index.children('EDEN.2')), 5)
+        self.assertEqual(len(index.descendants('EDEN', 'CDS')), 10)
+        self.assertEqual(index.parents('EDEN'), [])
+
+        cds_offset = index.offset('EDEN.3') + 3
+        self.assertEqual(index.record(cds_offset).type, 'CDS')
+        self.assertEqual(index.parents(cds_offset)[0].attributes['ID'],
+                         'EDEN.3')
+        genes = index.ancestors(cds_offset, 'gene')
+        self.assertEqual([x.attributes['ID'] for x in genes], ['EDEN'])
+
+        with self.assertRaises(Gff3Error):
+            index.record('missing_feature')
+
+
+class TestIndexedReader(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join('data', 'gff3', 'sorted.gff')
+        self.__index_file = tempfile.NamedTemporaryFile().name
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def test_fetch(self):
+        """
+        Check if GFF3 records are fetched by their locations.
+        """
+        for bin_size in (1000, 16384):
+            # the index is built at first and then read from its file
+            for _ in range(2):
+                reader = IndexedReader(self.__input_file,
+                                       self.__index_file, bin_size)
+                self.assertEqual(reader.seqids, ['chr1', 'chr2',
+                                                 'chr3'])
+                ids = [x.attributes['ID'] for x in
+                       reader.fetch('chr1', 4500, 20500)]
+                self.assertEqual(ids, ['gene1', 'exon2', 'gene2',
+                                       'exon3'])
+                ids = [x.attributes['ID'] for x in
+                       reader.fetch('chr1', 60000, 70000)]
+                self.assertEqual(ids, ['gene3'])
+                self.assertEqual(len(list(reader.fetch('chr1'))), 8)
+                self.assertEqual(len(list(reader.fetch('chr2', 151))),
+                                 0)
+                self.assertEqual(len(list(reader.fetch('chr4'))), 0)
+            os.unlink(self.__index_file)
+
+        # the index is rebuilt if it has another bin size
+        IndexedReader(self.__input_file, self.__index_file, 1000)
+        IndexedReader(self.__input_file, self.__index_file, 2000)
+        with open(self.__index_file) as index_file:
+            index_file.readline()
+            self.assertEqual(index_file.readline(), '2000\n')
+
+        # the index is kept in memory if it cannot be written
+        missing_dir_file = os.path.join(self.__index_file, 'sorted.idx')
+        reader = IndexedReader(self.__input_file, missing_dir_file)
+        self.assertEqual([x.attributes['ID'] for x in
+                          reader.fetch('chr1', 60000, 70000)], ['gene3'])
+        self.assertFalse(os.path.exists(missing_dir_file))
+
+        # records of a sequence must be contiguous and sorted
+        with self.assertRaises(Gff3Error):
+            IndexedReader(os.path.join('data', 'gff3', 'correct.gff'),
+                          self.__index_file)
+
+    def tearDown(self):
+        if os.path.isfile(self.__index_file):
+            os.unlink(self.__index_file)
+
 
 class TestGff3Writer(unittest.TestCase):
     def setUp(self):
@@ -82,6 +274,45 @@ class TestGff3Writer(unittest.TestCase):
                                                        test_output):
                         self.assertEqual(input_line, output_line)
 
+    def test_write_many(self):
+        """
+        Check if GFF3 records are written in bulk with buffering and
+        BGZF compression.
+        """
+        with open(self.__input_file) as input_file:
+            records = list(Reader(input_file).records(lazy=True))
+        # modified attributes are formed again
+        records[1].attributes['Note'] = 'modified'
+        for compress in (False, True):
+            with Writer(self.__output_file, buffer_size=4,
+                        compress=compress) as test_output:
+                test_output.write_many(records)
+            open_output = gzip.open if compress else open
+            with open_output(self.__output_file, 'rt') as test_output:
+                written_records = list(Reader(test_output).records())
+            self.assertEqual(len(written_records), len(records))
+            self.assertEqual(written_records[1].attributes['Note'],
+                             'modified')
+            for x, y in zip(records, written_records):
+                self.assertEqual(x[:8], y[:8])
+        # unmodified lazy attributes are written without parsing them
+        with open(self.__input_file) as input_file:
+            records = list(Reader(input_file).records(lazy=True))
+        parsed_lines = []
+        parse_attributes = gff3.parse_attributes
+        gff3.parse_attributes = lambda *args: parsed_lines.append(args)
+        try:
+            with Writer(self.__output_file) as test_output:
+                test_output.write_many(records)
+        finally:
+            gff3.parse_attributes = parse_attributes
+        self.assertEqual(parsed_lines, [])
+        # attribute values which are not strings are written
+        records[0] = records[0]._replace(attributes=OrderedDict(
+            [('ID', 'gene1'), ('score', 5)]))
+        self.assertTrue(get_record_line(records[0]).endswith(
+            'ID=gene1;score=5\n'))
+
     def tearDown(self):
         if os.path.isfile(self.__output_file):
             os.unlink(self.__output_file)
@@ -106,6 +337,108 @@ class TestAnalyzeTags(unittest.TestCase):
         with open(self.__input_file) as gff_file:
             result = analyze_tags(gff_file, feature_type='CDS')
             self.assertIsInstance(result, dict)
+            self.assertEqual(result['filtered'], 10)
+            self.assertEqual(result['tag_counts'], {'Parent': 10})
+
+        with open(self.__input_file) as gff_file:
+            result = analyze_tags(gff_file)
+        self.assertEqual(result['total'], 26)
+        self.assertEqual(result['tag_counts']['ID'], 8)
+        self.assertEqual(result['type_counts']['mRNA'], 3)
+        self.assertEqual(result['type_tag_counts']['mRNA']['Index'], 3)
+
+        # a tag repeated in a record is counted once
+        result = gff3.count_tags(['ctg123\t.\tCDS\t1\t10\t.\t+\t0\t'
+                                  'Parent=mRNA1;Note=a;Parent=mRNA2\n'])
+        self.assertEqual(result['tag_counts'], {'Parent': 1, 'Note': 1})
+        self.assertEqual(result['type_tag_counts']['CDS'],
+                         {'Parent': 1, 'Note': 1})
+
+    def test_analyze_tags_parallel(self):
+        """
+        Check if tags are analyzed in parallel in the same way.
+        """
+        for feature_type in (None, 'CDS'):
+            with open(self.__input_file) as gff_file:
+                result = analyze_tags(gff_file,
+                                      feature_type=feature_type)
+            parallel_result = analyze_tags_parallel(
+                self.__input_file, feature_type=feature_type,
+                threads=2)
+            for key in ('total', 'filtered', 'tag_counts',
+                        'type_counts'):
+                self.assertEqual(result[key], parallel_result[key])
+            self.assertEqual(
+                dict((k, dict(v)) for k, v in
+                     result['type_tag_counts'].items()),
+                dict((k, dict(v)) for k, v in
+                     parallel_result['type_tag_counts'].items()))
+
+
+class TestSortGff3(unittest.TestCase):
+    def setUp(self):
+        self.__output = tempfile.NamedTemporaryFile().name
+        # silence the logging messages
+        logging.disable(logging.ERROR)
+
+    def test_sort_gff3(self):
+        """
+        Check if GFF3 records are sorted in the proper way.
+        """
+        input_file = os.path.join('data', 'gff3', 'correct.gff')
+        with open(input_file) as gff_file:
+            records = list(Reader(gff_file).records())
+        for buffer_size, threads in ((1024, 1), (200, 1), (200, 2)):
+            sort_gff3(input_file, self.__output, buffer_size,
+                      threads)
+            with open(self.__output) as gff_file:
+                sorted_records = list(Reader(gff_file).records(
+                    check_order=True))
+            self.assertEqual(len(records), len(sorted_records))
+            # parents precede their children
+            ids = set()
+            for record in sorted_records:
+                if record.attributes is None:
+                    continue
+                if 'Parent' in record.attributes:
+                    self.assertIn(record.attributes['Parent'], ids)
+                if 'ID' in record.attributes:
+                    ids.add(record.attributes['ID'])
+
+        # the header, ### directives and the FASTA section are kept
+        input_file = os.path.join('data', 'gff3', 'resolved.gff')
+        sort_gff3(input_file, self.__output, 200)
+        with open(self.__output) as gff_file:
+            lines = gff_file.readlines()
+        self.assertEqual(lines[1], '##sequence-region ctg123 1 20000\n')
+        self.assertEqual(lines.count('###\n'), 2)
+        self.assertEqual(lines[-3:], ['##FASTA\n', '>ctg123\n',
+                                      'ACGT\n'])
+        with open(self.__output) as gff_file:
+            batches = list(Reader(gff_file).batches())
+        self.assertEqual([len(x) for x in batches], [4, 5, 1])
+        # the input file is already sorted, so only the repeated ###
+        # directive is removed
+        with open(input_file) as gff_file:
+            self.assertEqual(lines, [x for i, x in enumerate(
+                gff_file.readlines()) if i != 14])
+
+        # parents with the same coordinates as their children precede
+        # them and comments move with records
+        input_file = os.path.join('data', 'gff3', 'nested.gff')
+        for buffer_size in (30, 1024):
+            sort_gff3(input_file, self.__output, buffer_size)
+            with open(self.__output) as gff_file:
+                lines = gff_file.readlines()
+            self.assertEqual(
+                [x.split('\t')[2] if '\t' in x else x for x in lines],
+                ['##gff-version 3\n', 'gene', '# the end of genes\n',
+                 '###\n', 'gene', '# the gene model\n', 'mRNA', 'CDS',
+                 'exon'])
+
+    def tearDown(self):
+        if os.path.isfile(self.__output):
+            os.unlink(self.__output)
 
 
 class TestGff2to3(unittest.TestCase):
@@ -114,6 +447,8 @@ class TestGff2to3(unittest.TestCase):
         self.__incorrect_gff2 = os.path.join('data', 'gff3',
                                              'incorrect.gff2')
         self.__gff3 = os.path.join('data', 'gff3', 'example.gff3')
+        self.__quoted_gff2 = os.path.join('data', 'gff3',
+                                          'quoted.gff2')
         self.__output = tempfile.NamedTemporaryFile().name
 
     def test_gff2to3(self):
@@ -127,6 +462,21 @@ class TestGff2to3(unittest.TestCase):
                 for x, y in zip(produced_gff, correct_gff):
                     self.assertEqual(x.rstrip(), y.rstrip())
 
+        # convert the GFF2 file in parallel
+        with open(self.__output, 'w') as output_file:
+            gff2to3_parallel(self.__gff2, output_file, threads=2)
+        with open(self.__output) as produced_gff:
+            with open(self.__gff3) as correct_gff:
+                self.assertEqual(produced_gff.read(), correct_gff.read())
+
+        # convert the GFF2 file in small batches
+        with open(self.__gff2) as input_file:
+            with open(self.__output, 'w') as output_file:
+                gff2to3(input_file, output_file, batch_size=2)
+        with open(self.__output) as produced_gff:
+            with open(self.__gff3) as correct_gff:
+                self.assertEqual(produced_gff.read(), correct_gff.read())
+
         # try the incorrect GFF2 file in the strict mode
         with open(self.__incorrect_gff2) as input_file:
             with open(self.__output, 'w') as output_file:
@@ -138,6 +488,34 @@ class TestGff2to3(unittest.TestCase):
             with open(self.__output, 'w') as output_file:
                 gff2to3(input_file, output_file, strict=False)
 
+    def test_quoted_values(self):
+        """
+        Check if quoted GFF2 values with spaces and semicolons are
+        converted correctly.
+        """
+        with open(self.__quoted_gff2) as input_file:
+            with open(self.__output, 'w') as output_file:
+                gff2to3(input_file, output_file)
+        with open(self.__output) as produced_gff:
+            records = list(Reader(produced_gff).records())
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0].attributes['Note'],
+                         'Zn-Finger%3B C2H2 type')
+        self.assertEqual(records[1].attributes['Transcript'], 'B0273.1')
+        self.assertEqual(records[1].attributes['Note'],
+                         'a%3Db%2C "c"')
+
+        # unquoted values are escaped in the same way
+        self.assertEqual(convert_gff2_group('Note a=b,c'),
+                         'Note=a%3Db%2Cc')
+        # values with an unterminated quote are rejected
+        for group in ('Note "a b', 'Note "a; Transcript B0273.1'):
+            with self.assertRaises(Gff3Error):
+                convert_gff2_group(group)
+            self.assertIsNone(convert_gff2_line(
+                '\t'.join(['IV', 'curated', 'mRNA', '1', '10', '.', '+',
+                           '.', group]), strict=False))
+
     def tearDown(self):
         if os.path.isfile(self.__output):
             os.unlink(self.__output)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestGffSort(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join('data', 'gff3', 'correct.gff')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_gffsort(self):
+        sys.argv = ['', 'gffsort', self.__input_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+        sys.argv = ['', 'gffsort', self.__input_file,
+                    self.__output_file, '--threads', '2']
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
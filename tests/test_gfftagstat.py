@@ -29,3 +29,12 @@ class TestGffTagStat(unittest.TestCase):
         sys.argv = ['', 'gfftagstat', self.__input_file, '-s',
                     'example']
         bioformats.cli.bioformats()
+
+        # check tag counts for each feature type
+        sys.argv = ['', 'gfftagstat', self.__input_file, '-b']
+        bioformats.cli.bioformats()
+
+        # check parallel processing of the input file
+        sys.argv = ['', 'gfftagstat', self.__input_file, '--threads',
+                    '2']
+        bioformats.cli.bioformats()
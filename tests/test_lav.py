@@ -7,8 +7,12 @@
 import glob
 import os
 import logging
+import tempfile
 import unittest
-from bioformats.lav import Lav
+from bioformats.lav import Lav, LavIndex, load_segments, convert_lav
+from bioformats import bed
+from bioformats import lav
+from bioformats import parallel
 from bioformats.exception import LavError
 
 path = os.path.dirname(__file__)
@@ -20,6 +24,12 @@ class TestLavAlignment(unittest.TestCase):
         self.__correct_file = os.path.join(
             'data', 'lav', 'lav_alignments.txt'
         )
+        self.__irregular_file = os.path.join(
+            'data', 'lav', 'lav_alignments_irregular.txt'
+        )
+        self.__sections_file = os.path.join(
+            'data', 'lav', 'lav_sections.txt'
+        )
         self.__incorrect_file_dir = os.path.join(
             'data', 'lav', 'incorrect_input'
         )
@@ -47,3 +57,231 @@ class TestLavAlignment(unittest.TestCase):
                 for alignment in parser.alignments():
                     self.assertIsInstance(alignment,
                                           Lav.GapFreeAlignment)
+
+    def test_alignment_values(self):
+        """
+        Check if values of alignments are read correctly.
+        """
+        first_seq = 'gi|556503834|ref|NC_000913.3|'
+        second_seq = 'gi|556503834|ref|NC_000913.3|'
+        gap_free_alignments = list(Lav(self.__correct_file).alignments())
+        self.assertEqual(len(gap_free_alignments), 4)
+        self.assertEqual(gap_free_alignments[0], Lav.GapFreeAlignment(
+            first_seq, second_seq, 59053, 59063, 59068, 59078, 89))
+        gapped_alignments = list(Lav(self.__correct_file).alignments(
+            gapped=False))
+        self.assertEqual(len(gapped_alignments), 3)
+        self.assertEqual(gapped_alignments[0], Lav.GappedAlignment(
+            first_seq, second_seq, 59053, 59120, 59068, 59135, 5350, 91))
+
+        # stanzas that differ from the regular layout are read
+        # in the same way
+        for gapped in (True, False):
+            self.assertEqual(
+                list(Lav(self.__irregular_file).alignments(gapped)),
+                list(Lav(self.__correct_file).alignments(gapped)))
+
+        # a-stanzas split across several file windows are read in the
+        # same way
+        window_size = lav.stanza_window_size
+        lav.stanza_window_size = 1
+        try:
+            for gapped in (True, False):
+                self.assertEqual(
+                    list(Lav(self.__correct_file).alignments(gapped)),
+                    gap_free_alignments if gapped else gapped_alignments)
+        finally:
+            lav.stanza_window_size = window_size
+
+    def test_sections(self):
+        """
+        Check if sections of a LAV file are located and parsed in
+        parallel.
+        """
+        parser = Lav(self.__sections_file)
+        sections = parser.sections()
+        self.assertEqual(len(sections), 3)
+        for start, end in sections:
+            with open(self.__sections_file, 'rb') as lav_file:
+                lav_file.seek(start)
+                self.assertEqual(lav_file.readline(), b'#:lav\n')
+            self.assertEqual(
+                len(list(parser.section_alignments(start, end))), 4)
+        self.assertEqual(Lav(self.__correct_file).sections(),
+                         [(256, 825)])
+
+        for gapped in (True, False):
+            self.assertEqual(
+                list(parser.alignments(gapped, threads=2)),
+                list(parser.alignments(gapped)))
+
+        # groups of sections are limited by the chunk size
+        max_chunk_size = parallel.max_chunk_size
+        parallel.max_chunk_size = 1
+        try:
+            for gapped in (True, False):
+                self.assertEqual(
+                    list(parser.alignments(gapped, threads=2)),
+                    list(parser.alignments(gapped)))
+        finally:
+            parallel.max_chunk_size = max_chunk_size
+
+        # errors are reported in the parallel mode too
+        for lav_file in self.__incorrect_files:
+            parser = Lav(os.path.join(self.__incorrect_file_dir,
+                                      lav_file))
+            with self.assertRaises(LavError):
+                for _ in parser.alignments(threads=2):
+                    pass
+
+    def test_load_segments(self):
+        """
+        Check if segments of a LAV file are loaded to arrays.
+        """
+        segments = load_segments(self.__sections_file)
+        alignments = list(Lav(self.__sections_file).alignments())
+        self.assertEqual(len(segments.first_start), len(alignments))
+        for i, alignment in enumerate(alignments):
+            block_id = segments.block_id[i]
+            pair = segments.seq_pairs[segments.block_pair[block_id]]
+            self.assertEqual(pair, alignment[:2])
+            self.assertEqual(alignment[2:], (
+                segments.first_start[i], segments.first_end[i],
+                segments.second_start[i], segments.second_end[i],
+                segments.identity[i]))
+        self.assertEqual(len(segments.seq_pairs), 3)
+        self.assertEqual(
+            list(segments.block_score),
+            [x.score for x in Lav(self.__sections_file).alignments(
+                gapped=False)])
+
+    def test_filters(self):
+        """
+        Check if alignments are filtered by their scores, identities
+        and sequences.
+        """
+        parser = Lav(self.__sections_file)
+        for gapped in (True, False):
+            alignments = list(parser.alignments(gapped))
+            for threads in (1, 2):
+                self.assertEqual(
+                    list(parser.alignments(gapped, threads,
+                                           first_seqs=['chr1'])),
+                    [x for x in alignments if x.first_seq == 'chr1'])
+                self.assertEqual(
+                    list(parser.alignments(
+                        gapped, threads, first_seqs=['chr1'],
+                        second_seqs=['chr3'])),
+                    [x for x in alignments if x.first_seq == 'chr1' and
+                     x.second_seq == 'chr3'])
+                self.assertEqual(
+                    list(parser.alignments(gapped, threads,
+                                           min_identity=93)),
+                    [x for x in alignments if x.identity >= 93])
+        # scores are checked for alignment blocks
+        alignments = list(parser.alignments(gapped=False))
+        self.assertEqual(
+            list(parser.alignments(gapped=False, min_score=7000)),
+            [x for x in alignments if x.score >= 7000])
+        self.assertEqual(len(list(parser.alignments(min_score=7000))), 6)
+        self.assertEqual(
+            list(Lav(self.__irregular_file).alignments(
+                gapped=False, min_score=10000)),
+            list(Lav(self.__correct_file).alignments(
+                gapped=False, min_score=10000)))
+        self.assertEqual(list(parser.alignments(second_seqs=[])), [])
+
+    def test_index(self):
+        """
+        Check if sections of a LAV file are indexed and alignments of
+        specified sequences are read using the index.
+        """
+        index_file = tempfile.NamedTemporaryFile().name
+        try:
+            index = LavIndex(self.__sections_file, index_file)
+            self.assertTrue(os.path.isfile(index_file))
+            self.assertEqual([x[:2] for x in index.sections],
+                             [(256, 695), (695, 1155), (1155, 1594)])
+            self.assertEqual(
+                [(x[2].first_seq, x[2].second_seq,
+                  x[2].second_rev_comp) for x in index.sections],
+                [('chr1', 'chr2', False), ('chr1', 'chr3', True),
+                 ('chr2', 'chr3', False)])
+            self.assertEqual(index.find('chr1'),
+                             [(256, 695), (695, 1155)])
+            self.assertEqual(index.find(second_seq='chr3'),
+                             [(695, 1155), (1155, 1594)])
+            self.assertEqual(index.find('chr3'), [])
+            # the index is read from the existing file
+            self.assertEqual(
+                LavIndex(self.__sections_file, index_file).sections,
+                index.sections)
+            # the index is kept in memory if it cannot be written
+            missing_dir_file = os.path.join(index_file, 'missing.idx')
+            self.assertEqual(
+                LavIndex(self.__sections_file,
+                         missing_dir_file).sections, index.sections)
+            self.assertFalse(os.path.exists(missing_dir_file))
+
+            parser = Lav(self.__sections_file, index_file)
+            for gapped in (True, False):
+                alignments = list(parser.alignments(gapped))
+                for threads in (1, 2):
+                    self.assertEqual(
+                        list(parser.alignments(gapped, threads,
+                                               first_seq='chr1',
+                                               second_seq='chr3')),
+                        [x for x in alignments if
+                         x.first_seq == 'chr1' and
+                         x.second_seq == 'chr3'])
+                    self.assertEqual(
+                        list(parser.alignments(gapped, threads,
+                                               second_seq='chr3')),
+                        [x for x in alignments if
+                         x.second_seq == 'chr3'])
+        finally:
+            os.unlink(index_file)
+
+    def __convert(self, output_format, buffer_size=65536):
+        """
+        Convert the LAV file with multiple sections to the specified
+        format and return the output lines.
+        """
+        output_file = tempfile.NamedTemporaryFile().name
+        try:
+            with open(output_file, 'w') as output:
+                convert_lav(self.__sections_file, output, output_format,
+                            buffer_size)
+            with open(output_file) as output:
+                return output.read()
+        finally:
+            os.unlink(output_file)
+
+    def test_convert_lav(self):
+        """
+        Check if LAV alignment blocks are converted to the chain, PSL
+        and BED formats.
+        """
+        chains = self.__convert('chain').split('\n\n')[:-1]
+        self.assertEqual(len(chains), 9)
+        chain_lines = chains[0].split('\n')
+        self.assertEqual(chain_lines[0].split(), [
+            'chain', '5350', 'chr1', '4641652', '+', '59052', '59120',
+            'chr2', '4641652', '+', '59067', '59135', '1'])
+        self.assertEqual(chain_lines[1:], ['11\t46\t46', '11'])
+        # the reverse strand of the second sequence
+        self.assertEqual(chains[3].split()[9], '-')
+
+        psl_lines = self.__convert('psl', buffer_size=2).splitlines()
+        self.assertEqual(len(psl_lines), 9)
+        psl_parts = psl_lines[3].split('\t')
+        self.assertEqual(psl_parts[8:13], [
+            '-', 'chr3', '4641652', '4582517', '4582585'])
+        self.assertEqual(psl_parts[17:], ['2', '11,11,', '59067,59124,',
+                                          '59052,59109,'])
+
+        bed_lines = self.__convert('bed').splitlines()
+        records = list(bed.Reader(bed_lines).records())
+        self.assertEqual(len(records), 9)
+        self.assertEqual(records[0][:6], (
+            'chr1', 59052, 59120, 'chr2:59067-59135', 91, '+'))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestLav2Bed(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join('data', 'lav',
+                                         'lav_sections.txt')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+
+    def test_lav2bed(self):
+        sys.argv = ['', 'lav2bed', self.__input_file,
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        if os.path.isfile(self.__output_file):
+            os.unlink(self.__output_file)
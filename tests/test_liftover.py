@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import sys
+import tempfile
+import unittest
+import bioformats.cli
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestLiftover(unittest.TestCase):
+    def setUp(self):
+        self.__agp_file = os.path.join('data', 'agp', 'liftover.agp')
+        self.__output_file = tempfile.NamedTemporaryFile().name
+        self.__unmapped_file = tempfile.NamedTemporaryFile().name
+
+    def test_liftover(self):
+        for file_format in ('bed', 'vcf', 'gff3'):
+            sys.argv = ['', 'liftover', '-u', self.__unmapped_file,
+                        self.__agp_file,
+                        os.path.join('data', 'agp',
+                                     'liftover.' + file_format),
+                        self.__output_file]
+            bioformats.cli.bioformats()
+
+        sys.argv = ['', 'liftover', '-r', '-f', 'bed', self.__agp_file,
+                    os.path.join('data', 'agp', 'liftover.bed'),
+                    self.__output_file]
+        bioformats.cli.bioformats()
+
+    def tearDown(self):
+        for filename in (self.__output_file, self.__unmapped_file):
+            if os.path.isfile(filename):
+                os.unlink(filename)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import os
+import unittest
+from bioformats.parallel import get_chunks, read_lines, map_chunks
+from bioformats.parallel import map_ranges
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+def count_lines(filename, start, end):
+    return len(read_lines(filename, start, end))
+
+
+def log_first_line(filename, start, end):
+    logging.getLogger(__name__).error('line %d: %s', 1, 'first line')
+
+
+class MessageHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestChunks(unittest.TestCase):
+    def setUp(self):
+        self.__input_file = os.path.join('data', 'gff3', 'correct.gff')
+
+    def test_get_chunks(self):
+        """
+        Check if a file is split into chunks at line boundaries.
+        """
+        with open(self.__input_file) as input_file:
+            lines = input_file.readlines()
+        for chunk_num in (1, 3, 10, 1000):
+            chunks = get_chunks(self.__input_file, chunk_num)
+            self.assertEqual(chunks[0][0], 0)
+            self.assertEqual(chunks[-1][1],
+                             os.path.getsize(self.__input_file))
+            chunk_lines = []
+            for start, end in chunks:
+                chunk_lines += read_lines(self.__input_file, start, end)
+            self.assertEqual(chunk_lines, lines)
+
+    def test_map_chunks(self):
+        """
+        Check if a function is applied to all chunks of a file.
+        """
+        with open(self.__input_file) as input_file:
+            line_num = len(input_file.readlines())
+        for threads in (1, 2):
+            self.assertEqual(sum(map_chunks(
+                count_lines, self.__input_file, threads)), line_num)
+
+    def test_map_ranges(self):
+        """
+        Check if a function is applied to the specified file ranges in
+        their order.
+        """
+        chunks = get_chunks(self.__input_file, 5)
+        line_nums = [count_lines(self.__input_file, start, end)
+                     for start, end in chunks]
+        for threads in (1, 2):
+            self.assertEqual(list(map_ranges(
+                count_lines, self.__input_file, chunks, threads)),
+                line_nums)
+
+    def test_map_ranges_pending(self):
+        """
+        Check if results are returned in the order of ranges when the
+        number of ranges exceeds the number of pending ones.
+        """
+        chunks = get_chunks(self.__input_file, 20)
+        line_nums = [count_lines(self.__input_file, start, end)
+                     for start, end in chunks]
+        self.assertEqual(list(map_ranges(
+            count_lines, self.__input_file, chunks, 2, max_pending=1)),
+            line_nums)
+
+    def test_line_numbers(self):
+        """
+        Check if line numbers in messages logged for file chunks are
+        shifted to lines of the whole file.
+        """
+        chunks = get_chunks(self.__input_file, 3)
+        first_lines = [1]
+        for start, end in chunks[:-1]:
+            first_lines.append(first_lines[-1] + count_lines(
+                self.__input_file, start, end))
+        handler = MessageHandler()
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        logging.disable(logging.NOTSET)
+        try:
+            list(map_ranges(log_first_line, self.__input_file, chunks,
+                            1, relative_lines=True))
+            list(map_ranges(log_first_line, self.__input_file, chunks,
+                            1))
+        finally:
+            root_logger.removeHandler(handler)
+            logging.disable(logging.ERROR)
+        self.assertEqual(
+            handler.messages,
+            ['line %d: first line' % x for x in first_lines] +
+            ['line 1: first line'] * len(chunks))